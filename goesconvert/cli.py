@@ -59,7 +59,7 @@ def main():
     # First import all the possible commands for the CLI
     # The commands themselves live in the cmds directory
     from .cmds import (  # noqa
-        monitor, sample_config
+        backfill, benchmark, monitor, sample_config
     )
     cli()
 
@@ -0,0 +1,85 @@
+import logging
+import signal
+import sys
+import time
+
+import click
+from oslo_config import cfg
+
+from goesconvert import cli_helper, ledger
+from goesconvert.cli import cli
+from goesconvert.cmds import monitor
+from goesconvert.threads import pool
+from goesconvert.utils.timezone import GMT
+
+
+CONF = cfg.CONF
+LOG = logging.getLogger("goesconvert")
+
+
+@cli.command()
+@cli_helper.add_options(cli_helper.common_options)
+@click.option(
+    "--since",
+    "since",
+    type=click.DateTime(formats=["%Y-%m-%d", "%Y-%m-%dT%H:%M:%S"]),
+    default=None,
+    help="Only process files from this time (UTC) on.",
+)
+@click.pass_context
+@cli_helper.process_standard_options
+def backfill(ctx, since):
+    """Process all the files in watch_dir that aren't processed yet."""
+    CONF.log_opt_values(LOG, logging.DEBUG)
+
+    signal.signal(signal.SIGINT, monitor.signal_handler)
+    signal.signal(signal.SIGTERM, monitor.signal_handler)
+
+    satellites = monitor.satellite_configs()
+    if not satellites or not all(s.get('watch_dir') for s in satellites):
+        LOG.error("You must specify a watch_dir to backfill")
+        sys.exit(1)
+
+    monitor.configure_tracing()
+    workers = pool.WorkerPool(
+        max_workers=CONF['monitor'].get('max_workers'),
+        max_queue=CONF['monitor'].get('max_queue'),
+        kind=CONF['monitor'].get('worker_pool'),
+    )
+    workers.start()
+
+    ledger_file = CONF['monitor'].get('ledger')
+    done = ledger.Ledger(ledger_file) if ledger_file else None
+    scanners = []
+    animators = []
+    # Not started either, the frames go into the videos in order at
+    # the end.
+    streams = monitor.video_streams()
+    for satellite in satellites:
+        # Not started, the animations are all rebuilt once at the end.
+        animator = monitor.animation_debouncer(satellite, workers,
+                                               ledger=done)
+        if animator is not None:
+            animators.append(animator)
+        scanner = monitor.Backfill(
+            satellite, workers,
+            ledger=done,
+            since=since.replace(tzinfo=GMT) if since else None,
+            animator=animator,
+            streams=streams,
+        )
+        scanner.start()
+        scanners.append(scanner)
+    for scanner in scanners:
+        scanner.join()
+
+    # Let everything that got queued finish, unless we were interrupted.
+    if not workers.thread_stop:
+        while len(workers) and not workers.thread_stop:
+            time.sleep(0.5)
+        for animator in animators:
+            animator.flush()
+        streams.close()
+        workers.drain = True
+        workers.stop()
+    workers.join()
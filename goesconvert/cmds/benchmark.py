@@ -0,0 +1,265 @@
+import json
+import logging
+import os
+import random
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import click
+from oslo_config import cfg
+from PIL import Image, ImageDraw
+
+from goesconvert import cli_helper, retention
+from goesconvert.cli import cli
+from goesconvert.cmds import monitor
+from goesconvert.logging import log
+from goesconvert.threads import pool
+
+
+CONF = cfg.CONF
+LOG = logging.getLogger("goesconvert")
+
+# The size of the goestools images, and how often they come in
+MODELS = {
+    'fd': (5424, timedelta(minutes=10)),
+    'm1': (1000, timedelta(minutes=1)),
+    'm2': (1000, timedelta(minutes=1)),
+}
+START = datetime(2022, 8, 1, 12, 0)
+
+
+def synthetic_image(size, seed):
+    """A grey disk of smooth noise in black space, like a goestools image.
+
+    The noise is made at a quarter of the size and scaled up, so the
+    PNG compresses about as well as a real one.
+    """
+    rand = random.Random(seed)
+    small = max(1, size // 4)
+    noise = rand.getrandbits(8 * small * small).to_bytes(small * small,
+                                                         "little")
+    clouds = Image.frombytes("L", (small, small), noise)
+    clouds = clouds.resize((size, size), Image.BILINEAR)
+    im = Image.new("L", (size, size), 0)
+    mask = Image.new("L", (size, size), 0)
+    margin = size // 40
+    ImageDraw.Draw(mask).ellipse((margin, margin, size - margin,
+                                  size - margin), fill=255)
+    im.paste(clouds, (0, 0), mask)
+    return im
+
+
+def synthetic_tree(watch_dir, models, channels, frames, sizes=None):
+    """Write a goestools like tree of images under watch_dir.
+
+    :param sizes: {model: size} to use instead of the real sizes.
+    :returns: the files, in the order they would have come in.
+    """
+    files = []
+    for model in models:
+        size, interval = MODELS[model]
+        size = (sizes or {}).get(model, size)
+        for chan in channels:
+            for frame in range(frames):
+                when = START + interval * frame
+                dirname = os.path.join(watch_dir, model,
+                                       when.strftime("%Y-%m-%d"), chan)
+                os.makedirs(dirname, exist_ok=True)
+                path = os.path.join(
+                    dirname, when.strftime("%Y-%m-%dT-%H-%M-%SZ.png"))
+                seed = f"{model}/{chan}/{frame}"
+                synthetic_image(size, seed).save(path)
+                files.append((when, path))
+    return [path for _, path in sorted(files)]
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    if not samples:
+        return {}
+
+    def pct(p):
+        return samples[min(len(samples) - 1, int(len(samples) * p))]
+
+    return {
+        'count': len(samples),
+        'mean': sum(samples) / len(samples),
+        'p50': pct(0.5),
+        'p90': pct(0.9),
+        'p99': pct(0.99),
+        'max': samples[-1],
+    }
+
+
+class BenchmarkFile(monitor.ProcessSatelliteFile):
+    """Processes a file like the monitor does, timing each stage."""
+
+    def __init__(self, new_file, satellite, results):
+        super().__init__(new_file, satellite)
+        self.results = results
+
+    def __getstate__(self):
+        state = super().__getstate__()
+        state['results'] = None
+        return state
+
+    def run(self):
+        stages = []
+        start = last = time.perf_counter()
+
+        def record(stage):
+            nonlocal last
+            now = time.perf_counter()
+            stages.append((stage.name, now - last))
+            last = now
+
+        _, failed = self.fh.process(record=record)
+        return {
+            'model': self.fh.model,
+            'seconds': time.perf_counter() - start,
+            'stages': stages,
+            'failed': failed,
+        }
+
+    def finished(self, result):
+        self.results.append(result)
+
+
+def report(results, wall, source_bytes, bytes_written):
+    stages = {}
+    models = {}
+    for result in results:
+        models.setdefault(result['model'], []).append(result['seconds'])
+        for name, seconds in result['stages']:
+            stages.setdefault(f"{result['model']}/{name}", []).append(
+                seconds)
+
+    self_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children_rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return {
+        'backend': CONF['monitor'].get('image_backend'),
+        'worker_pool': CONF['monitor'].get('worker_pool'),
+        'max_workers': CONF['monitor'].get('max_workers'),
+        'files': len(results),
+        'failed': sum(1 for result in results if result['failed']),
+        'seconds': wall,
+        'files_per_second': len(results) / wall if wall else 0,
+        'source_bytes': source_bytes,
+        'source_bytes_per_second': source_bytes / wall if wall else 0,
+        'bytes_written': bytes_written,
+        # KiB on Linux
+        'peak_rss_kib': {'self': self_rss, 'children': children_rss},
+        'files_seconds': {model: percentiles(seconds)
+                          for model, seconds in sorted(models.items())},
+        'stage_seconds': {name: percentiles(seconds)
+                          for name, seconds in sorted(stages.items())},
+    }
+
+
+@cli.command()
+@cli_helper.add_options(cli_helper.common_options)
+@click.option(
+    "--models",
+    default="fd,m1,m2",
+    show_default=True,
+    help="The models to make images for, comma separated.",
+)
+@click.option(
+    "--channels",
+    default="ch13",
+    show_default=True,
+    help="The channels to make images for, comma separated.",
+)
+@click.option(
+    "--frames",
+    type=click.IntRange(min=1),
+    default=4,
+    show_default=True,
+    help="How many images to make per model and channel.",
+)
+@click.option(
+    "--output",
+    type=click.Path(dir_okay=False, writable=True),
+    default=None,
+    help="Write the results to this JSON file instead of stdout.",
+)
+@click.option(
+    "--workdir",
+    type=click.Path(file_okay=False),
+    default=None,
+    help="Where to make the images (in watch/) and process them to (in "
+         "process/), a temporary directory by default.  Those are "
+         "removed afterwards unless --keep.",
+)
+@click.option(
+    "--keep",
+    is_flag=True,
+    default=False,
+    help="Don't remove the images afterwards.",
+)
+@click.pass_context
+@cli_helper.process_standard_options
+def benchmark(ctx, models, channels, frames, output, workdir, keep):
+    """Process a synthetic goestools tree and report how fast it went.
+
+    The image backend, pipeline, regions and workers are the ones in
+    the config file, so runs with different settings can be compared.
+    """
+    if not output:
+        # The results go to stdout
+        log.log_to_stderr()
+    models = [model.strip() for model in models.split(",") if model]
+    unknown = set(models) - set(MODELS)
+    if unknown:
+        LOG.error(f"Unknown models {sorted(unknown)}")
+        sys.exit(1)
+    channels = [chan.strip() for chan in channels.split(",") if chan]
+
+    temporary = not workdir
+    if temporary:
+        workdir = tempfile.mkdtemp(prefix="goesconvert-benchmark-")
+    watch_dir = os.path.join(workdir, "watch")
+    process_dir = os.path.join(workdir, "process")
+    LOG.info(f"Writing {len(models) * len(channels) * frames} synthetic "
+             f"images to '{watch_dir}'")
+    files = synthetic_tree(watch_dir, models, channels, frames)
+    source_bytes = sum(os.path.getsize(path) for path in files)
+
+    satellite = dict(CONF['monitor'].items())
+    satellite.update(satellite='goeseast', watch_dir=watch_dir,
+                     process_dir=process_dir)
+
+    workers = pool.WorkerPool(
+        max_workers=CONF['monitor'].get('max_workers'),
+        max_queue=CONF['monitor'].get('max_queue'),
+        kind=CONF['monitor'].get('worker_pool'),
+    )
+    results = []
+    start = time.perf_counter()
+    workers.start()
+    for path in files:
+        workers.submit(BenchmarkFile(path, satellite, results))
+    while len(workers):
+        time.sleep(0.05)
+    wall = time.perf_counter() - start
+    workers.stop()
+    workers.join()
+
+    stats = report(results, wall, source_bytes,
+                   retention.dir_size(process_dir))
+    if not keep:
+        # Only what we made, not the rest of a --workdir
+        for path in ([workdir] if temporary else [watch_dir, process_dir]):
+            shutil.rmtree(path, ignore_errors=True)
+
+    text = json.dumps(stats, indent=2)
+    if output:
+        with open(output, "w") as fp:
+            fp.write(text + "\n")
+        LOG.info(f"Wrote the results to '{output}'")
+    else:
+        click.echo(text)
@@ -1,31 +1,33 @@
-from datetime import datetime
+import collections
+from datetime import datetime, timedelta
 import concurrent.futures
 import logging
 import os
-import shutil
 import signal
-import subprocess
 import sys
 import threading
 import time
-import uuid
 
 import click
 from oslo_config import cfg
 from oslo_context import context
 from rich.console import Console
+from watchdog.observers import Observer
 from watchdog.observers.polling import PollingObserver
 from watchdog.events import FileSystemEventHandler
 
 from goesconvert import (
-    cli_helper, threads, utils
-)
-from goesconvert.utils.timezone import (
-    GMT, EST, PST
+    cli_helper, image, ledger, metrics, pipeline, regions, retention, scan,
+    threads, tracing, utils
 )
+from goesconvert.utils.timezone import GMT
+from goesconvert.image import animation, video
 from goesconvert.utils import trace
 
 from goesconvert.cli import cli
+from goesconvert.threads import debounce, pool, settle
+
+SATELLITES = ['goeseast', 'goeswest']
 
 monitor_group = cfg.OptGroup(name='monitor',
                              title='Monitor options')
@@ -35,8 +37,244 @@ monitor_opts = [
                default="./Verdana_Bold.ttf",
                help="Full file path to font you want for overlay in images"),
     cfg.StrOpt('satellite',
-               choices=['goeseast', 'goeswest'],
+               choices=SATELLITES,
                help="Which supported satellite to process."),
+    cfg.ListOpt('satellites',
+                default=[],
+                item_type=cfg.types.String(choices=SATELLITES),
+                help="Process several satellites in one process, each "
+                     "configured in a section of its own name, ie. "
+                     "[goeseast].  When not set, the satellite, watch_dir "
+                     "and crop areas in [monitor] are used."),
+    cfg.StrOpt('watch_dir',
+               help="The directory to look for new files from goestools."),
+    cfg.StrOpt('process_dir',
+               help="The directory to write processed files to."),
+    cfg.StrOpt('crop_usa',
+               default="2424x1424+720+280",
+               help="Crop area for USA"),
+    cfg.StrOpt('crop_ca',
+               default="1024x768+600+600",
+               help="Crop area for California"),
+    cfg.StrOpt('crop_va',
+               default="1024x768+2100+600",
+               help="Crop area for Virginia"),
+    cfg.StrOpt('regions_file',
+               default=None,
+               help="YAML file with the regions that can be cropped out "
+                    "of the full disk images.  See "
+                    "etc/goesconvert/regions.yaml.  Without it the "
+                    "regions are va, ca and usa, cropped at crop_va, "
+                    "crop_ca and crop_usa."),
+    cfg.StrOpt('pipeline_file',
+               default=None,
+               help="YAML file with the products to make out of each "
+                    "model and channel.  See etc/goesconvert/pipeline.yaml "
+                    "for the products made when it isn't set."),
+    cfg.StrOpt('image_backend',
+               default='pillow',
+               choices=['pillow', 'imagemagick'],
+               help="How to process images.  'pillow' decodes each source "
+                    "once in process and makes every output from it, "
+                    "'imagemagick' runs a convert command per step."),
+    cfg.StrOpt('resize_filter',
+               default='lanczos',
+               choices=['lanczos', 'bicubic', 'bilinear', 'box', 'nearest'],
+               help="The resampling filter for scaling images down, from "
+                    "the best looking to the fastest."),
+    cfg.StrOpt('copy_mode',
+               default='auto',
+               choices=['auto', 'reflink', 'hardlink', 'copy'],
+               help="How to copy source files that go to process_dir "
+                    "unchanged.  'reflink' clones them copy on write "
+                    "(btrfs, XFS), 'hardlink' links them, both fall back "
+                    "to a copy when watch_dir and process_dir aren't on "
+                    "the same filesystem.  'auto' tries a reflink, then a "
+                    "hard link."),
+    cfg.BoolOpt('animate_incremental',
+                default=True,
+                help="Update the animated gifs one frame at a time from "
+                     "cached encoded frames, instead of rebuilding them "
+                     "from every frame in the directory."),
+    cfg.IntOpt('command_timeout',
+               default=300,
+               min=0,
+               help="Kill external commands that run longer than this "
+                    "many seconds.  0 means no limit."),
+    cfg.IntOpt('command_memory_limit',
+               default=0,
+               min=0,
+               help="Address space limit in MiB for each external "
+                    "command.  0 means no limit."),
+    cfg.DictOpt('imagemagick_limits',
+                default={},
+                help="ImageMagick -limit settings for every convert run, "
+                     "ie. memory:1GiB,map:2GiB,threads:2"),
+    cfg.IntOpt('region_workers',
+               default=0,
+               min=0,
+               help="Crop, annotate and write the regions of a full disk "
+                    "image in a pool of this many processes, so they "
+                    "don't take turns on the GIL.  The image is decoded "
+                    "once and the processes read it out of shared memory. "
+                    "0 does the regions in the job's own worker.  Only "
+                    "used by the pillow image backend, with Python 3.8 "
+                    "or newer, and not with worker_pool = process before "
+                    "Python 3.9."),
+    cfg.BoolOpt('imagemagick_fused',
+                default=True,
+                help="Crop, annotate and write each region in one convert "
+                     "command, and cut all the regions of a full disk "
+                     "image out of a single convert run."),
+    cfg.IntOpt('animate_frames',
+               default=0,
+               min=0,
+               help="Only animate the newest N frames.  0 means all of "
+                    "them.  Only used by animate_incremental."),
+    cfg.IntOpt('animate_span',
+               default=0,
+               min=0,
+               help="Only animate frames up to N minutes older than the "
+                    "newest one.  0 means all of them.  Only used by "
+                    "animate_incremental."),
+    cfg.StrOpt('ledger',
+               default=None,
+               help="SQLite file to record the processing done for each "
+                    "source file in, so it isn't done again after a "
+                    "restart.  Disabled if not set."),
+    cfg.BoolOpt('catch_up',
+                default=False,
+                help="On startup, scan watch_dir for files that arrived "
+                     "while we weren't running and process them."),
+    cfg.IntOpt('catch_up_hours',
+               default=24,
+               min=0,
+               help="How far back the catch up scan goes.  0 means "
+                    "everything in watch_dir."),
+    cfg.StrOpt('observer',
+               default='native',
+               choices=['native', 'polling'],
+               help="How to watch watch_dir for new files.  'native' uses "
+                    "inotify and falls back to polling if it can't be "
+                    "set up.  Use 'polling' for NFS and other network "
+                    "filesystems, where inotify doesn't see changes."),
+    cfg.FloatOpt('poll_interval',
+                 default=1.0,
+                 help="Seconds between scans of watch_dir when polling."),
+    cfg.FloatOpt('settle_time',
+                 default=2.0,
+                 help="When there is no close event for a new file, it is "
+                      "complete once its size hasn't changed for this many "
+                      "seconds."),
+    cfg.IntOpt('settle_timeout',
+               default=300,
+               min=1,
+               help="Give up on new files that aren't complete after this "
+                    "many seconds."),
+    cfg.IntOpt('latency_report_interval',
+               default=300,
+               min=0,
+               help="Log the new file event latency every N seconds. "
+                    "0 disables the report."),
+    cfg.IntOpt('max_workers',
+               default=4,
+               min=1,
+               help="How many files to process at the same time."),
+    cfg.IntOpt('max_queue',
+               default=100,
+               min=0,
+               help="How many new files of one satellite and model can "
+                    "wait for a free worker before whoever queues them "
+                    "blocks.  Each satellite and model has its own queue.  "
+                    "0 means no limit."),
+    cfg.StrOpt('worker_pool',
+               default='thread',
+               choices=['thread', 'process'],
+               help="Run the workers as threads or as processes."),
+    cfg.BoolOpt('drain_on_stop',
+                default=False,
+                help="Finish all queued files when stopping instead of "
+                     "dropping them."),
+    cfg.DictOpt('model_weights',
+                default={'fd': '1', 'm1': '4', 'm2': '4'},
+                help="How many turns the files of each model get in the "
+                     "worker queue, relative to each other.  The default "
+                     "lets the quick mesoscale files ahead of the full "
+                     "disk ones."),
+    cfg.DictOpt('model_deadlines',
+                default={},
+                help="Drop queued files of a model that are still waiting "
+                     "N seconds after they were written, ie. m1:600.  "
+                     "Dropped files are picked up by the next backfill."),
+    cfg.IntOpt('animate_interval',
+               default=10,
+               min=0,
+               help="Rebuild each animation at most once every N seconds, "
+                    "with all the new frames since the last rebuild.  0 "
+                    "rebuilds it for every new frame right away."),
+    cfg.BoolOpt('supersede_animations',
+                default=True,
+                help="Skip rebuilding an animation for a file when a "
+                     "newer file for the same animation is still queued "
+                     "as it starts.  The newer file waits for it to be "
+                     "done, so its rebuild includes both frames."),
+    cfg.IntOpt('video_framerate',
+               default=10,
+               min=1,
+               help="Frames per second of the HLS videos."),
+    cfg.IntOpt('video_segment_frames',
+               default=1,
+               min=1,
+               help="How many frames go into each segment of the HLS "
+                    "videos.  With 1 every new frame is a new segment."),
+    cfg.IntOpt('video_idle_timeout',
+               default=3600,
+               min=1,
+               help="Stop the ffmpeg streaming a video after no new "
+                    "frames came in for this many seconds."),
+    cfg.DictOpt('retention_days',
+                default={},
+                help="Remove the processed images of a model after this "
+                     "many days, ie. fd:30,m1:7,m2:7.  A product can be "
+                     "kept for less with keep_days in the pipeline_file."),
+    cfg.DictOpt('retention_max_gb',
+                default={},
+                help="Remove the oldest days of processed images of a "
+                     "model while it takes up more than this many GiB, "
+                     "ie. fd:100."),
+    cfg.IntOpt('retention_interval',
+               default=3600,
+               min=60,
+               help="Seconds between checks for processed images to "
+                    "remove."),
+    cfg.IntOpt('retention_delete_rate',
+               default=500,
+               min=0,
+               help="Delete at most this many files a second when "
+                    "removing old days.  0 means no limit."),
+    cfg.StrOpt('metrics_host',
+               default='127.0.0.1',
+               help="Address to serve /metrics and /health on."),
+    cfg.PortOpt('metrics_port',
+                default=None,
+                help="Port to serve /metrics and /health on.  Disabled "
+                     "if not set."),
+    cfg.StrOpt('trace_spans_file',
+               default=None,
+               help="Append a trace of each new file, from its mtime "
+                    "through detection, settling, queueing and every "
+                    "stage, to this file as JSON lines.  Disabled if "
+                    "not set."),
+    cfg.StrOpt('trace_otlp_url',
+               default=None,
+               help="Send the traces of the new files to an OpenTelemetry "
+                    "collector at this OTLP/HTTP url, ie. "
+                    "http://127.0.0.1:4318/v1/traces.  Disabled if not "
+                    "set."),
+]
+
+# The options for each satellite listed in [monitor] satellites
+satellite_opts = [
     cfg.StrOpt('watch_dir',
                help="The directory to look for new files from goestools."),
     cfg.StrOpt('process_dir',
@@ -49,13 +287,17 @@ monitor_opts = [
                help="Crop area for California"),
     cfg.StrOpt('crop_va',
                default="1024x768+2100+600",
-               help="Crop area for Virginia")
+               help="Crop area for Virginia"),
 ]
 
 
 CONF = cfg.CONF
 CONF.register_group(monitor_group)
 CONF.register_opts(monitor_opts, group=monitor_group)
+for _name in SATELLITES:
+    CONF.register_group(cfg.OptGroup(name=_name,
+                                     title=f"{_name} satellite options"))
+    CONF.register_opts(satellite_opts, group=_name)
 LOG = logging.getLogger("goesconvert")
 
 
@@ -63,6 +305,56 @@ SCRIPT_DIR = "/home/goes/bin"
 FONT = f"{SCRIPT_DIR}/Verdana_Bold.ttf"
 
 
+def satellite_configs():
+    """The config of every satellite to process, as plain dicts."""
+    names = CONF['monitor'].get('satellites')
+    if not names:
+        if not CONF['monitor'].get('satellite'):
+            return []
+        return [dict(CONF['monitor'].items())]
+
+    configs = []
+    for name in names:
+        satellite = dict(CONF[name].items())
+        satellite['satellite'] = name
+        configs.append(satellite)
+    return configs
+
+
+def retention_sweepers():
+    """A Sweeper for each process_dir that has a retention policy."""
+    pipe = pipeline.get_pipeline(CONF['monitor'].get('pipeline_file'))
+    models = (set(CONF['monitor'].get('retention_days'))
+              | set(CONF['monitor'].get('retention_max_gb'))
+              | set(pipe.config))
+    policies = {}
+    for model in sorted(models):
+        policy = retention.Policy(
+            days=_model_setting('retention_days', model),
+            max_bytes=int(float(CONF['monitor'].get('retention_max_gb')
+                                .get(model, 0)) * 1024 ** 3),
+            products=pipe.keep_days(model),
+        )
+        if policy.days or policy.max_bytes or policy.products:
+            policies[model] = policy
+    if not policies:
+        return []
+
+    process_dirs = sorted({satellite.get('process_dir')
+                           for satellite in satellite_configs()
+                           if satellite.get('process_dir')})
+    return [retention.Sweeper(process_dir, policies)
+            for process_dir in process_dirs]
+
+
+def configure_tracing():
+    """Send the per file traces where [monitor] says."""
+    tracing.configure(
+        spans_file=CONF['monitor'].get('trace_spans_file'),
+        otlp_url=CONF['monitor'].get('trace_otlp_url'),
+    )
+
+
 def signal_handler(sig, frame):
     click.echo("signal_handler: called")
     num_threads = len(threads.WaltThreadList())
@@ -71,50 +363,252 @@ def signal_handler(sig, frame):
     click.echo("signal_handler: Done")
 
 
-class ProcessSatelliteFile(threads.WaltThread):
+def file_stages(model, chan):
+    """The pipeline stages for a file of model and chan."""
+    return pipeline.get_pipeline(
+        CONF['monitor'].get('pipeline_file')).stages(model, chan)
 
-    def __init__(self, new_file, satellite):
+
+def _model_setting(option, model):
+    return int(CONF['monitor'].get(option).get(model, 0))
+
+
+def _run_stage(fh, stage):
+    """Run one pipeline stage, returns whether it worked."""
+    start = time.perf_counter()
+    with tracing.activate(fh.trace), tracing.span(stage.name) as span:
+        try:
+            getattr(fh, stage.method)(**stage.kwargs)
+        except Exception as ex:
+            LOG.error(f"'{stage.name}' failed for {fh.source}: {ex}")
+            metrics.STAGE_FAILURES.inc(model=fh.model, stage=stage.name)
+            if span is not None:
+                span.error = str(ex)
+            return False
+        finally:
+            metrics.STAGE_SECONDS.observe(time.perf_counter() - start,
+                                          model=fh.model, stage=stage.name)
+    return True
+
+
+def trace_settled(job, first_event_ns=None):
+    """Add the detect and settle spans to the trace of a new file's job.
+
+    detect goes from the last write to the file until the first event
+    for it, settle from there until it was completely written.
+    """
+    file_trace = job.fh.trace
+    if file_trace is None:
+        return
+    now = utils.time_ns()
+    first_event_ns = first_event_ns or now
+    mtime_ns = os.stat(job.new_file).st_mtime_ns
+    # Written in place, the events came in while it was being written.
+    file_trace.add_span("detect", start_ns=min(mtime_ns, first_event_ns),
+                        end_ns=first_event_ns)
+    file_trace.add_span("settle", start_ns=first_event_ns, end_ns=now)
+
+
+class ProcessSatelliteFile(object):
+    """A job for the WorkerPool that processes one new file.
+
+    With an animator (a Debouncer), the animations aren't rebuilt here.
+    run() returns the animate stages instead, and finished() hands them
+    to the animator, back in the process that queued the job.  The same
+    goes for the video stages with streams (VideoStreams), so the
+    frames of a video all go to the one ffmpeg streaming it.
+    """
+
+    def __init__(self, new_file, satellite, ledger=None, animator=None,
+                 streams=None):
         self.fh = FileHandler(new_file=new_file, satellite=satellite)
-        thread_name = f"{self.fh.model}/{self.fh.chan}"
+        self.name = f"{self.fh.model}/{self.fh.chan}"
         self.new_file = new_file
         self.satellite = satellite
-        LOG.debug(f"Thread name {thread_name}")
-        super().__init__(thread_name)
+        self.ledger = ledger
+        self.animator = animator
+        self.streams = streams
+        self.defer_animations = animator is not None
+        self.defer_video = streams is not None
+        self.thread_stop = False
+        self.superseded = False
+        self.queued_ns = utils.time_ns()
+
+        # How the WorkerPool schedules us
+        satellite_name = satellite.get('satellite')
+        self.key = (satellite_name, self.fh.model)
+        self.weight = _model_setting('model_weights', self.fh.model) or 1
+        self.deadline = None
+        max_wait = _model_setting('model_deadlines', self.fh.model)
+        if max_wait:
+            self.deadline = os.stat(new_file).st_mtime + max_wait
+        self.supersedes = None
+        # Not with a deadline, the pool could drop us after we had the
+        # older job skip its animations.
+        if (CONF['monitor'].get('supersede_animations')
+                and not self.defer_animations and self.deadline is None):
+            # The animations go by day, a file from the next day doesn't
+            # rebuild the ones of the day before.
+            self.supersedes = tuple(sorted(
+                self.fh.animation_file(**stage.kwargs)
+                for stage in self.fh.stages
+                if stage.method == "animate")) or None
+
+    def __repr__(self):
+        return f"<ProcessSatelliteFile {self.name} '{self.new_file}'>"
+
+    def __getstate__(self):
+        # The animator and the streams stay behind when we're sent to a
+        # worker process
+        state = self.__dict__.copy()
+        state['animator'] = None
+        state['streams'] = None
+        return state
+
+    def stop(self):
+        self.thread_stop = True
+        self.fh.stop()
+
+    def supersede(self):
+        """A newer file will rebuild the same animations, skip ours.
+
+        The pool doesn't start the newer file before we're done, so our
+        frames are there for its rebuild (see pool.FairQueue).
+        """
+        self.superseded = True
 
-    def loop(self):
-        pass
+    def run(self):
+        file_trace = self.fh.trace
+        if file_trace is not None:
+            file_trace.add_span("queue", start_ns=self.queued_ns,
+                                end_ns=utils.time_ns())
+        model = self.fh.model
+        stat = os.stat(self.new_file)
+        done = set()
+        if self.ledger:
+            done = self.ledger.done(self.new_file, stat)
+
+        def record(stage):
+            if self.ledger:
+                self.ledger.record(self.new_file, stat, stage.name)
+
+        if self.superseded:
+            metrics.JOBS_DROPPED.inc(reason="superseded")
+
+        skipped, failed = self.fh.process(
+            done=done, record=record,
+            animate=not (self.defer_animations or self.superseded),
+            video=not self.defer_video)
+        deferred = [stage for stage in skipped if stage.method == "video"]
+        animations = [stage for stage in skipped if stage.method != "video"]
+        if self.defer_animations:
+            deferred.extend(animations)
+        elif self.superseded:
+            # Done by the newer file, so count them as done for us.
+            for stage in animations:
+                LOG.debug("'%s' superseded for %s", stage.name, self.new_file)
+                record(stage)
+
+        if done != {stage.name for stage in self.fh.stages}:
+            metrics.BYTES_READ.inc(stat.st_size, model=model)
+            if not failed and not self.thread_stop:
+                metrics.END_TO_END_SECONDS.observe(
+                    max(0.0, time.time() - stat.st_mtime), model=model)
+        if file_trace is not None:
+            file_trace.root.attributes.update(failed=failed,
+                                              superseded=self.superseded)
+            tracing.export(file_trace)
+        LOG.debug("Done with %s", self.name)
+        return deferred
+
+    def _recorder(self, stage):
+        if not self.ledger:
+            return None
+
+        def record():
+            try:
+                stat = os.stat(self.new_file)
+            except OSError:
+                return
+            self.ledger.record(self.new_file, stat, stage.name)
+        return record
+
+    def finished(self, deferred):
+        """Hand the stages run() left over to the animator or streams."""
+        for stage in deferred or []:
+            if stage.method == "video":
+                self.streams.request(
+                    self.fh.video_file(**stage.kwargs),
+                    (self.fh.frame_file(stage.kwargs.get('region'),
+                                        stage.kwargs.get('subdest')),
+                     self._recorder(stage)))
+            else:
+                self.animator.request(
+                    self.fh.animation_file(**stage.kwargs),
+                    (self.new_file, stage))
+
+
+class AnimateFiles(object):
+    """A job that rebuilds one animation for several new files at once."""
+
+    def __init__(self, new_files, satellite, stage, ledger=None):
+        # The frames are named by time, so the newest file sorts last
+        self.new_files = sorted(set(new_files))
+        self.fh = FileHandler(new_file=self.new_files[-1],
+                              satellite=satellite)
+        self.name = f"{self.fh.model}/{self.fh.chan} {stage.name}"
+        self.stage = stage
+        self.ledger = ledger
+        self.key = (satellite.get('satellite'), self.fh.model)
+        self.weight = _model_setting('model_weights', self.fh.model) or 1
+
+    def __repr__(self):
+        return f"<AnimateFiles {self.name} {len(self.new_files)} files>"
 
     def run(self):
-        if self.fh.model == 'fd':
-            # We want to crop for both CA and VA
-            if not self.thread_stop:
-                self.fh.crop(region='va')
-            if not self.thread_stop:
-                self.fh.crop(region='ca')
-            if not self.thread_stop:
-                self.fh.crop(region='usa')
-            if not self.thread_stop:
-                self.fh.copy(subdest="animate", overlay=False, resize=True)
-
-            if not self.thread_stop:
-                self.fh.animate(region='va')
-            if not self.thread_stop:
-                self.fh.animate(region='ca')
-            if not self.thread_stop:
-                self.fh.animate(region='usa')
-            if not self.thread_stop:
-                self.fh.animate_fd()
-        else:
-            # This is an m1 or m2 file
-            # We copy and animate
-            if not self.thread_stop:
-                self.fh.copy()
-            if not self.thread_stop:
-                self.fh.animate()
-
-        threads.WaltThreadList().remove(self)
-        LOG.debug("Exiting")
-        return False
+        LOG.debug("Rebuild %s for %d files", self.stage.name,
+                  len(self.new_files))
+        ok = _run_stage(self.fh, self.stage)
+        self.fh.close()
+        if self.fh.trace is not None:
+            self.fh.trace.root.attributes.update(files=len(self.new_files))
+            tracing.export(self.fh.trace)
+        if ok and self.ledger:
+            for new_file in self.new_files:
+                try:
+                    stat = os.stat(new_file)
+                except OSError:
+                    continue
+                self.ledger.record(new_file, stat, self.stage.name)
+
+
+def video_streams():
+    """The VideoStreams for the videos of every satellite."""
+    return video.VideoStreams(
+        interval=CONF['monitor'].get('animate_interval'),
+        framerate=CONF['monitor'].get('video_framerate'),
+        segment_frames=CONF['monitor'].get('video_segment_frames'),
+        idle_timeout=CONF['monitor'].get('video_idle_timeout'),
+    )
+
+
+def animation_debouncer(satellite, workers, ledger=None):
+    """A Debouncer that queues up one AnimateFiles per animation.
+
+    :returns: None if animate_interval is 0, when every file rebuilds
+              its animations itself.
+    """
+    interval = CONF['monitor'].get('animate_interval')
+    if not interval:
+        return None
+
+    def rebuild(animation_file, requests):
+        new_files = [new_file for new_file, _ in requests]
+        workers.submit(AnimateFiles(new_files, satellite, requests[0][1],
+                                    ledger=ledger))
+
+    name = f"Debouncer:{satellite.get('satellite')}"
+    return debounce.Debouncer(rebuild, interval, name=name)
 
 
 class FileHandler(object):
@@ -123,44 +617,61 @@ class FileHandler(object):
 
     def __init__(self, new_file, satellite):
         satellite_name = satellite.get('satellite')
-        context.RequestContext(request_id=uuid.uuid4())
+        self.context = context.RequestContext()
         # LOG.info(f"FH for : {new_file} from {satellite_name}")
         self.source = new_file
         self.satellite = satellite
         self.satellite_dir = satellite.get('watch_dir')
         self.process_dir = satellite.get('process_dir')
-        self._commands = {
-            'convert': shutil.which('convert')
-        }
+        self.thread_stop = False
+        memory_limit = CONF['monitor'].get('command_memory_limit')
+        self.image = image.get_backend(
+            CONF['monitor'].get('image_backend'),
+            self.source,
+            font_path=CONF['monitor'].get('font_path'),
+            command_timeout=CONF['monitor'].get('command_timeout'),
+            memory_limit=memory_limit * 1024 * 1024 if memory_limit else None,
+            imagemagick_limits=CONF['monitor'].get('imagemagick_limits'),
+            imagemagick_fused=CONF['monitor'].get('imagemagick_fused'),
+            resize_filter=CONF['monitor'].get('resize_filter'),
+            copy_mode=CONF['monitor'].get('copy_mode'),
+            region_workers=CONF['monitor'].get('region_workers'),
+        )
         self._collect_info()
+        self.trace = tracing.start(self.context.request_id, new_file,
+                                   satellite=satellite_name,
+                                   model=self.model, chan=self.chan)
 
     def _collect_info(self):
-        context.RequestContext(request_id=uuid.uuid4())
         #LOG.info(f"Process {self.source}")
         basename = os.path.basename(self.source)
         self.dirname = os.path.dirname(self.source)
         base_path = self.dirname.replace(self.satellite_dir, "")
         components = base_path.split('/')
-        LOG.debug(f"Components {components}")
+        LOG.debug("Components %s", components)
         self.model = components[1]
         self.chan = components[3]
 
         time_str = basename.replace(".png","")
         dto = datetime.strptime(time_str, '%Y-%m-%dT-%H-%M-%SZ')
         self.file_time = dto.replace(tzinfo=GMT)
-        self.va_date = self.file_time.astimezone(EST)
-        self.ca_date = self.file_time.astimezone(PST)
         self.gmt_date = self.file_time.astimezone(GMT)
+        self.stages = file_stages(self.model, self.chan)
+
+    def _region(self, name):
+        return regions.get_registry(
+            CONF['monitor'].get('regions_file')).get(name, self.satellite)
+
+    def _local_time(self, region=None):
+        """The time of the file in the timezone of region."""
+        if region is None:
+            return self.file_time
+        return self.file_time.astimezone(self._region(region).timezone)
 
     def _destination(self, region=None):
         date_str = "%Y-%m-%d"
         if region is not None:
-            if region == 'va':
-                date = self.va_date.strftime(date_str)
-            elif region == 'ca':
-                date = self.ca_date.strftime(date_str)
-            else:
-                date = self.va_date.strftime(date_str)
+            date = self._local_time(region).strftime(date_str)
 
             destination = ("%s/%s/%s/%s/%s" % (self.process_dir,
                                                self.model,
@@ -176,14 +687,20 @@ class FileHandler(object):
         return destination
 
     def _ensure_src(self):
-        LOG.debug(f"make sure '{self.source}' exists")
-        # make sure the source file exists and is written to the fs
-        while not os.path.exists(self.source):
-            LOG.debug(f"'{self.source}' isn't ready yet")
-            time.sleep(1)
+        # The WriteSettler only hands us completely written files,
+        # but it might have been removed since.
+        if not os.path.exists(self.source):
+            raise FileNotFoundError(f"'{self.source}' is gone")
+
+    def _written(self, image_file):
+        try:
+            size = os.path.getsize(image_file)
+        except OSError:
+            return
+        metrics.BYTES_WRITTEN.inc(size, model=self.model)
 
     def _ensure_dir(self, destination):
-        LOG.debug(f"make sure '{destination}' exists")
+        LOG.debug("make sure '%s' exists", destination)
         os.makedirs(destination, exist_ok=True)
 
     def file_exists(self, destination):
@@ -192,53 +709,37 @@ class FileHandler(object):
         else:
             return False
 
-    @utils.timeit
-    def _execute(self, cmd):
-        command = ' '.join(cmd)
-        # LOG.debug(f"EXEC '{command}'")
-        try:
-            out = subprocess.run(command, shell=True, check=False,
-                                 encoding="utf-8",
-                                 stdout=subprocess.PIPE,
-                                 stderr=subprocess.PIPE)
-            if len(out.stdout):
-                LOG.debug(f"OUT = '{out.stdout.encode('utf-8')}'")
-            if len(out.stderr):
-                LOG.warning(f"ERR = '{out.stderr.encode('utf-8')}'")
-
-        except Exception as ex:
-            LOG.exception(f"FAIL {ex}")
-
-    def crop(self, region):
-        """ Crop a Full Disc image to cover a specific region. """
-        LOG.info(f"Crop fd image for '{region}'")
+    def _crop_file(self, region):
         dest = self._destination(region)
-        self._ensure_src()
-        self._ensure_dir(dest)
         newfile_fmt = "%H-%M-%S"
-        if region == "va":
-            resolution = self.satellite.get('crop_va')
-            newfile_name = "%s.png" % self.va_date.strftime(newfile_fmt)
-        elif region == "ca":
-            resolution = self.satellite.get('crop_ca')
-            newfile_name = "%s.png" % self.ca_date.strftime(newfile_fmt)
-        elif region == 'usa':
-            resolution = self.satellite.get('crop_usa')
-            newfile_name = "%s.png" % self.va_date.strftime(newfile_fmt)
-
-        newfile = f"{dest}/{newfile_name}"
-        if not self.file_exists(newfile):
-            crop_cmd = [
-                self._commands['convert'],
-                "%s" % self.source,
-                "-crop", '"%s"' % resolution,
-                "+repage", "%s" % newfile
-            ]
-            self._execute(crop_cmd)
-            self.overlay(newfile, region)
-
-    def copy(self, subdest=None, overlay=True, resize=False):
-        """Copy a full disc image to destination. """
+        newfile_name = "%s.png" % self._local_time(region).strftime(
+            newfile_fmt)
+        return self._region(region).geometry, f"{dest}/{newfile_name}"
+
+    def crop_regions(self, regions, unlabeled=()):
+        """Crop a Full Disc image for several regions in one pass.
+
+        :param unlabeled: the regions that don't get the time on them.
+        """
+        crops = []
+        for region in regions:
+            resolution, newfile = self._crop_file(region)
+            if not self.file_exists(newfile):
+                self._ensure_dir(os.path.dirname(newfile))
+                label = None
+                if region not in unlabeled:
+                    label = self._label(region)
+                crops.append((resolution, newfile, label,
+                              self._region(region).size))
+
+        if crops:
+            LOG.info(f"Crop fd image for {len(crops)} regions")
+            self._ensure_src()
+            self.image.crop_regions(crops)
+            for _, newfile, _, _ in crops:
+                self._written(newfile)
+
+    def _copy_file(self, subdest=None):
         if subdest:
             dest = "%s/%s" % (self._destination(region=None), subdest)
         else:
@@ -246,148 +747,373 @@ class FileHandler(object):
 
         newfile_fmt = "%H-%M-%S"
         newfile_name = self.file_time.strftime(newfile_fmt)
-        dest_file = "%s/%s.png" % (dest, newfile_name)
+        return "%s/%s.png" % (dest, newfile_name)
+
+    def copy(self, subdest=None, overlay=True, scale=None):
+        """Copy a full disc image to destination. """
+        dest_file = self._copy_file(subdest)
+        dest = os.path.dirname(dest_file)
         LOG.debug("copy image to destination '%s'", dest_file)
 
         self._ensure_src()
         self._ensure_dir(dest)
         if not self.file_exists(dest_file):
-            shutil.copyfile(self.source, dest_file)
-            if resize:
-                self.resize(dest_file)
-
-            if overlay:
-                self.overlay(dest_file)
-
-    def resize(self, dest_file):
-        # rescale the file down to something manageable in size
-        # the raw fd images are 5240x5240
-        cmd = [self._commands['convert'],
-                dest_file,
-                "-resize", "25%",
-                dest_file]
-        self._execute(cmd)
-
-    def animate(self, region=None):
+            # rescale the file down to something manageable in size
+            # the raw fd images are 5240x5240
+            self.image.copy(dest_file, scale=scale,
+                            label=self._label() if overlay else None)
+            self._written(dest_file)
+
+    def _tiles_dir(self, subdest=None):
+        dest = self._frames_dir(subdest=subdest)
+        return "%s/%s" % (dest, self.file_time.strftime("%H-%M-%S"))
+
+    def tiles(self, subdest=None, tile_size=256):
+        """Cut the image into an XYZ tile pyramid for the web map."""
+        frame_dir = self._tiles_dir(subdest)
+        manifest = os.path.join(frame_dir, image.tiles.MANIFEST)
+        if self.file_exists(manifest):
+            return
+
+        self._ensure_src()
+        self._ensure_dir(frame_dir)
+        # Link the tiles that didn't change to the frame before this one.
+        parent, name = os.path.split(frame_dir)
+        previous = sorted(d for d in os.listdir(parent)
+                          if d < name and os.path.exists(os.path.join(
+                              parent, d, image.tiles.MANIFEST)))
+        previous = os.path.join(parent, previous[-1]) if previous else None
+        written, linked, nbytes = self.image.tiles(
+            frame_dir, tile_size=tile_size, previous=previous)
+        LOG.info(f"Wrote {written} tiles to '{frame_dir}', "
+                 f"linked {linked} unchanged")
+        metrics.BYTES_WRITTEN.inc(nbytes, model=self.model)
+
+    def outputs(self):
+        """The image files processing this source creates."""
+        outputs = []
+        for stage in self.stages:
+            if stage.method == "crop_regions":
+                outputs.extend(self._crop_file(region)[1]
+                               for region in stage.kwargs['regions'])
+            elif stage.method == "copy":
+                outputs.append(self._copy_file(stage.kwargs['subdest']))
+            elif stage.method == "tiles":
+                outputs.append(os.path.join(
+                    self._tiles_dir(stage.kwargs['subdest']),
+                    image.tiles.MANIFEST))
+        return outputs
+
+    def _frames_dir(self, region=None, subdest=None):
         dest = self._destination(region=region)
+        if subdest:
+            dest = "%s/%s" % (dest, subdest)
+        return dest
+
+    def animate(self, region=None, subdest=None, name="animate.gif"):
+        dest = self._frames_dir(region=region, subdest=subdest)
         LOG.info(f"animate directory '{dest}'")
-        dest_file = "%s/animate.gif" % dest
-        self._animated_gif("%s/*.png" % dest,
-                           "%s" % dest_file)
-
-    def _animated_gif(self, source, destination):
-        cmd = [
-            self._commands['convert'],
-            "-loop",
-            "0",
-            "-delay",
-            "15",
-            source,
-            destination]
-        self._execute(cmd)
-
-    def animate_fd(self):
-        dest = "%s/animate" % self._destination(region=None)
-        file_webm = "%s/earth.webm" % dest
-        file_gif = "%s/earth.gif" % dest
-
-        self._animated_gif("%s/*.png" % dest,
-                           file_gif)
-        #cmd = ["ffmpeg", "-y",
-        #       "-framerate", "10",
-        #       "-pattern_type", "glob",
-        #       "-i", "'%s/*.png'" % dest,
-        #       "-c:v", "libvpx-vp9",
-        #       #"-b:v", "3M",
-        #       "-b:v", "0",
-        #       "-crf", "15",
-        #       "-c:a", "libvorbis",
-        #       file_webm]
-        #self._execute(cmd)
-
-        #cmd = ["ffmpeg", "-y",
-        #       "-i", file_webm,
-        #       "-loop", "0",
-        #       file_gif]
-        #self._execute(cmd)
-
-    def overlay(self, image_file, region=None):
+        self._animated_gif(dest, "%s/%s" % (dest, name))
+
+    def _animated_gif(self, frames_dir, destination):
+        if CONF['monitor'].get('animate_incremental'):
+            animation.GifAnimator(
+                frames_dir, destination,
+                max_frames=CONF['monitor'].get('animate_frames'),
+                max_span=CONF['monitor'].get('animate_span'),
+                delay=15,
+            ).update()
+        else:
+            self.image.animate("%s/*.png" % frames_dir, destination,
+                               delay=15)
+        self._written(destination)
+
+    def animation_file(self, region=None, subdest=None, name="animate.gif"):
+        """The file animate() writes to."""
+        return "%s/%s" % (self._frames_dir(region=region, subdest=subdest),
+                          name)
+
+    def frame_file(self, region=None, subdest=None):
+        """The frame this file adds to the animations of region or subdest."""
+        if region is not None:
+            return self._crop_file(region)[1]
+        return self._copy_file(subdest)
+
+    def video_file(self, region=None, subdest=None, name="video.m3u8"):
+        """The playlist video() appends to."""
+        return "%s/%s" % (self._frames_dir(region=region, subdest=subdest),
+                          name)
+
+    def video(self, region=None, subdest=None, name="video.m3u8"):
+        """Append the frame of this file to the video.
+
+        The monitor streams the frames of each video into one ffmpeg that
+        keeps running (see VideoStreams), this runs one just for this
+        frame.
+        """
+        stream = video.HlsStream(
+            self.video_file(region=region, subdest=subdest, name=name),
+            framerate=CONF['monitor'].get('video_framerate'),
+            segment_frames=CONF['monitor'].get('video_segment_frames'))
+        try:
+            stream.append(self.frame_file(region=region, subdest=subdest))
+        finally:
+            stream.close()
+
+    def _label(self, region=None):
         human_date_fmt = "%A %b %e, %Y  %T  %Z"
+        human_date = self._local_time(region).strftime(human_date_fmt)
         if region:
-            font_size = "24"
-            if region == "va":
-                human_date = self.va_date.strftime(human_date_fmt)
-            elif region == "ca":
-                human_date = self.ca_date.strftime(human_date_fmt)
-            elif region == "usa":
-                human_date = self.va_date.strftime(human_date_fmt)
+            font_size = 24
+            title = self._region(region).label
+            if title:
+                human_date = f"{title}  {human_date}"
         else:
-            font_size = "12"
-            human_date = self.file_time.strftime(human_date_fmt)
-
-        cmd = [self._commands['convert'],
-               image_file,
-               "-quality", "90",
-               "-font", CONF['monitor'].get('font_path'),
-               "-fill", '"#0004"', "-draw", "'rectangle 0,2000,2560,1820'",
-               "-pointsize", font_size, "-gravity", "southwest",
-               "-fill", "white", "-gravity", "southwest", "-annotate", "+2+10", '"%s"' % human_date,
-               "-fill", "white", "-gravity", "southeast", "-annotate", "+2+10", '"wx.hemna.com"',
-               image_file]
-        self._execute(cmd)
-
-    def process(self, animate=True):
-        self._collect_info()
-        if self.model == 'fd':
-            # We want to crop for both CA and VA
-            self.crop(region='va')
-            self.crop(region='ca')
-            self.crop(region='usa')
-            self.copy(subdest="animate", overlay=False, resize=True)
-
-            if animate:
-                self.animate(region='va')
-                self.animate(region='ca')
-                self.animate(region='usa')
-                self.animate_fd()
-        else:
-            # This is an m1 or m2 file
-            # We copy and animate
-            self.copy()
-            if animate:
-              self.animate()
+            font_size = 12
+
+        return image.Label(human_date, font_size)
+
+    def close(self):
+        """Drop the decoded source image, if any."""
+        self.image.close()
+
+    def stop(self):
+        """Don't start any more stages in process()."""
+        self.thread_stop = True
+
+    def process(self, done=(), animate=True, record=None, video=True):
+        """Run the pipeline stages for the file.
+
+        A stage is skipped when a stage it comes after failed.
+
+        :param done: the names of the stages that are already done.
+        :param animate: run the animate stages too.
+        :param record: called with every stage that worked.
+        :param video: run the video stages too.
+        :returns: the animate and video stages that weren't run, and
+                  whether any stage failed.
+        """
+        skipped = []
+        failed = set()
+        with tracing.activate(self.trace), tracing.span("process"):
+            for stage in self.stages:
+                if self.thread_stop:
+                    break
+                if stage.name in done:
+                    LOG.debug("'%s' already done for %s", stage.name,
+                              self.source)
+                    continue
+                if failed.intersection(stage.after):
+                    LOG.debug("Skipping '%s' for %s", stage.name, self.source)
+                    failed.add(stage.name)
+                    continue
+                if stage.method == "animate" and not animate:
+                    skipped.append(stage)
+                    continue
+                if stage.method == "video" and not video:
+                    skipped.append(stage)
+                    continue
+
+                if not _run_stage(self, stage):
+                    failed.add(stage.name)
+                    continue
+                if record:
+                    record(stage)
+
+        self.close()
+        return skipped, bool(failed)
+
+
+class Backfill(threads.WaltThread):
+    """Scan watch_dir and queue up every file that isn't processed yet.
+
+    The scan streams through the tree one directory at a time, oldest
+    file first, and hands the files to the worker pool, which blocks
+    when it's full.  With a ledger, a whole directory of finished files
+    is checked with one query, otherwise each file's outputs are checked.
+    """
+
+    def __init__(self, satellite, workers, ledger=None, since=None,
+                 animator=None, streams=None):
+        self.satellite = dict(satellite.items())
+        super().__init__(f"Backfill:{self.satellite.get('satellite')}")
+        self.workers = workers
+        self.ledger = ledger
+        self.animator = animator
+        self.streams = streams
+        self.since = since
+        self.queued = 0
+        self.skipped = 0
+
+    def _finished(self, dirpath, fh):
+        if not self.ledger:
+            return {}
+        stages = [stage.name for stage in fh.stages]
+        return self.ledger.finished(stages, directory=dirpath)
+
+    def _pending(self, entry, fh, finished):
+        if self.ledger:
+            st = entry.stat()
+            return finished.get(entry.path) != (st.st_mtime_ns, st.st_size)
+        return not all(os.path.exists(f) for f in fh.outputs())
+
+    def loop(self):
+        watch_dir = self.satellite.get('watch_dir')
+        LOG.info(f"Backfill '{watch_dir}' since {self.since}")
+        for dirpath, entries in scan.iter_dirs(watch_dir, since=self.since):
+            finished = None
+            for entry in entries:
+                if self.thread_stop:
+                    return False
+                try:
+                    job = ProcessSatelliteFile(new_file=entry.path,
+                                               satellite=self.satellite,
+                                               ledger=self.ledger,
+                                               animator=self.animator,
+                                               streams=self.streams)
+                except Exception as ex:
+                    LOG.warning(f"Skipping '{entry.path}': {ex}")
+                    continue
+
+                if not job.fh.stages:
+                    # Nothing configured for this model and channel
+                    self.skipped += 1
+                    continue
+                if finished is None:
+                    finished = self._finished(dirpath, job.fh)
+                if not self._pending(entry, job.fh, finished):
+                    self.skipped += 1
+                    continue
+                # Old files are what we are here for, don't let the
+                # deadlines drop them.
+                job.deadline = None
+
+                if not self.workers.submit(job):
+                    return False
+                self.queued += 1
+
+        LOG.info(f"Backfill done, queued {self.queued} files, "
+                 f"{self.skipped} were already done")
+        return False
+
+
+class EventLatency(object):
+    """How long it takes for new files to show up as watchdog events.
+
+    The latency is the time between the last write to the file and the
+    event reaching us.
+    """
+
+    def __init__(self, observer_name, size=10000):
+        self.observer_name = observer_name
+        self.samples = collections.deque(maxlen=size)
+        self.lock = threading.Lock()
+
+    def record(self, path):
+        try:
+            latency = time.time() - os.stat(path).st_mtime
+        except OSError:
+            return
+        latency = max(0.0, latency)
+        metrics.EVENT_LATENCY_SECONDS.observe(latency,
+                                              observer=self.observer_name)
+        with self.lock:
+            self.samples.append(latency)
+
+    def report(self):
+        with self.lock:
+            samples = sorted(self.samples)
+            self.samples.clear()
+        if not samples:
+            return
+
+        def pct(p):
+            return samples[min(len(samples) - 1, int(len(samples) * p))]
+
+        LOG.info(f"{self.observer_name} event latency over {len(samples)} "
+                 f"events: p50 {pct(0.5):.3f}s p95 {pct(0.95):.3f}s "
+                 f"max {samples[-1]:.3f}s")
 
 
 class SatelliteHandler(object):
     satellite_dir = ''
 
-    def __init__(self, satellite):
-        self.satellite = satellite
+    def __init__(self, satellite, workers, latency=None, ledger=None,
+                 animator=None, streams=None):
+        # A plain dict, so jobs can be sent to a process pool
+        self.satellite = dict(satellite.items())
+        self.workers = workers
+        self.latency = latency
+        self.ledger = ledger
+        self.animator = animator
+        self.streams = streams
+        self.settler = settle.WriteSettler(
+            self.queue,
+            settle_time=CONF['monitor'].get('settle_time'),
+            timeout=CONF['monitor'].get('settle_timeout'),
+        )
+
+    def queue(self, new_file):
+        """Queue up a completely written file for processing."""
+        try:
+            LOG.debug("Queue '%s' up for processing.", new_file)
+            job = ProcessSatelliteFile(new_file=new_file,
+                                       satellite=self.satellite,
+                                       ledger=self.ledger,
+                                       animator=self.animator,
+                                       streams=self.streams)
+            if not job.fh.stages:
+                LOG.debug("Nothing to make out of '%s'", new_file)
+                return
+            trace_settled(job, self.settler.first_event(new_file))
+            self.workers.submit(job)
+        except Exception as ex:
+            LOG.exception(f"Failed to create FileHandler {ex}")
 
     def handle_event(self, event):
         if event.is_directory:
             return None
 
+        elif event.event_type == 'moved':
+            # Written somewhere else and then renamed into place
+            self.settler.forget(event.src_path)
+            if event.dest_path.endswith(".png"):
+                LOG.debug("Got move event for '%s'", event.dest_path)
+                if self.latency:
+                    self.latency.record(event.dest_path)
+                self.settler.closed(event.dest_path)
+
+        elif not event.src_path.endswith(".png"):
+            return None
+
         elif event.event_type == 'created':
             # Take any action here when a file is first created.
-            LOG.debug(f"Got create event for '{event.src_path}'")
-            try:
-                LOG.debug("Start thread to process it.")
-                thread = ProcessSatelliteFile(new_file=event.src_path,
-                                              satellite=self.satellite)
-                thread.start()
-            except Exception as ex:
-                LOG.exception("Failed to create FileHandler ", ex)
+            LOG.debug("Got create event for '%s'", event.src_path)
+            if self.latency:
+                self.latency.record(event.src_path)
+            self.settler.touch(event.src_path)
+
+        elif event.event_type == 'modified':
+            self.settler.touch(event.src_path)
+
+        elif event.event_type == 'closed':
+            LOG.debug("Got close event for '%s'", event.src_path)
+            self.settler.closed(event.src_path)
+
+        elif event.event_type == 'deleted':
+            self.settler.forget(event.src_path)
 
 
-class GoesEastHandler(FileSystemEventHandler):
+class SatelliteEventHandler(FileSystemEventHandler):
 
-    @staticmethod
-    def on_any_event(event):
+    def __init__(self, handler):
+        super().__init__()
+        self.handler = handler
+
+    def on_any_event(self, event):
         ret = None
         try:
-            h = SatelliteHandler(CONF["monitor"])
-            ret = h.handle_event(event)
+            ret = self.handler.handle_event(event)
         except Exception as ex:
             print(ex)
 
@@ -396,15 +1122,32 @@ class GoesEastHandler(FileSystemEventHandler):
 
 class Watcher(threads.WaltThread):
 
-    def __init__(self, satellite_name):
-        super().__init__("Watcher")
-        self.satellite_name = satellite_name
-        if CONF['monitor'].get('watch_dir', None):
-            self.satellite_dir = CONF['monitor']['watch_dir']
-        else:
-            self.satellite_dir = None
+    def __init__(self, satellite, workers, ledger=None, animator=None,
+                 streams=None):
+        self.satellite = satellite
+        self.satellite_name = satellite.get('satellite')
+        super().__init__(f"Watcher:{self.satellite_name}")
+        self.workers = workers
+        self.ledger = ledger
+        self.animator = animator
+        self.streams = streams
+        self.satellite_dir = satellite.get('watch_dir')
         LOG.info(f"Setting up directory observer for '{self.satellite_dir}'")
-        self.observer = PollingObserver()
+        self.observer = None
+
+    def _polling_observer(self):
+        return PollingObserver(timeout=CONF['monitor'].get('poll_interval'))
+
+    def _start_observer(self, observer, handler):
+        name = type(observer).__name__
+        handler.latency = EventLatency(name)
+        observer.schedule(
+            SatelliteEventHandler(handler),
+            self.satellite_dir, recursive=True
+        )
+        observer.start()
+        LOG.info(f"Watching '{self.satellite_dir}' with {name}")
+        return handler.latency
 
     def loop(self):
         LOG.info("Loop start")
@@ -412,21 +1155,44 @@ class Watcher(threads.WaltThread):
             LOG.error("Can't run as not properly configured")
             return
 
-        event_handler = GoesEastHandler()
+        handler = SatelliteHandler(self.satellite, self.workers,
+                                   ledger=self.ledger,
+                                   animator=self.animator,
+                                   streams=self.streams)
+        handler.settler.start()
+
+        if CONF['monitor'].get('observer') == 'native':
+            self.observer = Observer()
+        else:
+            self.observer = self._polling_observer()
 
-        self.observer.schedule(
-            event_handler, self.satellite_dir, recursive=True
-        )
-        self.observer.start()
+        try:
+            latency = self._start_observer(self.observer, handler)
+        except OSError as ex:
+            # Most likely out of inotify watches on a big tree
+            LOG.warning(f"Can't start {type(self.observer).__name__} "
+                        f"({ex}), falling back to polling")
+            self.observer.unschedule_all()
+            self.observer = self._polling_observer()
+            latency = self._start_observer(self.observer, handler)
+
+        report_interval = CONF['monitor'].get('latency_report_interval')
+        last_report = time.monotonic()
         try:
             while not self.thread_stop:
                 time.sleep(1)
+                now = time.monotonic()
+                if report_interval and now - last_report >= report_interval:
+                    latency.report()
+                    last_report = now
         except:
             self.observer.stop()
             LOG.error("Error")
 
         self.observer.stop()
         self.observer.join()
+        handler.settler.stop()
+        latency.report()
         LOG.info("Watcher: BYE")
         return False
 
@@ -441,7 +1207,7 @@ class Watcher(threads.WaltThread):
     is_flag=True,
     show_default=True,
     default=False,
-    help="Flush out all old aged messages on disk.",
+    help="Remove the processed images past their retention right away.",
 )
 @click.pass_context
 @cli_helper.process_standard_options
@@ -452,14 +1218,67 @@ def monitor(ctx, flush):
     signal.signal(signal.SIGINT, signal_handler)
     signal.signal(signal.SIGTERM, signal_handler)
 
-    if not CONF['monitor'].get('satellite'):
+    satellites = satellite_configs()
+    if not satellites:
         LOG.error("You must specify a satellite to watch")
         sys.exit(1)
 
-    # launch the healthcheck flask first
-    # threading.Thread(target=app.run).start()
-
-    east = Watcher(satellite_name='goes-east')
-    east.start()
-
-    pass
+    sweepers = retention_sweepers()
+    if flush:
+        if not sweepers:
+            LOG.warning("--flush without any retention configured")
+        for sweeper in sweepers:
+            LOG.info(f"Flushed {sweeper.sweep()} old directories out of "
+                     f"'{sweeper.process_dir}'")
+    if sweepers:
+        # Also empties the trash the flush left behind
+        retention.Retention(
+            sweepers,
+            interval=CONF['monitor'].get('retention_interval'),
+            delete_rate=CONF['monitor'].get('retention_delete_rate'),
+        ).start()
+
+    # Before the workers, so worker processes get the exporters too
+    configure_tracing()
+
+    # launch the metrics and healthcheck endpoint first
+    if CONF['monitor'].get('metrics_port'):
+        metrics.MetricsServer(
+            host=CONF['monitor'].get('metrics_host'),
+            port=CONF['monitor'].get('metrics_port'),
+        ).start()
+
+    workers = pool.WorkerPool(
+        max_workers=CONF['monitor'].get('max_workers'),
+        max_queue=CONF['monitor'].get('max_queue'),
+        kind=CONF['monitor'].get('worker_pool'),
+        drain=CONF['monitor'].get('drain_on_stop'),
+    )
+    workers.start()
+
+    ledger_file = CONF['monitor'].get('ledger')
+    done = ledger.Ledger(ledger_file) if ledger_file else None
+    since = None
+    if CONF['monitor'].get('catch_up_hours'):
+        since = datetime.now(tz=GMT) - timedelta(
+            hours=CONF['monitor'].get('catch_up_hours'))
+
+    streams = video_streams()
+    streams.start()
+
+    # One watcher per satellite, all sharing the workers
+    for satellite in satellites:
+        animator = animation_debouncer(satellite, workers, ledger=done)
+        if animator is not None:
+            animator.start()
+        Watcher(satellite, workers=workers, ledger=done,
+                animator=animator, streams=streams).start()
+
+        if CONF['monitor'].get('catch_up'):
+            Backfill(satellite, workers, ledger=done, since=since,
+                     animator=animator, streams=streams).start()
+
+    # concurrent.futures won't take new work once the main thread is
+    # gone, so wait here until CTRL+C stops everything.
+    while workers.is_alive():
+        workers.join(1)
@@ -23,6 +23,7 @@ def sample_config(ctx):
     chain = [
         ('monitor',
          itertools.chain(monitor.monitor_opts)),
-    ]
+    ] + [(name, itertools.chain(monitor.satellite_opts))
+         for name in monitor.SATELLITES]
     console = Console()
     console.print(chain)
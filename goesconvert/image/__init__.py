@@ -0,0 +1,25 @@
+"""Image processing backends used by the FileHandler."""
+
+from goesconvert.image.base import ImageBackend, Label  # noqa: F401
+from goesconvert.image import tiles  # noqa: F401
+from goesconvert.image.imagemagick import ImageMagickBackend
+from goesconvert.image.pillow import PillowBackend
+
+
+BACKENDS = {
+    'pillow': PillowBackend,
+    'imagemagick': ImageMagickBackend,
+}
+
+
+def get_backend(name, source, font_path, **kwargs):
+    """Create the named image backend for a source file.
+
+    kwargs are backend specific options, backends ignore the ones they
+    don't know about.
+    """
+    try:
+        backend_cls = BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Unknown image backend '{name}'")
+    return backend_cls(source, font_path, **kwargs)
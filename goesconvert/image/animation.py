@@ -0,0 +1,316 @@
+import contextlib
+import datetime
+import fcntl
+import io
+import json
+import logging
+import os
+import struct
+import threading
+
+from PIL import Image
+
+from goesconvert import tracing, utils
+
+
+LOG = logging.getLogger("goesconvert")
+
+CACHE_DIR = ".gifcache"
+FRAME_NAME_FMT = "%H-%M-%S"
+
+# Logical screen descriptor without a global color table, every frame
+# carries its own local color table.
+GIF_HEADER = b"GIF89a"
+GIF_LOOP = b"\x21\xff\x0bNETSCAPE2.0\x03\x01\x00\x00\x00"
+GIF_TRAILER = b"\x3b"
+HEADER_SIZE = len(GIF_HEADER) + 7 + len(GIF_LOOP)
+
+
+def _skip_sub_blocks(data, pos):
+    while data[pos]:
+        pos += data[pos] + 1
+    return pos + 1
+
+
+def gif_frame_block(data, delay):
+    """Turn a single frame GIF file into a frame block for an animation.
+
+    The block is a graphic control extension with the frame delay, the
+    image descriptor with a local color table and the LZW image data,
+    which can be concatenated with other blocks as is.
+    """
+    if data[:6] not in (b"GIF87a", b"GIF89a"):
+        raise ValueError("Not a GIF file")
+
+    packed = data[10]
+    pos = 13
+    global_table = b""
+    if packed & 0x80:
+        size = 3 << ((packed & 0x07) + 1)
+        global_table = data[pos:pos + size]
+        pos += size
+
+    while pos < len(data):
+        if data[pos] == 0x21:
+            pos = _skip_sub_blocks(data, pos + 2)
+        elif data[pos] == 0x2c:
+            descriptor = bytearray(data[pos:pos + 10])
+            pos += 10
+            if descriptor[9] & 0x80:
+                size = 3 << ((descriptor[9] & 0x07) + 1)
+                color_table = data[pos:pos + size]
+                pos += size
+            else:
+                color_table = global_table
+                descriptor[9] = (descriptor[9] & 0x40) | 0x80 | (packed & 0x07)
+            start = pos
+            pos = _skip_sub_blocks(data, pos + 1)
+            # disposal method 1, leave the frame in place
+            control = struct.pack("<4BH2B", 0x21, 0xf9, 4, 0x04, delay, 0, 0)
+            return control + bytes(descriptor) + color_table + data[start:pos]
+        else:
+            break
+    raise ValueError("No image found in GIF file")
+
+
+def _frame_size(block):
+    # skip the 8 byte control extension and the separator, left and top
+    return struct.unpack("<HH", block[13:17])
+
+
+def _copy_range(src, dst, offset, length):
+    if hasattr(os, "copy_file_range"):
+        while length > 0:
+            copied = os.copy_file_range(src.fileno(), dst.fileno(), length,
+                                        offset)
+            if not copied:
+                break
+            offset += copied
+            length -= copied
+    if length > 0:
+        src.seek(offset)
+        dst.write(src.read(length))
+
+
+def _tmp_name(path):
+    """A temporary file for path, its own for every thread and process."""
+    return f"{path}.{os.getpid()}.{threading.get_ident()}"
+
+
+class GifAnimator(object):
+    """Keeps an animated gif of the PNG frames in a directory up to date.
+
+    Every frame is quantized and LZW encoded only once, into a frame block
+    cached in a hidden directory next to the frames.  A manifest records
+    where each frame lives in the animated gif, so a new frame is appended
+    to the end of the file, and when the window of frames moves on, the
+    frames that are kept are copied over byte for byte.  None of the
+    existing frames get decoded or quantized again.
+
+    The window is the newest max_frames frames, and/or the frames no more
+    than max_span minutes older than the newest one.  0 means no limit.
+    """
+
+    def __init__(self, frames_dir, dest_file, max_frames=0, max_span=0,
+                 delay=15):
+        self.frames_dir = frames_dir
+        self.dest_file = dest_file
+        self.max_frames = max_frames
+        self.max_span = max_span
+        self.delay = delay
+        self.cache_dir = os.path.join(frames_dir, CACHE_DIR)
+        name = os.path.basename(dest_file)
+        self.manifest_file = os.path.join(self.cache_dir, f"{name}.json")
+        # One lock for all the animations of the directory, they share
+        # the frame blocks.
+        self.lock_file = os.path.join(self.cache_dir, ".lock")
+
+    def _frame_names(self):
+        with os.scandir(self.frames_dir) as it:
+            return sorted(entry.name for entry in it
+                          if entry.name.endswith(".png")
+                          and not entry.name.startswith(".")
+                          and entry.is_file())
+
+    def _window(self, names):
+        if self.max_span:
+            try:
+                times = [datetime.datetime.strptime(n[:-4], FRAME_NAME_FMT)
+                         for n in names]
+            except ValueError:
+                LOG.warning(f"Can't window frames in '{self.frames_dir}' by time")
+            else:
+                span = datetime.timedelta(minutes=self.max_span)
+                names = [n for n, t in zip(names, times)
+                         if times[-1] - t <= span]
+        if self.max_frames:
+            names = names[-self.max_frames:]
+        return names
+
+    @contextlib.contextmanager
+    def _locked(self):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with open(self.lock_file, "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    @tracing.traced("gif_frame")
+    @utils.timeit
+    def _encode(self, name):
+        with Image.open(os.path.join(self.frames_dir, name)) as im:
+            im.load()
+            if im.mode not in ("L", "P"):
+                im = im.convert("RGB").quantize(colors=256)
+            buf = io.BytesIO()
+            im.save(buf, format="GIF")
+        return gif_frame_block(buf.getvalue(), self.delay)
+
+    def _block(self, name):
+        """Get the cached frame block for a frame, encoding it if needed."""
+        block_file = os.path.join(self.cache_dir, f"{name}.frame")
+        try:
+            with open(block_file, "rb") as f:
+                block = f.read()
+        except FileNotFoundError:
+            block = self._encode(name)
+            tmp_file = _tmp_name(block_file)
+            with open(tmp_file, "wb") as f:
+                f.write(block)
+            os.replace(tmp_file, block_file)
+        return block[:4] + struct.pack("<H", self.delay) + block[6:]
+
+    def _load_manifest(self):
+        try:
+            with open(self.manifest_file) as f:
+                manifest = json.load(f)
+            if (os.path.getsize(self.dest_file) == manifest["size"]
+                    and manifest["delay"] == self.delay):
+                return manifest
+        except (OSError, ValueError, KeyError):
+            pass
+        return None
+
+    def _save_manifest(self, manifest):
+        tmp_file = _tmp_name(self.manifest_file)
+        with open(tmp_file, "w") as f:
+            json.dump(manifest, f)
+        os.replace(tmp_file, self.manifest_file)
+
+    def _append(self, manifest, names):
+        """Append new frames to the end of the existing animation.
+
+        This writes over the trailer of the live file instead of copying
+        the whole animation, so a reader can catch it without a trailer
+        or with half a frame at the end, most viewers just stop there.
+        The manifest is only saved once the trailer is back; if we don't
+        get that far, the size of the file doesn't match the manifest and
+        the next update writes the animation anew.
+        """
+        blocks = [self._block(name) for name in names]
+        width, height = manifest["width"], manifest["height"]
+        if any(w > width or h > height for w, h in map(_frame_size, blocks)):
+            return None
+
+        with open(self.dest_file, "r+b") as f:
+            f.seek(manifest["size"] - len(GIF_TRAILER))
+            offset = f.tell()
+            for name, block in zip(names, blocks):
+                f.write(block)
+                manifest["frames"].append([name, offset, len(block)])
+                offset += len(block)
+            f.write(GIF_TRAILER)
+        manifest["size"] = offset + len(GIF_TRAILER)
+        return manifest
+
+    def _rewrite(self, names, manifest=None, keep=0):
+        """Write a new animation.
+
+        The first keep frames are copied over from the current animation,
+        the rest come from the frame block cache.
+        """
+        kept = manifest["frames"][-keep:] if keep else []
+        blocks = [self._block(name) for name in names[keep:]]
+        sizes = list(map(_frame_size, blocks))
+        if kept:
+            sizes.append((manifest["width"], manifest["height"]))
+        width = max(w for w, _ in sizes)
+        height = max(h for _, h in sizes)
+
+        tmp_file = _tmp_name(os.path.join(
+            self.frames_dir, f".{os.path.basename(self.dest_file)}"))
+        frames = []
+        with open(tmp_file, "wb") as f:
+            f.write(GIF_HEADER + struct.pack("<HH3B", width, height, 0x70, 0, 0))
+            f.write(GIF_LOOP)
+            offset = HEADER_SIZE
+            if kept:
+                start = kept[0][1]
+                length = kept[-1][1] + kept[-1][2] - start
+                f.flush()
+                with open(self.dest_file, "rb") as src:
+                    _copy_range(src, f, start, length)
+                f.seek(0, os.SEEK_END)
+                for name, old_offset, size in kept:
+                    frames.append([name, old_offset - start + offset, size])
+                offset += length
+            for name, block in zip(names[keep:], blocks):
+                f.write(block)
+                frames.append([name, offset, len(block)])
+                offset += len(block)
+            f.write(GIF_TRAILER)
+        os.replace(tmp_file, self.dest_file)
+        return {"width": width, "height": height, "delay": self.delay,
+                "size": offset + len(GIF_TRAILER), "frames": frames}
+
+    def update(self):
+        """Bring the animated gif up to date with the frames directory."""
+        with self._locked():
+            names = self._window(self._frame_names())
+            if not names:
+                LOG.warning(f"No frames found in '{self.frames_dir}'")
+                return
+
+            manifest = self._load_manifest()
+            old = [frame[0] for frame in manifest["frames"]] if manifest else []
+            if old == names:
+                return
+
+            new_manifest = None
+            if old and old == names[:len(old)]:
+                new_manifest = self._append(manifest, names[len(old):])
+            elif old and names[0] in old:
+                keep = len(old) - old.index(names[0])
+                if old[-keep:] == names[:keep]:
+                    new_manifest = self._rewrite(names, manifest, keep)
+
+            if not new_manifest:
+                new_manifest = self._rewrite(names)
+            self._save_manifest(new_manifest)
+            self._prune(names)
+
+    def _referenced(self):
+        """The frames in the manifests of every animation of the directory."""
+        names = set()
+        with os.scandir(self.cache_dir) as it:
+            for entry in it:
+                if not entry.name.endswith(".json"):
+                    continue
+                try:
+                    with open(entry.path) as f:
+                        names.update(frame[0]
+                                     for frame in json.load(f)["frames"])
+                except (OSError, ValueError, KeyError, IndexError):
+                    continue
+        return names
+
+    def _prune(self, names):
+        """Remove the cached frame blocks no animation uses any more."""
+        keep = set(f"{name}.frame"
+                   for name in self._referenced().union(names))
+        with os.scandir(self.cache_dir) as it:
+            for entry in it:
+                if entry.name.endswith(".frame") and entry.name not in keep:
+                    os.unlink(entry.path)
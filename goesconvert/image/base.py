@@ -0,0 +1,98 @@
+import abc
+import collections
+import logging
+import re
+
+from goesconvert.image import tiles
+from goesconvert.utils import fs
+
+
+LOG = logging.getLogger("goesconvert")
+
+# The translucent box drawn behind the labels and the static label
+# on the right hand side of every annotated image.
+OVERLAY_BOX = (0, 1820, 2560, 2000)
+OVERLAY_FILL = "#0004"
+OVERLAY_SITE = "wx.hemna.com"
+
+GEOMETRY_RE = re.compile(r"^(\d+)x(\d+)\+(\d+)\+(\d+)$")
+
+Label = collections.namedtuple("Label", ["text", "font_size"])
+
+# The resampling filters for scaling images down, from the best looking
+# to the fastest.
+RESIZE_FILTERS = ("lanczos", "bicubic", "bilinear", "box", "nearest")
+
+
+def parse_geometry(geometry):
+    """Parse an ImageMagick 'WxH+X+Y' geometry into a crop box.
+
+    :returns: a (left, top, right, bottom) tuple
+    """
+    m = GEOMETRY_RE.match(geometry.strip())
+    if not m:
+        raise ValueError(f"Invalid crop geometry '{geometry}'")
+    width, height, left, top = (int(x) for x in m.groups())
+    return (left, top, left + width, top + height)
+
+
+class ImageBackend(metaclass=abc.ABCMeta):
+    """Base class for the image operations done on a source file."""
+
+    def __init__(self, source, font_path, resize_filter="lanczos",
+                 copy_mode="auto"):
+        if resize_filter not in RESIZE_FILTERS:
+            raise ValueError(f"Unknown resize filter '{resize_filter}'")
+        self.source = source
+        self.font_path = font_path
+        self.resize_filter = resize_filter
+        self.copy_mode = copy_mode
+
+    def _copy_source(self, dest_file):
+        """Put the source as it is at dest_file, see fs.copy_file()."""
+        used = fs.copy_file(self.source, dest_file, mode=self.copy_mode)
+        LOG.debug("Copied '%s' to '%s' with %s", self.source, dest_file, used)
+
+    @abc.abstractmethod
+    def crop(self, geometry, dest_file, label=None, size=None):
+        """Crop the source to geometry and write it to dest_file.
+
+        :param size: scale the crop to fit in this (width, height).
+        """
+
+    def crop_regions(self, crops):
+        """Crop several regions out of the source.
+
+        :param crops: a list of (geometry, dest_file, label, size) tuples
+        """
+        for geometry, dest_file, label, size in crops:
+            self.crop(geometry, dest_file, label=label, size=size)
+
+    @abc.abstractmethod
+    def copy(self, dest_file, scale=None, label=None):
+        """Write the source to dest_file, optionally scaled by a percent."""
+
+    @abc.abstractmethod
+    def resize(self, image_file, scale):
+        """Resize image_file in place by a percent."""
+
+    @abc.abstractmethod
+    def overlay(self, image_file, label):
+        """Annotate image_file in place with label."""
+
+    def tiles(self, frame_dir, tile_size=256, previous=None):
+        """Write an XYZ tile pyramid of the source under frame_dir.
+
+        :param previous: the frame_dir of the previous frame, whose
+                         unchanged tiles are linked to.
+        :returns: (tiles written, tiles linked, bytes written)
+        """
+        return tiles.write_pyramid(tiles.decode(self.source), frame_dir,
+                                   tile_size=tile_size, previous=previous)
+
+    @abc.abstractmethod
+    def animate(self, pattern, dest_file, delay=15):
+        """Build an animated gif from all files matching pattern."""
+
+    def close(self):
+        """Release anything held on to for the source."""
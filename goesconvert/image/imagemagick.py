@@ -0,0 +1,164 @@
+import logging
+import shutil
+
+from goesconvert import tracing
+from goesconvert.image import base
+from goesconvert.utils import runner
+
+
+LOG = logging.getLogger("goesconvert")
+
+# ImageMagick's names for the base.RESIZE_FILTERS.  Lanczos is what
+# it uses to shrink images anyway.
+FILTERS = {
+    "lanczos": None,
+    "bicubic": "Catrom",
+    "bilinear": "Triangle",
+    "box": "Box",
+    "nearest": "Point",
+}
+
+
+class Convert(object):
+    """Builds one convert command line out of any number of operations.
+
+    Operations apply to the current image, so several of them can be
+    done in a single convert invocation instead of one each.
+    """
+
+    def __init__(self, convert, limits=None, resize_filter=None):
+        self.argv = [convert]
+        self.filter = FILTERS.get(resize_filter)
+        # -limit has to come before the images are read
+        for resource, value in (limits or {}).items():
+            self.argv.extend(["-limit", resource, str(value)])
+
+    def add(self, *args):
+        self.argv.extend(args)
+        return self
+
+    def read(self, image_file):
+        return self.add(image_file)
+
+    def crop(self, geometry):
+        return self.add("-crop", geometry, "+repage")
+
+    def _filter(self):
+        if self.filter:
+            self.add("-filter", self.filter)
+        return self
+
+    def resize(self, scale):
+        return self._filter().add("-resize", "%s%%" % scale)
+
+    def fit(self, size):
+        return self._filter().add("-resize", "%sx%s" % size)
+
+    def overlay(self, label, font_path):
+        left, top, right, bottom = base.OVERLAY_BOX
+        return self.add(
+            "-quality", "90",
+            "-font", font_path,
+            "-fill", base.OVERLAY_FILL,
+            "-draw", "rectangle %s,%s,%s,%s" % (left, bottom, right, top),
+            "-pointsize", str(label.font_size),
+            "-fill", "white", "-gravity", "southwest",
+            "-annotate", "+2+10", label.text,
+            "-fill", "white", "-gravity", "southeast",
+            "-annotate", "+2+10", base.OVERLAY_SITE,
+            "+gravity")
+
+    def write(self, image_file):
+        return self.add(image_file)
+
+    def write_clone(self, image_file, *ops):
+        """Apply ops to a copy of the current image and write that out.
+
+        The current image is left as it is for the next operations.
+        """
+        self.add("(", "+clone")
+        for op, args in ops:
+            getattr(self, op)(*args)
+        return self.add("-write", image_file, "+delete", ")")
+
+
+class ImageMagickBackend(base.ImageBackend):
+    """Runs every image operation as a `convert` subprocess."""
+
+    def __init__(self, source, font_path, command_timeout=None,
+                 memory_limit=None, imagemagick_limits=None,
+                 imagemagick_fused=True, resize_filter="lanczos",
+                 copy_mode="auto", **kwargs):
+        super().__init__(source, font_path, resize_filter=resize_filter,
+                         copy_mode=copy_mode)
+        self.fused = imagemagick_fused
+        self._commands = {
+            'convert': shutil.which('convert')
+        }
+        self.limits = imagemagick_limits
+        self.runner = runner.CommandRunner(timeout=command_timeout,
+                                           memory_limit=memory_limit)
+
+    def _convert(self):
+        if not self._commands['convert']:
+            raise FileNotFoundError("ImageMagick 'convert' isn't installed")
+        return Convert(self._commands['convert'], limits=self.limits,
+                       resize_filter=self.resize_filter)
+
+    def _execute(self, cmd, name):
+        with tracing.span(f"convert:{name}"):
+            self.runner.run(cmd.argv, name=f"convert:{name}")
+
+    def crop(self, geometry, dest_file, label=None, size=None):
+        cmd = self._convert().read(self.source).crop(geometry)
+        if size:
+            cmd.fit(size)
+        if label and self.fused:
+            cmd.overlay(label, self.font_path)
+        self._execute(cmd.write(dest_file), "crop")
+        if label and not self.fused:
+            self.overlay(dest_file, label)
+
+    def crop_regions(self, crops):
+        if not self.fused or len(crops) < 2:
+            return super().crop_regions(crops)
+
+        # Read and decode the source once, and cut every region out of
+        # a clone of it.  -respect-parentheses keeps the gravity and fill
+        # settings of one region from leaking into the next.
+        cmd = self._convert().add("-respect-parentheses").read(self.source)
+        for geometry, dest_file, label, size in crops:
+            ops = [("crop", (geometry,))]
+            if size:
+                ops.append(("fit", (size,)))
+            if label:
+                ops.append(("overlay", (label, self.font_path)))
+            cmd.write_clone(dest_file, *ops)
+        self._execute(cmd.write("null:"), "crop_regions")
+
+    def copy(self, dest_file, scale=None, label=None):
+        if not scale and not label:
+            self._copy_source(dest_file)
+            return
+
+        # Read the source and only write the scaled, annotated result,
+        # instead of copying it at full size first.
+        cmd = self._convert().read(self.source)
+        if scale:
+            cmd.resize(scale)
+        if label:
+            cmd.overlay(label, self.font_path)
+        self._execute(cmd.write(dest_file), "copy")
+
+    def resize(self, image_file, scale):
+        cmd = self._convert().read(image_file).resize(scale)
+        self._execute(cmd.write(image_file), "resize")
+
+    def overlay(self, image_file, label):
+        cmd = self._convert().read(image_file).overlay(label, self.font_path)
+        self._execute(cmd.write(image_file), "overlay")
+
+    def animate(self, pattern, dest_file, delay=15):
+        # convert expands the wildcard in pattern itself
+        cmd = self._convert().add("-loop", "0", "-delay", str(delay))
+        self._execute(cmd.read(pattern).write(dest_file), "animate")
@@ -0,0 +1,98 @@
+"""Cached layers for annotating images with Pillow.
+
+The shaded box and the site label are the same on every image of the
+same size, so they are rendered once per size and pasted through their
+alpha mask after that.  The timestamp changes with every image, but
+its words don't change much ("Monday", "Aug", "EST", ...), so it's put
+together from cached masks of its words.
+"""
+
+import functools
+import logging
+import re
+
+from PIL import Image, ImageColor, ImageDraw, ImageFont
+
+from goesconvert.image import base
+
+
+LOG = logging.getLogger("goesconvert")
+
+WORD_RE = re.compile(r"\S+")
+
+
+@functools.lru_cache(maxsize=32)
+def get_font(font_path, font_size):
+    try:
+        return ImageFont.truetype(font_path, font_size)
+    except OSError:
+        LOG.warning(f"Can't load font '{font_path}', using default")
+        return ImageFont.load_default()
+
+
+def _text_mask(text, font):
+    """The coverage mask of text, and its offset from the text origin."""
+    left, top, right, bottom = font.getbbox(text)
+    mask = Image.new("L", (max(1, right - left), max(1, bottom - top)), 0)
+    ImageDraw.Draw(mask).text((-left, -top), text, font=font, fill=255)
+    return mask, (left, top)
+
+
+@functools.lru_cache(maxsize=64)
+def static_layer(size, mode, font_path, font_size):
+    """The shaded box and the site label for an image of size and mode.
+
+    :returns: (layer, mask, offset) to paste, or None if there's nothing
+              to draw on an image that size.
+    """
+    width, height = size
+    color = Image.new("RGBA", size, (0, 0, 0, 0))
+
+    # Translucent black box behind the labels, same as '-fill #0004'
+    left, top, right, bottom = base.OVERLAY_BOX
+    box = (left, top, min(right, width), min(bottom, height))
+    if box[2] > box[0] and box[3] > box[1]:
+        color.paste((0, 0, 0, 0x44), box)
+
+    # gravity southeast with a +2+10 offset
+    font = get_font(font_path, font_size)
+    _, _, right, bottom = font.getbbox(base.OVERLAY_SITE)
+    text, (dx, dy) = _text_mask(base.OVERLAY_SITE, font)
+    white = Image.new("RGBA", text.size, (255, 255, 255, 0))
+    white.putalpha(text)
+    site = Image.new("RGBA", size, (0, 0, 0, 0))
+    site.paste(white, (width - 2 - right + dx, height - 10 - bottom + dy))
+    color = Image.alpha_composite(color, site)
+
+    mask = color.getchannel("A")
+    bbox = mask.getbbox()
+    if not bbox:
+        return None
+    layer = color.convert("RGB").crop(bbox)
+    if mode != "RGB":
+        layer = layer.convert(mode)
+    return layer, mask.crop(bbox), bbox[:2]
+
+
+@functools.lru_cache(maxsize=1024)
+def glyph_run(text, font_path, font_size):
+    return _text_mask(text, get_font(font_path, font_size))
+
+
+def annotate(im, label, font_path):
+    """Draw the box, the label and the site label on im in place."""
+    static = static_layer(im.size, im.mode, font_path, label.font_size)
+    if static:
+        layer, mask, offset = static
+        im.paste(layer, offset, mask)
+
+    # gravity southwest with a +2+10 offset
+    font = get_font(font_path, label.font_size)
+    left, _, _, bottom = font.getbbox(label.text)
+    x, y = 2 - left, im.size[1] - 10 - bottom
+    white = ImageColor.getcolor("white", im.mode)
+    for word in WORD_RE.finditer(label.text):
+        mask, (dx, dy) = glyph_run(word.group(), font_path, label.font_size)
+        advance = round(font.getlength(label.text[:word.start()]))
+        im.paste(white, (x + advance + dx, y + dy), mask)
+    return im
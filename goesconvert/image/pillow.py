@@ -0,0 +1,169 @@
+import glob
+import logging
+import os
+import threading
+
+from PIL import Image
+
+from goesconvert import tracing, utils
+from goesconvert.image import base, overlay, shared, tiles
+
+
+LOG = logging.getLogger("goesconvert")
+
+FILTERS = {
+    "lanczos": Image.LANCZOS,
+    "bicubic": Image.BICUBIC,
+    "bilinear": Image.BILINEAR,
+    "box": Image.BOX,
+    "nearest": Image.NEAREST,
+}
+
+
+def _crop_shared(spec, job):
+    """Crop one region out of a shared raster, in a region worker."""
+    (source, font_path, options), (geometry, dest_file, label, size) = job
+    with shared.AttachedRaster(spec) as attached:
+        backend = PillowBackend(source, font_path, **options)
+        backend._raster = attached.image
+        try:
+            backend.crop(geometry, dest_file, label=label, size=size)
+        finally:
+            backend.close()
+
+
+class PillowBackend(base.ImageBackend):
+    """Decodes the source once and does every operation in memory.
+
+    The decoded raster is kept around until close() is called, so all the
+    crops, the annotations and the downscaled copy of a full disk frame
+    come out of a single PNG decode.
+
+    With region_workers, the regions are cropped, annotated and written
+    by that many worker processes, which all read the one decoded raster
+    out of shared memory, when this Python has that (see shared.AVAILABLE).
+    """
+
+    def __init__(self, source, font_path, resize_filter="lanczos",
+                 copy_mode="auto", region_workers=0, **kwargs):
+        super().__init__(source, font_path, resize_filter=resize_filter,
+                         copy_mode=copy_mode)
+        self.region_workers = region_workers if shared.AVAILABLE else 0
+        self._raster = None
+        # Downscaled rasters by scale, shared by all the outputs that
+        # use the same size.
+        self._scaled_rasters = {}
+
+    @property
+    def raster(self):
+        if self._raster is None:
+            self._raster = self._decode(self.source)
+        return self._raster
+
+    @tracing.traced("decode")
+    @utils.timeit
+    def _decode(self, image_file):
+        with Image.open(image_file) as im:
+            im.load()
+            if im.mode not in ("L", "RGB", "RGBA"):
+                return im.convert("RGB")
+            return im.copy()
+
+    @tracing.traced("overlay")
+    def _annotate(self, im, label):
+        return overlay.annotate(im, label, self.font_path)
+
+    def _resize(self, im, size):
+        return im.resize(size, FILTERS[self.resize_filter])
+
+    def _scaled(self, im, scale):
+        width, height = im.size
+        return self._resize(im, (max(1, round(width * scale / 100)),
+                                 max(1, round(height * scale / 100))))
+
+    @tracing.traced("encode")
+    @utils.timeit
+    def _write(self, im, dest_file, **kwargs):
+        # Write next to the destination and rename it into place, so
+        # nobody globbing the directory sees a half written file.
+        dirname, basename = os.path.split(dest_file)
+        tmp_file = os.path.join(
+            dirname, f".{basename}.{os.getpid()}.{threading.get_ident()}")
+        im.save(tmp_file, format=kwargs.pop("format", "PNG"), **kwargs)
+        os.replace(tmp_file, dest_file)
+
+    def _fit(self, im, size):
+        # Like '-resize WxH', keep the aspect ratio
+        width, height = im.size
+        ratio = min(size[0] / width, size[1] / height)
+        return self._resize(im, (max(1, round(width * ratio)),
+                                 max(1, round(height * ratio))))
+
+    def crop(self, geometry, dest_file, label=None, size=None):
+        left, top, right, bottom = base.parse_geometry(geometry)
+        width, height = self.raster.size
+        # ImageMagick clips the crop to the image, Pillow would pad it.
+        im = self.raster.crop((min(left, width), min(top, height),
+                               min(right, width), min(bottom, height)))
+        if im.mode == "RGBX":
+            # An RGB raster mapped from shared memory
+            im = im.convert("RGB")
+        if size:
+            im = self._fit(im, size)
+        if label:
+            self._annotate(im, label)
+        self._write(im, dest_file)
+
+    def crop_regions(self, crops):
+        if (not self.region_workers or len(crops) < 2
+                or not shared.available()):
+            return super().crop_regions(crops)
+        options = {'resize_filter': self.resize_filter,
+                   'copy_mode': self.copy_mode}
+        job = (self.source, self.font_path, options)
+        with tracing.span("regions", workers=self.region_workers):
+            shared.map_raster(self.raster, _crop_shared,
+                              [(job, crop) for crop in crops],
+                              self.region_workers)
+
+    def copy(self, dest_file, scale=None, label=None):
+        if not scale and not label:
+            self._copy_source(dest_file)
+            return
+
+        if scale:
+            if scale not in self._scaled_rasters:
+                self._scaled_rasters[scale] = self._scaled(self.raster, scale)
+            im = self._scaled_rasters[scale]
+        else:
+            im = self.raster
+
+        if label:
+            # annotate a copy, the raster is shared
+            im = self._annotate(im.copy(), label)
+        self._write(im, dest_file)
+
+    def tiles(self, frame_dir, tile_size=256, previous=None):
+        return tiles.write_pyramid(self.raster, frame_dir,
+                                   tile_size=tile_size, previous=previous)
+
+    def resize(self, image_file, scale):
+        self._write(self._scaled(self._decode(image_file), scale), image_file)
+
+    def overlay(self, image_file, label):
+        self._write(self._annotate(self._decode(image_file), label),
+                    image_file)
+
+    def animate(self, pattern, dest_file, delay=15):
+        files = sorted(glob.glob(pattern))
+        if not files:
+            LOG.warning(f"No frames found for '{pattern}'")
+            return
+
+        frames = [self._decode(f) for f in files]
+        self._write(frames[0], dest_file, format="GIF", save_all=True,
+                    append_images=frames[1:], loop=0, duration=delay * 10)
+
+    def close(self):
+        self._raster = None
+        self._scaled_rasters.clear()
@@ -0,0 +1,200 @@
+"""Decoded rasters in shared memory, for worker processes to read.
+
+A full disk frame is decoded once, copied into a shared memory block
+and the worker processes map that block as a read only image, instead
+of each getting a pickled copy of the pixels or decoding it again.
+
+It needs multiprocessing.shared_memory (Python 3.8), without it
+AVAILABLE is False and the regions are cropped in the job's worker.
+"""
+
+import atexit
+import collections
+from concurrent.futures.process import BrokenProcessPool
+import logging
+import multiprocessing
+import threading
+import traceback
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:
+    shared_memory = None
+
+from PIL import Image
+
+from goesconvert.threads import pool
+
+
+LOG = logging.getLogger("goesconvert")
+
+# How the modes are laid out in the block.  Pillow keeps RGB at 4
+# bytes a pixel, mapped as RGBX it doesn't have to be copied.
+RAWMODES = {
+    "L": "L",
+    "RGB": "RGBX",
+    "RGBA": "RGBA",
+}
+
+# What a worker needs to map the raster, small enough to pickle
+RasterSpec = collections.namedtuple("RasterSpec",
+                                    ["name", "mode", "size", "rawmode"])
+
+AVAILABLE = shared_memory is not None
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+class SharedRaster(object):
+    """A copy of an image in a shared memory block.
+
+    Only the process that made it unlinks the block, on close() or at
+    the end of the with block.
+    """
+
+    def __init__(self, im):
+        if im.mode not in RAWMODES:
+            im = im.convert("RGB")
+        rawmode = RAWMODES[im.mode]
+        data = im.tobytes("raw", rawmode)
+        self.shm = shared_memory.SharedMemory(create=True, size=len(data))
+        self.shm.buf[:len(data)] = data
+        self.spec = RasterSpec(self.shm.name, im.mode, im.size, rawmode)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self.shm is None:
+            return
+        shm, self.shm = self.shm, None
+        shm.close()
+        shm.unlink()
+
+
+def _open(name):
+    try:
+        # Python 3.13+, it's not ours to clean up
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        return shared_memory.SharedMemory(name=name)
+
+
+class AttachedRaster(object):
+    """Maps the raster of a RasterSpec as a read only image, no copy.
+
+    The image is the image attribute.  Don't hold on to it past the with
+    block, the block can't be closed while an image points into it.
+    Crops and other images made from it are copies, those are fine.
+    """
+
+    def __init__(self, spec):
+        self.spec = spec
+        self.shm = None
+        self.image = None
+
+    def __enter__(self):
+        self.shm = _open(self.spec.name)
+        mode = "RGBX" if self.spec.rawmode == "RGBX" else self.spec.mode
+        self.image = Image.frombuffer(mode, tuple(self.spec.size),
+                                      self.shm.buf, "raw",
+                                      self.spec.rawmode, 0, 1)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.image = None
+        if tb is not None:
+            # The frames of the exception can still have the image
+            traceback.clear_frames(tb)
+        self.shm.close()
+        self.shm = None
+
+
+def available():
+    """Whether map_raster can start its worker processes here.
+
+    Not without shared_memory, and not in a daemonic process, which
+    can't have children.  The process workers of a WorkerPool are
+    daemonic before Python 3.9.
+    """
+    return AVAILABLE and not multiprocessing.current_process().daemon
+
+
+def executor(max_workers):
+    """The process pool shared by everything in this process.
+
+    It's made the first time it's needed, with max_workers processes.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            LOG.info(f"Starting {max_workers} region worker processes")
+            _executor = pool.process_executor(max_workers)
+        return _executor
+
+
+def shutdown():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            try:
+                _executor.shutdown(wait=True, cancel_futures=True)
+            except TypeError:
+                # Python < 3.9, the queued crops run first
+                _executor.shutdown(wait=True)
+            _executor = None
+
+
+atexit.register(shutdown)
+
+
+def _discard(broken):
+    """Drop a broken executor, the next executor() starts a new one."""
+    global _executor
+    with _executor_lock:
+        if _executor is broken:
+            _executor = None
+    broken.shutdown(wait=False)
+
+
+def _map(workers, spec, function, items):
+    futures = [workers.submit(function, spec, item) for item in items]
+    # Every worker has to be done with the block before it goes.
+    errors = []
+    for future in futures:
+        try:
+            future.result()
+        except Exception as ex:
+            errors.append(ex)
+    for error in errors:
+        if isinstance(error, BrokenProcessPool):
+            raise error
+    return errors
+
+
+def map_raster(im, function, items, max_workers):
+    """Call function(spec, item) for every item in the worker processes.
+
+    The workers get the raster im through the spec, see AttachedRaster.
+    Waits for all of them, then raises the first error if any failed.
+    When a worker dies (ie. the OOM killer), the pool is started again
+    and all the items are tried once more.
+    """
+    with SharedRaster(im) as raster:
+        for retry in (False, True):
+            workers = executor(max_workers)
+            try:
+                errors = _map(workers, raster.spec, function, items)
+                break
+            except BrokenProcessPool as ex:
+                LOG.error(f"Region worker pool is broken ({ex}), "
+                          f"restarting it")
+                _discard(workers)
+                if retry:
+                    raise
+    if errors:
+        raise errors[0]
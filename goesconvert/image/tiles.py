@@ -0,0 +1,115 @@
+"""XYZ tile pyramids of the full disk images, for a zoomable map.
+
+Every frame gets its own directory of {z}/{x}/{y}.png tiles, and a
+tiles.json manifest with the hash of each tile.  Tiles that are the
+same as one in the previous frame (or earlier in the same frame, like
+the black space around the disk) are hard links to it instead of
+another PNG written to disk.
+"""
+
+import hashlib
+import json
+import logging
+import math
+import os
+import shutil
+
+from PIL import Image
+
+
+LOG = logging.getLogger("goesconvert")
+
+MANIFEST = "tiles.json"
+
+
+def max_zoom(size, tile_size):
+    """The zoom level at which the image is at its full resolution."""
+    return max(0, math.ceil(math.log2(max(size) / tile_size)))
+
+
+def levels(im, tile_size):
+    """The image at every zoom level, from the full resolution down."""
+    zoom = max_zoom(im.size, tile_size)
+    yield zoom, im
+    for z in range(zoom - 1, -1, -1):
+        # A box filter, each level is half the one above it.
+        im = im.reduce(2)
+        yield z, im
+
+
+def read_manifest(frame_dir):
+    try:
+        with open(os.path.join(frame_dir, MANIFEST)) as fp:
+            return json.load(fp)
+    except (OSError, ValueError):
+        return None
+
+
+def _link(existing, dest_file):
+    try:
+        os.link(existing, dest_file)
+    except FileExistsError:
+        os.unlink(dest_file)
+        os.link(existing, dest_file)
+    except OSError as ex:
+        LOG.debug(f"Can't link '{existing}': {ex}, copying it")
+        shutil.copyfile(existing, dest_file)
+
+
+def write_pyramid(im, frame_dir, tile_size=256, previous=None):
+    """Cut im into the tiles of every zoom level under frame_dir.
+
+    :param previous: the frame directory of the previous frame, to link
+                     the tiles that haven't changed to.
+    :returns: (tiles written, tiles linked, bytes written)
+    """
+    known = {}
+    prev = read_manifest(previous) if previous else None
+    if prev and prev.get('tile_size') == tile_size:
+        for name, digest in prev['tiles'].items():
+            known.setdefault(digest, os.path.join(previous, f"{name}.png"))
+
+    tiles = {}
+    written = linked = nbytes = 0
+    for z, level in levels(im, tile_size):
+        width, height = level.size
+        for x in range(math.ceil(width / tile_size)):
+            tile_dir = os.path.join(frame_dir, str(z), str(x))
+            os.makedirs(tile_dir, exist_ok=True)
+            for y in range(math.ceil(height / tile_size)):
+                left, top = x * tile_size, y * tile_size
+                # Pillow pads the edge tiles out to the full size.
+                tile = level.crop((left, top, left + tile_size,
+                                   top + tile_size))
+                digest = hashlib.blake2b(tile.tobytes(),
+                                         digest_size=16).hexdigest()
+                name = f"{z}/{x}/{y}"
+                tile_file = os.path.join(tile_dir, f"{y}.png")
+                tiles[name] = digest
+
+                existing = known.get(digest)
+                if existing and os.path.exists(existing):
+                    _link(existing, tile_file)
+                    linked += 1
+                    continue
+                tile.save(tile_file, format="PNG")
+                known[digest] = tile_file
+                written += 1
+                nbytes += os.path.getsize(tile_file)
+
+    # The manifest goes last, it marks the frame as complete.
+    manifest = {'tile_size': tile_size, 'size': list(im.size),
+                'max_zoom': max_zoom(im.size, tile_size), 'tiles': tiles}
+    tmp_file = os.path.join(frame_dir, f".{MANIFEST}.{os.getpid()}")
+    with open(tmp_file, "w") as fp:
+        json.dump(manifest, fp)
+    os.replace(tmp_file, os.path.join(frame_dir, MANIFEST))
+    return written, linked, nbytes
+
+
+def decode(image_file):
+    with Image.open(image_file) as im:
+        im.load()
+        if im.mode not in ("L", "RGB", "RGBA"):
+            return im.convert("RGB")
+        return im.copy()
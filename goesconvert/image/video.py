@@ -0,0 +1,212 @@
+"""Videos of the frames, as HLS playlists of fragmented MP4 segments.
+
+Instead of encoding the whole day again for every new frame like the
+animated gifs, each new frame is streamed as raw pixels into an ffmpeg
+that keeps running, which appends it to the playlist as a new segment.
+"""
+
+import glob
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+
+from PIL import Image
+
+from goesconvert import metrics, threads
+from goesconvert.threads import debounce
+
+
+LOG = logging.getLogger("goesconvert")
+
+
+class VideoError(Exception):
+    """The encoder for a video failed."""
+
+
+class HlsStream(object):
+    """An ffmpeg that appends the frames written to it to a playlist.
+
+    ffmpeg is started with the size of the first frame, later frames of
+    a different size are scaled to it.  A segment is only written out
+    once the frame after it comes in, or when the stream is closed.
+    """
+
+    def __init__(self, playlist, framerate=10, segment_frames=1):
+        self.playlist = playlist
+        self.framerate = framerate
+        self.segment_frames = segment_frames
+        self.proc = None
+        self.size = None
+        self.started = None
+        self.last_used = time.monotonic()
+        self._stderr = None
+
+    def _argv(self, ffmpeg, size):
+        dirname, name = os.path.split(self.playlist)
+        stem = os.path.splitext(name)[0]
+        segments = glob.glob(os.path.join(glob.escape(dirname),
+                                          f"{stem}_*.m4s"))
+        flags = ["independent_segments", "temp_file"]
+        if os.path.exists(self.playlist):
+            # Carry on with the playlist from before a restart
+            flags += ["append_list", "discont_start"]
+        return [
+            ffmpeg, "-hide_banner", "-loglevel", "error", "-y",
+            "-f", "rawvideo", "-pix_fmt", "rgb24",
+            "-s", "%dx%d" % size, "-framerate", str(self.framerate),
+            "-i", "-",
+            # yuv420p needs an even width and height
+            "-vf", "pad=ceil(iw/2)*2:ceil(ih/2)*2",
+            "-c:v", "libx264", "-pix_fmt", "yuv420p",
+            "-tune", "zerolatency",
+            "-g", str(self.segment_frames),
+            "-keyint_min", str(self.segment_frames),
+            "-sc_threshold", "0",
+            "-f", "hls",
+            "-hls_time", str(self.segment_frames / self.framerate),
+            "-hls_list_size", "0",
+            "-hls_playlist_type", "event",
+            "-hls_segment_type", "fmp4",
+            "-hls_fmp4_init_filename", f"{stem}_init.mp4",
+            "-hls_segment_filename",
+            os.path.join(dirname, f"{stem}_%05d.m4s"),
+            "-start_number", str(len(segments)),
+            "-hls_flags", "+".join(flags),
+            self.playlist,
+        ]
+
+    def _start(self, size):
+        ffmpeg = shutil.which("ffmpeg")
+        if not ffmpeg:
+            raise FileNotFoundError("ffmpeg isn't installed")
+        self._stderr = tempfile.TemporaryFile()
+        LOG.info(f"Start streaming {size[0]}x{size[1]} frames to "
+                 f"'{self.playlist}'")
+        # In a session of its own, so a CTRL+C doesn't stop it before
+        # close() had it write out the last segment.
+        self.proc = subprocess.Popen(self._argv(ffmpeg, size),
+                                     stdin=subprocess.PIPE,
+                                     stdout=subprocess.DEVNULL,
+                                     stderr=self._stderr,
+                                     start_new_session=True)
+        self.size = size
+        self.started = time.perf_counter()
+
+    def _error(self):
+        self._stderr.seek(0)
+        return self._stderr.read().decode("utf-8", "replace").strip()
+
+    def append(self, frame_file):
+        """Append the image in frame_file to the video."""
+        with Image.open(frame_file) as im:
+            im = im.convert("RGB")
+        if self.proc is None:
+            self._start(im.size)
+        elif im.size != self.size:
+            im = im.resize(self.size, Image.LANCZOS)
+
+        try:
+            self.proc.stdin.write(im.tobytes())
+            self.proc.stdin.flush()
+        except BrokenPipeError:
+            self.proc.wait()
+            metrics.COMMAND_FAILURES.inc(command="ffmpeg:hls")
+            raise VideoError(f"ffmpeg for '{self.playlist}' exited "
+                             f"({self.proc.returncode}): {self._error()}")
+        self.last_used = time.monotonic()
+
+    def close(self, timeout=60):
+        """Write out the last segment and stop ffmpeg."""
+        if self.proc is None:
+            return
+        proc, self.proc = self.proc, None
+        try:
+            proc.stdin.close()
+        except BrokenPipeError:
+            pass
+        try:
+            proc.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.wait()
+        metrics.COMMAND_SECONDS.observe(time.perf_counter() - self.started,
+                                        command="ffmpeg:hls")
+        if proc.returncode:
+            metrics.COMMAND_FAILURES.inc(command="ffmpeg:hls")
+            LOG.error(f"ffmpeg for '{self.playlist}' failed "
+                      f"({proc.returncode}): {self._error()}")
+        self._stderr.close()
+
+
+class VideoStreams(debounce.Debouncer):
+    """Appends the new frames of every video to its HlsStream, in order.
+
+    The frames of a video are held for interval seconds, so the ones
+    that were processed out of order go into the video in order.  The
+    stream of a video is kept open for the next frame, until nothing
+    was appended to it for idle_timeout seconds.
+    """
+
+    def __init__(self, interval=10, framerate=10, segment_frames=1,
+                 idle_timeout=3600, name="VideoStreams"):
+        super().__init__(self._append, interval, name=name)
+        self.framerate = framerate
+        self.segment_frames = segment_frames
+        self.idle_timeout = idle_timeout
+        self.streams = {}
+        # The newest frame in each video, also after its stream closed
+        self.last_frames = {}
+
+    def _append(self, playlist, frames):
+        stream = self.streams.get(playlist)
+        if stream is None:
+            stream = self.streams[playlist] = HlsStream(
+                playlist, framerate=self.framerate,
+                segment_frames=self.segment_frames)
+
+        for frame_file, done in sorted(frames, key=lambda f: f[0]):
+            name = os.path.basename(frame_file)
+            last_frame = self.last_frames.get(playlist)
+            if last_frame and name <= last_frame:
+                LOG.warning(f"'{frame_file}' is older than the last frame "
+                            f"of '{playlist}', skipping it")
+                continue
+            try:
+                stream.append(frame_file)
+            except Exception:
+                # Start over with a new ffmpeg for the next frames
+                del self.streams[playlist]
+                stream.close()
+                raise
+            self.last_frames[playlist] = name
+            if done:
+                done()
+
+    def close_idle(self):
+        now = time.monotonic()
+        for playlist, stream in list(self.streams.items()):
+            if now - stream.last_used >= self.idle_timeout:
+                LOG.debug(f"Closing idle video '{playlist}'")
+                del self.streams[playlist]
+                stream.close()
+
+    def close(self):
+        """Flush out what's pending and close every stream."""
+        self.flush()
+        while self.streams:
+            _, stream = self.streams.popitem()
+            stream.close()
+
+    def loop(self):
+        super().loop()
+        self.close_idle()
+        return True
+
+    def run(self):
+        # Unlike the Debouncer, append what's pending instead of
+        # dropping it, the frames won't be sent again.
+        threads.WaltThread.run(self)
+        self.close()
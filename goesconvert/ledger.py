@@ -0,0 +1,108 @@
+"""On disk record of the processing done for each source file."""
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+
+LOG = logging.getLogger("goesconvert")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS stages (
+    source TEXT NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    stage TEXT NOT NULL,
+    finished REAL NOT NULL,
+    PRIMARY KEY (source, mtime_ns, size, stage)
+) WITHOUT ROWID
+"""
+
+
+class Ledger(object):
+    """Records which processing stages finished for each source file.
+
+    Entries are keyed by the source path, mtime and size, so a source
+    that gets rewritten is processed again.  This lets a restart or a
+    catch up scan skip work that is already done without looking at
+    every output file.
+
+    The ledger is a SQLite database in WAL mode.  Every thread and
+    process gets its own connection, so it can be handed to jobs running
+    on a process pool.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        dirname = os.path.dirname(path)
+        if dirname:
+            os.makedirs(dirname, exist_ok=True)
+        with self._conn() as conn:
+            conn.execute(SCHEMA)
+
+    def __getstate__(self):
+        return {"path": self.path}
+
+    def __setstate__(self, state):
+        self.path = state["path"]
+        self._local = threading.local()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def done(self, source, stat):
+        """The stages that already finished for this version of source."""
+        cur = self._conn().execute(
+            "SELECT stage FROM stages"
+            " WHERE source = ? AND mtime_ns = ? AND size = ?",
+            (source, stat.st_mtime_ns, stat.st_size))
+        return set(row[0] for row in cur)
+
+    def record(self, source, stat, stage):
+        """Record that stage finished for this version of source."""
+        try:
+            with self._conn() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO stages VALUES (?, ?, ?, ?, ?)",
+                    (source, stat.st_mtime_ns, stat.st_size, stage,
+                     time.time()))
+        except sqlite3.Error as ex:
+            LOG.error(f"Failed to record '{stage}' for '{source}': {ex}")
+
+    def finished(self, stages, directory=None):
+        """All the sources that finished every one of stages.
+
+        :param directory: only look at sources under this directory.
+        :returns: a dict of source path to its (mtime_ns, size)
+        """
+        stages = list(stages)
+        where = "stage IN (%s)" % ",".join("?" * len(stages))
+        args = stages
+        if directory:
+            # A range on the primary key instead of a LIKE, so it's
+            # an index lookup.
+            where += " AND source > ? AND source < ?"
+            directory = directory.rstrip("/")
+            args = args + [directory + "/", directory + "0"]
+        cur = self._conn().execute(
+            "SELECT source, mtime_ns, size FROM stages"
+            " WHERE %s"
+            " GROUP BY source, mtime_ns, size"
+            " HAVING COUNT(DISTINCT stage) = ?" % where,
+            args + [len(stages)])
+        return {source: (mtime_ns, size) for source, mtime_ns, size in cur}
+
+    def forget(self, source):
+        """Drop everything recorded for source."""
+        with self._conn() as conn:
+            conn.execute("DELETE FROM stages WHERE source = ?", (source,))
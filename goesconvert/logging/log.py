@@ -1,10 +1,12 @@
+import atexit
 import logging
 from logging import NullHandler
-from logging.handlers import RotatingFileHandler
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 import queue
 import sys
 
 from oslo_config import cfg
+from rich.console import Console
 
 from goesconvert.logging import rich as my_logging
 
@@ -12,6 +14,8 @@ from goesconvert.logging import rich as my_logging
 CONF = cfg.CONF
 LOG = logging.getLogger("goesconvert")
 logging_queue = queue.Queue()
+# Hands the records in logging_queue to the real handlers
+listener = None
 
 
 LOG_LEVELS = {
@@ -56,13 +60,81 @@ CONF.register_opts(logging_opts, group=logging_group)
 
 
 
+class LazyQueueHandler(QueueHandler):
+    """Puts the records on the queue without formatting them.
+
+    The listener is in this process, so the handlers can format the
+    records, render the tracebacks and do the I/O over in its thread.
+    Only the message is put together here, so args that change later
+    don't change what's logged.
+    """
+
+    def prepare(self, record):
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+def _start_listener(handlers):
+    global listener
+    stop_logging()
+    listener = QueueListener(logging_queue, *handlers,
+                             respect_handler_level=True)
+    listener.start()
+    LOG.addHandler(LazyQueueHandler(logging_queue))
+
+
+def stop_logging():
+    """Write out what's still queued up and stop the listener."""
+    global listener
+    if listener is None:
+        return
+    for handler in list(LOG.handlers):
+        if isinstance(handler, QueueHandler):
+            LOG.removeHandler(handler)
+    listener.stop()
+    listener = None
+
+
+atexit.register(stop_logging)
+
+
+def log_to_stderr():
+    """Log to stderr instead of stdout, for commands that print results."""
+    if listener is None:
+        return
+    for handler in listener.handlers:
+        if isinstance(handler, my_logging.RichHandler):
+            handler.console = Console(stderr=True)
+
+
+def setup_worker_logging():
+    """Log straight to the handlers in a forked worker process.
+
+    The listener thread doesn't make it across the fork, the records
+    would pile up in the copy of the queue.
+    """
+    global listener
+    if listener is None:
+        return
+    for handler in list(LOG.handlers):
+        if isinstance(handler, QueueHandler):
+            LOG.removeHandler(handler)
+    for handler in listener.handlers:
+        LOG.addHandler(handler)
+    listener = None
+
+
 # Setup the logging faciility
 # to disable logging to stdout, but still log to file
 # use the --quiet option on the cmdline
+# The handlers run in the listener thread, so the threads doing the
+# work never wait on the console or the log file.
 def setup_logging(loglevel, quiet):
     log_level = LOG_LEVELS[loglevel]
     LOG.setLevel(log_level)
     date_format = CONF["logging"].get("date_format")
+    handlers = []
 
     rich_logging = False
     if CONF["logging"].get("rich_logging") and not quiet:
@@ -73,7 +145,7 @@ def setup_logging(loglevel, quiet):
             rich_tracebacks=True, omit_repeated_times=False,
         )
         rh.setFormatter(log_formatter)
-        LOG.addHandler(rh)
+        handlers.append(rh)
         rich_logging = True
 
     log_file = CONF["logging"].get("logfile")
@@ -83,7 +155,10 @@ def setup_logging(loglevel, quiet):
     if log_file:
         fh = RotatingFileHandler(log_file, maxBytes=(10248576 * 5), backupCount=4)
         fh.setFormatter(log_formatter)
-        LOG.addHandler(fh)
+        handlers.append(fh)
+
+    if handlers:
+        _start_listener(handlers)
 
 
 def setup_logging_no_config(loglevel, quiet):
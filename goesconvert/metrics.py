@@ -0,0 +1,331 @@
+"""Counters and histograms for the monitor, in Prometheus text format.
+
+The metrics live in the process wide REGISTRY.  Jobs that run in a
+worker process record into the registry of that process, which the
+WorkerPool hands back to the parent with snapshot() and merge().
+"""
+
+import bisect
+import http.server
+import json
+import logging
+import threading
+
+from goesconvert import threads
+
+
+LOG = logging.getLogger("goesconvert")
+
+# Seconds, from a quick crop up to rebuilding a long animation.
+DEFAULT_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120,
+                   300)
+
+
+def _escape(value):
+    return (str(value).replace("\\", "\\\\").replace("\n", "\\n")
+            .replace('"', '\\"'))
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{%s}" % ",".join(f'{k}="{_escape(v)}"' for k, v in pairs)
+
+
+class Registry(object):
+    """Singleton class that keeps track of all the metrics."""
+
+    _instance = None
+
+    metrics = {}
+    lock = threading.Lock()
+
+    def __new__(cls, *args, **kwargs):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+        return cls._instance
+
+    def register(self, metric):
+        with self.lock:
+            if metric.name in self.metrics:
+                raise ValueError(f"Metric '{metric.name}' already exists")
+            self.metrics[metric.name] = metric
+        return metric
+
+    def render(self):
+        """All the metrics in the Prometheus text exposition format."""
+        with self.lock:
+            metrics = sorted(self.metrics.values(), key=lambda m: m.name)
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self):
+        """The counters and histograms, to merge() into another process."""
+        with self.lock:
+            return {name: metric.snapshot()
+                    for name, metric in self.metrics.items()
+                    if metric.kind != "gauge"}
+
+    def merge(self, snapshot):
+        for name, values in snapshot.items():
+            metric = self.metrics.get(name)
+            if metric:
+                metric.merge(values)
+
+    def reset(self):
+        with self.lock:
+            for metric in self.metrics.values():
+                metric.reset()
+
+
+class _Metric(object):
+    kind = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labels)
+        self.lock = threading.Lock()
+        self.values = {}
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} needs labels {self.labelnames}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def snapshot(self):
+        with self.lock:
+            return dict(self.values)
+
+    def reset(self):
+        with self.lock:
+            self.values.clear()
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def get(self, **labels):
+        with self.lock:
+            return self.values.get(self._key(labels), 0)
+
+    def merge(self, values):
+        with self.lock:
+            for key, value in values.items():
+                self.values[key] = self.values.get(key, 0) + value
+
+    def render(self):
+        with self.lock:
+            items = sorted(self.values.items())
+        return [f"{self.name}{_labels(self.labelnames, key)} {value}"
+                for key, value in items]
+
+
+class Gauge(_Metric):
+    """A value that goes up and down, or is read from a function."""
+
+    kind = "gauge"
+
+    def __init__(self, name, help, labels=()):
+        super().__init__(name, help, labels=labels)
+        self.functions = {}
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = value
+
+    def set_function(self, function, **labels):
+        """Call function for the value every time the gauge is read."""
+        key = self._key(labels)
+        with self.lock:
+            self.functions[key] = function
+
+    def get(self, **labels):
+        key = self._key(labels)
+        with self.lock:
+            function = self.functions.get(key)
+            if function is None:
+                return self.values.get(key, 0)
+        return function()
+
+    def render(self):
+        with self.lock:
+            keys = sorted(set(self.values) | set(self.functions))
+        lines = []
+        for key in keys:
+            try:
+                value = self.get(**dict(zip(self.labelnames, key)))
+            except Exception as ex:
+                LOG.warning(f"Can't read gauge {self.name}: {ex}")
+                continue
+            lines.append(f"{self.name}{_labels(self.labelnames, key)} "
+                         f"{value}")
+        return lines
+
+    def reset(self):
+        with self.lock:
+            self.values.clear()
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labels=labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        # bucket i counts the values <= buckets[i], the last one is +Inf
+        idx = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            counts, total = self.values.get(
+                key, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[idx] += 1
+            self.values[key] = (counts, total + value)
+
+    def count(self, **labels):
+        with self.lock:
+            counts, _ = self.values.get(self._key(labels), ([0], 0.0))
+            return sum(counts)
+
+    def snapshot(self):
+        with self.lock:
+            return {key: (list(counts), total)
+                    for key, (counts, total) in self.values.items()}
+
+    def merge(self, values):
+        with self.lock:
+            for key, (counts, total) in values.items():
+                mine, my_total = self.values.get(
+                    key, ([0] * (len(self.buckets) + 1), 0.0))
+                self.values[key] = ([a + b for a, b in zip(mine, counts)],
+                                    my_total + total)
+
+    def render(self):
+        with self.lock:
+            items = sorted((key, list(counts), total)
+                           for key, (counts, total) in self.values.items())
+        lines = []
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                le = _labels(self.labelnames, key, [("le", bound)])
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            labels = _labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {total}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+REGISTRY = Registry()
+
+QUEUE_DEPTH = REGISTRY.register(Gauge(
+    "goesconvert_queue_depth",
+    "Files waiting for a free worker."))
+JOBS_RUNNING = REGISTRY.register(Gauge(
+    "goesconvert_jobs_running",
+    "Files being processed right now."))
+JOBS_DROPPED = REGISTRY.register(Counter(
+    "goesconvert_jobs_dropped_total",
+    "Queued files, or their animation rebuilds, that were skipped.",
+    labels=("reason",)))
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "goesconvert_stage_seconds",
+    "How long each processing stage took.",
+    labels=("model", "stage")))
+STAGE_FAILURES = REGISTRY.register(Counter(
+    "goesconvert_stage_failures_total",
+    "Processing stages that failed.",
+    labels=("model", "stage")))
+BYTES_READ = REGISTRY.register(Counter(
+    "goesconvert_read_bytes_total",
+    "Size of the source files processed.",
+    labels=("model",)))
+BYTES_WRITTEN = REGISTRY.register(Counter(
+    "goesconvert_written_bytes_total",
+    "Size of the image files written.",
+    labels=("model",)))
+COMMAND_SECONDS = REGISTRY.register(Histogram(
+    "goesconvert_command_seconds",
+    "Wall time of the external commands run.",
+    labels=("command",)))
+COMMAND_FAILURES = REGISTRY.register(Counter(
+    "goesconvert_command_failures_total",
+    "External commands that failed or timed out.",
+    labels=("command",)))
+END_TO_END_SECONDS = REGISTRY.register(Histogram(
+    "goesconvert_end_to_end_seconds",
+    "Time from a source file being written to its processing being done.",
+    labels=("model",)))
+EVENT_LATENCY_SECONDS = REGISTRY.register(Histogram(
+    "goesconvert_event_latency_seconds",
+    "Time from a new file being written to its watchdog event.",
+    labels=("observer",),
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30)))
+UNFINISHED_FILES = REGISTRY.register(Counter(
+    "goesconvert_unfinished_files_total",
+    "New files given up on because they were never completely written."))
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.path == "/metrics":
+            body = REGISTRY.render().encode("utf-8")
+            content_type = "text/plain; version=0.0.4; charset=utf-8"
+        elif self.path == "/health":
+            body = json.dumps(self.server.health()).encode("utf-8")
+            content_type = "application/json"
+        else:
+            self.send_error(404)
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        LOG.debug(f"metrics: {self.address_string()} {format % args}")
+
+
+def _health():
+    return {
+        "status": "ok",
+        "threads": sorted(th.name for th in threads.WaltThreadList()
+                          .threads_list),
+    }
+
+
+class MetricsServer(threads.WaltThread):
+    """Serves /metrics and /health over HTTP."""
+
+    def __init__(self, host="127.0.0.1", port=9110, health=_health):
+        super().__init__("MetricsServer")
+        self.server = http.server.HTTPServer((host, port), _Handler)
+        self.server.timeout = 1
+        self.server.health = health
+        LOG.info(f"Serving metrics on http://{host}:"
+                 f"{self.server.server_port}/metrics")
+
+    def loop(self):
+        self.server.handle_request()
+        return True
+
+    def run(self):
+        super().run()
+        self.server.server_close()
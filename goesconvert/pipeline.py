@@ -0,0 +1,219 @@
+"""What to make out of each new file, and the stages that make it.
+
+The pipeline is configured per model as a set of named products:
+
+    fd:
+      va:
+        crop: va              # crop a region out of the file
+        label: true           # annotate it with the time
+        animate: animate.gif  # and animate the crops
+        video: va.m3u8        # and stream them into an HLS video
+      earth:
+        copy: animate         # copy to this subdirectory ('' for none)
+        scale: 25             # resized to 25%
+        label: false
+        animate: earth.gif
+        channels: [ch13]      # only for these channels
+        keep_days: 7          # remove them after a week
+      map:
+        tiles: tiles          # an XYZ tile pyramid in this subdirectory
+        tile_size: 256
+
+Models that aren't configured aren't processed at all.  The products
+of a file are turned into stages, where all the crops are one stage so
+they come out of a single decode of the file, and an animation comes
+after the stage that writes its frames.
+"""
+
+import collections
+import logging
+
+import yaml
+
+
+LOG = logging.getLogger("goesconvert")
+
+# What goesconvert has always made out of the goestools files.
+DEFAULT_PIPELINE = {
+    'fd': {
+        'va': {'crop': 'va', 'label': True, 'animate': 'animate.gif'},
+        'ca': {'crop': 'ca', 'label': True, 'animate': 'animate.gif'},
+        'usa': {'crop': 'usa', 'label': True, 'animate': 'animate.gif'},
+        'fd': {'copy': 'animate', 'scale': 25, 'label': False,
+               'animate': 'earth.gif'},
+    },
+    'm1': {
+        'full': {'copy': '', 'label': True, 'animate': 'animate.gif'},
+    },
+    'm2': {
+        'full': {'copy': '', 'label': True, 'animate': 'animate.gif'},
+    },
+}
+
+PRODUCT_KEYS = {'crop', 'copy', 'tiles', 'tile_size', 'scale', 'label',
+                'animate', 'video', 'channels', 'keep_days'}
+KINDS = ('crop', 'copy', 'tiles')
+
+# name: the name the ledger knows the stage by
+# method, kwargs: the FileHandler method that does the stage
+# after: the stages that have to be done first
+Stage = collections.namedtuple("Stage",
+                               ["name", "method", "kwargs", "after"])
+
+
+class PipelineError(Exception):
+    """The pipeline configuration is invalid."""
+
+
+class Pipeline(object):
+
+    def __init__(self, config):
+        self.config = self._validate(config)
+        self._stages = {}
+
+    @classmethod
+    def load(cls, path=None):
+        """Load a pipeline file, or the default pipeline without one."""
+        if not path:
+            return cls(DEFAULT_PIPELINE)
+        with open(path) as fp:
+            return cls(yaml.safe_load(fp) or {})
+
+    @staticmethod
+    def _validate(config):
+        if not isinstance(config, dict):
+            raise PipelineError("The pipeline must map models to products")
+        for model, products in config.items():
+            if not isinstance(products, dict):
+                raise PipelineError(f"'{model}' must map names to products")
+            for name, product in products.items():
+                where = f"{model}/{name}"
+                if not isinstance(product, dict):
+                    raise PipelineError(f"'{where}' isn't a product")
+                unknown = set(product) - PRODUCT_KEYS
+                if unknown:
+                    raise PipelineError(
+                        f"'{where}' has unknown settings {sorted(unknown)}")
+                if sum(kind in product for kind in KINDS) != 1:
+                    raise PipelineError(
+                        f"'{where}' needs one of 'crop', 'copy' or 'tiles'")
+                if 'scale' in product and 'crop' in product:
+                    raise PipelineError(f"'{where}' can't scale a crop")
+                if 'tiles' in product:
+                    extra = set(product) & {'scale', 'label', 'animate',
+                                            'video'}
+                    if extra:
+                        raise PipelineError(
+                            f"'{where}' can't have {sorted(extra)} on tiles")
+                    tile_size = product.get('tile_size', 256)
+                    if not isinstance(tile_size, int) or tile_size < 16:
+                        raise PipelineError(
+                            f"'{where}' tile_size must be a number of "
+                            f"pixels")
+                elif 'tile_size' in product:
+                    raise PipelineError(
+                        f"'{where}' has a tile_size but no tiles")
+                keep_days = product.get('keep_days')
+                if keep_days is not None:
+                    if not isinstance(keep_days, int) or keep_days < 1:
+                        raise PipelineError(
+                            f"'{where}' keep_days must be a number of days")
+                    if not (product.get('crop') or product.get('copy')
+                            or product.get('tiles')):
+                        raise PipelineError(
+                            f"'{where}' has no directory of its own to "
+                            f"apply keep_days to")
+                video = product.get('video')
+                if video is not None and not str(video).endswith(".m3u8"):
+                    raise PipelineError(
+                        f"'{where}' video must be an .m3u8 playlist")
+        return config
+
+    def products(self, model, chan):
+        """The products configured for a file of model and chan."""
+        products = self.config.get(model) or {}
+        return {name: product for name, product in products.items()
+                if chan in product.get('channels', [chan])}
+
+    def keep_days(self, model):
+        """How long to keep the products of model that have a keep_days.
+
+        :returns: {the product's directory in a channel: days}
+        """
+        keep = {}
+        for product in (self.config.get(model) or {}).values():
+            if product.get('keep_days'):
+                directory = (product.get('crop') or product.get('copy')
+                             or product.get('tiles'))
+                keep[directory] = max(keep.get(directory, 0),
+                                      product['keep_days'])
+        return keep
+
+    def stages(self, model, chan):
+        """The stages for a file of model and chan, in the order to run.
+
+        Stages only ever come after stages listed before them.
+        """
+        key = (model, chan)
+        if key not in self._stages:
+            self._stages[key] = self._build(self.products(model, chan))
+        return self._stages[key]
+
+    def _build(self, products):
+        outputs = []
+        animations = []
+        regions = [product['crop'] for product in products.values()
+                   if 'crop' in product]
+        unlabeled = [product['crop'] for product in products.values()
+                     if 'crop' in product and not product.get('label', True)]
+        # Named after the regions, so a region that's added later isn't
+        # taken as done for the files the ledger has the others for.
+        crop_stage = "crop:" + ",".join(sorted(regions))
+        if regions:
+            outputs.append(Stage(crop_stage, "crop_regions", {
+                'regions': tuple(regions),
+                'unlabeled': tuple(unlabeled),
+            }, ()))
+
+        for name, product in products.items():
+            if 'tiles' in product:
+                outputs.append(Stage(f"tiles:{name}", "tiles", {
+                    'subdest': product['tiles'] or None,
+                    'tile_size': product.get('tile_size', 256),
+                }, ()))
+                continue
+            if 'crop' in product:
+                source = crop_stage
+                frames = {'region': product['crop']}
+            else:
+                subdest = product['copy'] or None
+                source = f"copy:{name}"
+                frames = {'subdest': subdest}
+                outputs.append(Stage(source, "copy", {
+                    'subdest': subdest,
+                    'overlay': product.get('label', True),
+                    'scale': product.get('scale'),
+                }, ()))
+
+            if product.get('animate'):
+                animations.append(Stage(
+                    f"animate:{name}", "animate",
+                    dict(frames, name=product['animate']), (source,)))
+            if product.get('video'):
+                animations.append(Stage(
+                    f"video:{name}", "video",
+                    dict(frames, name=product['video']), (source,)))
+
+        # The animations last, so all their frames are written by then.
+        return outputs + animations
+
+
+_pipelines = {}
+
+
+def get_pipeline(path=None):
+    """The pipeline from path, loaded once per process."""
+    if path not in _pipelines:
+        LOG.info(f"Loading pipeline '{path or 'default'}'")
+        _pipelines[path] = Pipeline.load(path)
+    return _pipelines[path]
@@ -0,0 +1,127 @@
+"""The regions that get cropped out of the full disk images.
+
+A regions file maps region names to their settings:
+
+    va:
+      geometry: 1024x768+2100+600   # or one per satellite:
+                                    #   {goeseast: ..., goeswest: ...}
+      timezone: EST                 # for the label and the file names
+      label: Virginia               # shown in front of the time
+      size: 512x384                 # scale the crop to fit in this
+
+When a region has no geometry, the crop_<name> option of the satellite
+is used, so va, ca and usa work as they always have without a file.
+"""
+
+import collections
+import logging
+
+import pytz
+import yaml
+
+from goesconvert.image import base
+from goesconvert.utils.timezone import EST, GMT, PST
+
+
+LOG = logging.getLogger("goesconvert")
+
+ZONES = {'GMT': GMT, 'EST': EST, 'PST': PST}
+
+DEFAULT_REGIONS = {
+    'va': {'timezone': 'EST'},
+    'ca': {'timezone': 'PST'},
+    'usa': {'timezone': 'EST'},
+}
+
+REGION_KEYS = {'geometry', 'timezone', 'label', 'size'}
+
+Region = collections.namedtuple(
+    "Region", ["name", "geometry", "timezone", "label", "size"])
+
+
+class RegionError(Exception):
+    """A region is unknown or badly configured."""
+
+
+def get_timezone(name):
+    if name in ZONES:
+        return ZONES[name]
+    try:
+        return pytz.timezone(name)
+    except pytz.UnknownTimeZoneError:
+        raise RegionError(f"Unknown timezone '{name}'")
+
+
+def parse_size(size):
+    """Parse a 'WxH' size into a (width, height) tuple."""
+    try:
+        width, height = (int(x) for x in str(size).lower().split("x"))
+    except ValueError:
+        raise RegionError(f"Invalid size '{size}', it must be WxH")
+    return width, height
+
+
+class RegionRegistry(object):
+
+    def __init__(self, config):
+        if not isinstance(config, dict):
+            raise RegionError("The regions must map names to settings")
+        self.regions = {}
+        for name, settings in config.items():
+            settings = settings or {}
+            unknown = set(settings) - REGION_KEYS
+            if unknown:
+                raise RegionError(
+                    f"Region '{name}' has unknown settings {sorted(unknown)}")
+            geometry = settings.get('geometry')
+            for geo in (geometry.values() if isinstance(geometry, dict)
+                        else [geometry] if geometry else []):
+                try:
+                    base.parse_geometry(geo)
+                except ValueError as ex:
+                    raise RegionError(f"Region '{name}': {ex}")
+            self.regions[name] = Region(
+                name, geometry,
+                get_timezone(settings.get('timezone', 'GMT')),
+                settings.get('label'),
+                parse_size(settings['size']) if settings.get('size')
+                else None)
+
+    @classmethod
+    def load(cls, path=None):
+        """Load a regions file, or the default regions without one."""
+        if not path:
+            return cls(DEFAULT_REGIONS)
+        with open(path) as fp:
+            return cls(yaml.safe_load(fp) or {})
+
+    def __contains__(self, name):
+        return name in self.regions
+
+    def get(self, name, satellite=None):
+        """The region, with the geometry to use for satellite."""
+        try:
+            region = self.regions[name]
+        except KeyError:
+            raise RegionError(f"Unknown region '{name}'")
+
+        satellite = satellite or {}
+        geometry = region.geometry
+        if isinstance(geometry, dict):
+            geometry = geometry.get(satellite.get('satellite'))
+        if not geometry:
+            geometry = satellite.get(f"crop_{name}")
+        if not geometry:
+            raise RegionError(f"No crop geometry for region '{name}'")
+        return region._replace(geometry=geometry)
+
+
+_registries = {}
+
+
+def get_registry(path=None):
+    """The regions from path, loaded once per process."""
+    if path not in _registries:
+        LOG.info(f"Loading regions '{path or 'default'}'")
+        _registries[path] = RegionRegistry.load(path)
+    return _registries[path]
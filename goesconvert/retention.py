@@ -0,0 +1,204 @@
+"""Removes the old processed images from process_dir.
+
+Everything in process_dir is under a directory per model and day,
+<model>/<YYYY-MM-DD>/<chan>/..., so old images go a whole day at a
+time.  A day that's too old, or the oldest days of a model that takes
+up too much space, are renamed into process_dir/.trash in one go.  The
+files in there are deleted a few at a time in the background, so the
+disk isn't swamped with deletes.
+
+Products can be kept for less time than the rest of their model, their
+directory is taken out of each day that's older than that.
+"""
+
+import collections
+from datetime import datetime, timedelta
+import logging
+import os
+import re
+import shutil
+import time
+
+from goesconvert import threads, utils
+from goesconvert.utils.timezone import GMT
+
+
+LOG = logging.getLogger("goesconvert")
+
+DAY_RE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+TRASH_DIR = ".trash"
+
+# days: keep the days that are at most this many days old, 0 for all
+# max_bytes: drop the oldest days while the model takes up more, 0 for
+#            no limit
+# products: {product directory: days}, for the products kept for less
+Policy = collections.namedtuple("Policy", ["days", "max_bytes", "products"])
+
+
+def day_dirs(model_dir):
+    """The day directories of a model, oldest first, as (date, path)."""
+    try:
+        entries = list(os.scandir(model_dir))
+    except FileNotFoundError:
+        return []
+    days = []
+    for entry in entries:
+        if entry.is_dir(follow_symlinks=False) and DAY_RE.match(entry.name):
+            days.append((datetime.strptime(entry.name, "%Y-%m-%d").date(),
+                         entry.path))
+    return sorted(days)
+
+
+def dir_size(path):
+    """The size of all the files under path."""
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for name in filenames:
+            try:
+                total += os.lstat(os.path.join(dirpath, name)).st_size
+            except OSError:
+                pass
+    return total
+
+
+class Sweeper(object):
+    """Applies the retention policies to the models in one process_dir."""
+
+    def __init__(self, process_dir, policies):
+        self.process_dir = process_dir
+        self.policies = policies
+        self.trash = os.path.join(process_dir, TRASH_DIR)
+        # The sizes of the days nothing gets written to anymore
+        self._sizes = {}
+
+    def _size(self, path, day, today):
+        if today - day < timedelta(days=2):
+            return dir_size(path)
+        if path not in self._sizes:
+            self._sizes[path] = dir_size(path)
+        return self._sizes[path]
+
+    def _discard(self, path, name):
+        os.makedirs(self.trash, exist_ok=True)
+        dest = os.path.join(self.trash, f"{name}-{utils.time_ns()}")
+        os.rename(path, dest)
+        self._sizes.pop(path, None)
+
+    def sweep(self, now=None):
+        """Move what's past its policy to the trash.
+
+        :returns: how many directories were moved.
+        """
+        today = (now or datetime.now(tz=GMT)).date()
+        moved = 0
+        for model, policy in self.policies.items():
+            days = day_dirs(os.path.join(self.process_dir, model))
+            keep = []
+            for day, path in days:
+                if policy.days and (today - day).days > policy.days:
+                    LOG.info(f"Removing '{path}', older than "
+                             f"{policy.days} days")
+                    self._discard(path, f"{model}-{day}")
+                    moved += 1
+                else:
+                    keep.append((day, path))
+
+            if policy.max_bytes:
+                sizes = [self._size(path, day, today) for day, path in keep]
+                total = sum(sizes)
+                # Never the day that's being written to
+                while len(keep) > 1 and total > policy.max_bytes:
+                    day, path = keep[0]
+                    if day >= today:
+                        break
+                    LOG.info(f"Removing '{path}', {model} takes up "
+                             f"{total} bytes")
+                    self._discard(path, f"{model}-{day}")
+                    total -= sizes.pop(0)
+                    keep.pop(0)
+                    moved += 1
+
+            for product, product_days in policy.products.items():
+                for day, path in keep:
+                    if (today - day).days <= product_days:
+                        break
+                    moved += self._sweep_product(model, day, path, product)
+        return moved
+
+    def _sweep_product(self, model, day, day_dir, product):
+        moved = 0
+        for chan in sorted(os.listdir(day_dir)):
+            path = os.path.join(day_dir, chan, product)
+            if os.path.isdir(path):
+                LOG.info(f"Removing '{path}'")
+                self._discard(path, f"{model}-{day}-{chan}-{product}")
+                moved += 1
+        return moved
+
+    def purge(self, rate=0, stop=None):
+        """Delete what's in the trash, at most rate files a second.
+
+        :param stop: called between deletes, stops the purge when it
+                     returns True.
+        :returns: how many files were deleted.
+        """
+        if not os.path.isdir(self.trash):
+            return 0
+        if not rate:
+            count = sum(len(files) for _, _, files in os.walk(self.trash))
+            shutil.rmtree(self.trash, ignore_errors=True)
+            return count
+
+        deleted = 0
+        start = time.monotonic()
+        for dirpath, dirnames, filenames in os.walk(self.trash,
+                                                    topdown=False):
+            for name in filenames:
+                if stop and stop():
+                    return deleted
+                try:
+                    os.unlink(os.path.join(dirpath, name))
+                except OSError as ex:
+                    LOG.warning(f"Can't remove '{name}': {ex}")
+                deleted += 1
+                ahead = deleted / rate - (time.monotonic() - start)
+                if ahead > 0:
+                    time.sleep(ahead)
+            for name in dirnames:
+                try:
+                    os.rmdir(os.path.join(dirpath, name))
+                except OSError:
+                    pass
+        return deleted
+
+
+class Retention(threads.WaltThread):
+    """Sweeps every interval seconds and empties the trash slowly."""
+
+    def __init__(self, sweepers, interval=3600, delete_rate=0):
+        super().__init__("Retention")
+        self.sweepers = sweepers
+        self.interval = interval
+        self.delete_rate = delete_rate
+        self.next_sweep = 0
+
+    def _stopped(self):
+        return self.thread_stop
+
+    def loop(self):
+        if time.monotonic() < self.next_sweep:
+            time.sleep(1)
+            return True
+
+        for sweeper in self.sweepers:
+            try:
+                sweeper.sweep()
+            except OSError as ex:
+                LOG.error(f"Sweeping '{sweeper.process_dir}' failed: {ex}")
+            deleted = sweeper.purge(rate=self.delete_rate,
+                                    stop=self._stopped)
+            if deleted:
+                LOG.info(f"Deleted {deleted} old files from "
+                         f"'{sweeper.process_dir}'")
+        self.next_sweep = time.monotonic() + self.interval
+        return True
@@ -0,0 +1,77 @@
+"""Walk the goestools directory tree for source images."""
+
+from datetime import datetime
+import logging
+import os
+
+from goesconvert.utils.timezone import GMT
+
+
+LOG = logging.getLogger("goesconvert")
+
+SOURCE_TIME_FMT = '%Y-%m-%dT-%H-%M-%SZ'
+DIR_DATE_FMT = '%Y-%m-%d'
+
+
+def source_time(name):
+    """The time in a goestools file name, or None if there isn't one."""
+    try:
+        dto = datetime.strptime(name[:-4], SOURCE_TIME_FMT)
+    except ValueError:
+        return None
+    return dto.replace(tzinfo=GMT)
+
+
+def _too_old(name, since):
+    # Skip whole date directories that are older than since
+    try:
+        day = datetime.strptime(name, DIR_DATE_FMT).date()
+    except ValueError:
+        return False
+    return day < since.date()
+
+
+def iter_dirs(top, since=None):
+    """Walk top and yield (dirpath, entries) for each directory.
+
+    entries are the os.DirEntry of the goestools PNG files directly in
+    dirpath, sorted by name, which is oldest first.  Directories are
+    walked in sorted order one at a time, so only one directory listing
+    is in memory at a time no matter how big the tree is.
+
+    :param since: an aware datetime, skip files older than it.
+    """
+    try:
+        with os.scandir(top) as it:
+            entries = list(it)
+    except OSError as ex:
+        LOG.warning(f"Can't scan '{top}': {ex}")
+        return
+
+    files = []
+    dirs = []
+    for entry in entries:
+        if entry.name.startswith("."):
+            continue
+        if entry.is_dir(follow_symlinks=False):
+            if not since or not _too_old(entry.name, since):
+                dirs.append(entry.path)
+        elif entry.name.endswith(".png") and entry.is_file():
+            file_time = source_time(entry.name)
+            if file_time and (not since or file_time >= since):
+                files.append(entry)
+    del entries
+
+    if files:
+        files.sort(key=lambda entry: entry.name)
+        yield top, files
+    del files
+
+    for dirpath in sorted(dirs):
+        yield from iter_dirs(dirpath, since=since)
+
+
+def iter_sources(top, since=None):
+    """Yield the os.DirEntry of every goestools PNG file under top."""
+    for _, entries in iter_dirs(top, since=since):
+        yield from entries
@@ -0,0 +1,73 @@
+import logging
+import threading
+import time
+
+from goesconvert import threads
+
+
+LOG = logging.getLogger("goesconvert")
+
+
+class Debouncer(threads.WaltThread):
+    """Coalesces requests for the same key into one callback.
+
+    The first request for a key schedules callback(key, values) interval
+    seconds later, and every request for that key until then is merged
+    into values.  So the callback runs at most once per interval for
+    each key, however many requests come in.
+    """
+
+    def __init__(self, callback, interval, name="Debouncer"):
+        super().__init__(name)
+        self.callback = callback
+        self.interval = interval
+        # key: (when it's due, [values])
+        self.pending = {}
+        self.cond = threading.Condition()
+
+    def __len__(self):
+        with self.cond:
+            return len(self.pending)
+
+    def request(self, key, value):
+        with self.cond:
+            if key in self.pending:
+                self.pending[key][1].append(value)
+                return
+            self.pending[key] = (time.monotonic() + self.interval, [value])
+            self.cond.notify()
+
+    def _take(self, flush=False):
+        with self.cond:
+            now = time.monotonic()
+            due = [key for key, (when, _) in self.pending.items()
+                   if flush or when <= now]
+            return [(key, self.pending.pop(key)[1]) for key in due]
+
+    def _fire(self, ready):
+        for key, values in ready:
+            try:
+                self.callback(key, values)
+            except Exception as ex:
+                LOG.exception(f"Debounced callback for {key} failed: {ex}")
+
+    def flush(self):
+        """Run the callback for everything pending right now."""
+        self._fire(self._take(flush=True))
+
+    def loop(self):
+        with self.cond:
+            wait = 1
+            if self.pending:
+                first = min(when for when, _ in self.pending.values())
+                wait = min(wait, max(0, first - time.monotonic()))
+            self.cond.wait(wait)
+        self._fire(self._take())
+        return True
+
+    def run(self):
+        super().run()
+        with self.cond:
+            if self.pending:
+                LOG.info(f"Dropped {len(self.pending)} pending requests")
+            self.pending.clear()
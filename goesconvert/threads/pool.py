@@ -0,0 +1,374 @@
+import collections
+import concurrent.futures
+import logging
+import queue
+import signal
+import threading
+import time
+
+from goesconvert import metrics, threads
+from goesconvert.logging import log
+
+
+LOG = logging.getLogger("goesconvert")
+
+try:
+    BrokenExecutor = concurrent.futures.BrokenExecutor
+except AttributeError:
+    # Python 3.6
+    from concurrent.futures.process import BrokenProcessPool as BrokenExecutor
+
+# Whether _worker_init ran in this process
+_worker_ready = False
+
+
+def _worker_init():
+    global _worker_ready
+    # Let the parent decide how to shut down the workers on CTRL+C
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    log.setup_worker_logging()
+    _worker_ready = True
+
+
+def process_executor(max_workers):
+    """A ProcessPoolExecutor with workers set up by _worker_init."""
+    try:
+        return concurrent.futures.ProcessPoolExecutor(
+            max_workers=max_workers, initializer=_worker_init)
+    except TypeError:
+        # Python 3.6 has no initializer, _run_in_process does it
+        return concurrent.futures.ProcessPoolExecutor(
+            max_workers=max_workers)
+
+
+def _run_in_process(job):
+    if not _worker_ready:
+        _worker_init()
+    # Start from zero, so the parent only gets what this job recorded.
+    metrics.REGISTRY.reset()
+    result = job.run()
+    return result, metrics.REGISTRY.snapshot()
+
+
+class FairQueue(object):
+    """A queue that takes turns between the keys of the jobs in it.
+
+    Every job key (ie. the satellite and model of a file) gets a FIFO of
+    its own, up to maxsize jobs, and get() goes over the keys that have
+    jobs waiting with a smooth weighted round robin, using the weight of
+    the jobs.  A key with weight 4 gets four turns for every turn of a
+    key with weight 1, spread out evenly, and keys with the same weight
+    take turns.  So a burst from one feed can't hold up another one, or
+    block whoever is queueing for it.
+
+    A job with a supersedes key is superseded (supersede() is called on
+    it) when it's taken out of the queue while a newer job with the same
+    key is still waiting.  The newer job is then held back until done()
+    is called for the older one, so it only starts once the older one
+    has written everything the newer one is going to pick up.  Jobs of
+    other supersedes keys go ahead of it in the meantime.
+    """
+
+    def __init__(self, maxsize=0):
+        self.maxsize = maxsize
+        self.queues = collections.OrderedDict()
+        self.weights = {}
+        self.current = {}
+        # supersedes key: the newest job with it that's waiting
+        self.latest = {}
+        # supersedes key: the superseded job the others have to wait for
+        self.holding = {}
+        self.cond = threading.Condition()
+
+    @staticmethod
+    def _key(job):
+        return getattr(job, "key", None)
+
+    def qsize(self):
+        with self.cond:
+            return sum(len(q) for q in self.queues.values())
+
+    def put(self, job, timeout=None):
+        key = self._key(job)
+        deadline = time.monotonic() + timeout if timeout else None
+        with self.cond:
+            while (self.maxsize
+                   and len(self.queues.get(key, ())) >= self.maxsize):
+                remaining = deadline - time.monotonic() if deadline else None
+                if remaining is not None and remaining <= 0:
+                    raise queue.Full
+                self.cond.wait(remaining)
+            if key not in self.queues:
+                self.queues[key] = collections.deque()
+                self.current[key] = 0
+            self.weights[key] = max(1, getattr(job, "weight", 1))
+            self.queues[key].append(job)
+
+            supersedes = getattr(job, "supersedes", None)
+            if supersedes is not None:
+                self.latest[supersedes] = job
+            self.cond.notify_all()
+
+    def _ready(self):
+        """The index of the first job that isn't held back, by key."""
+        ready = {}
+        for key, jobs in self.queues.items():
+            for index, job in enumerate(jobs):
+                if getattr(job, "supersedes", None) not in self.holding:
+                    ready[key] = index
+                    break
+        return ready
+
+    def _pop(self, ready):
+        total = 0
+        best = None
+        for key in ready:
+            self.current[key] += self.weights[key]
+            total += self.weights[key]
+            if best is None or self.current[key] > self.current[best]:
+                best = key
+        self.current[best] -= total
+
+        jobs = self.queues[best]
+        job = jobs[ready[best]]
+        del jobs[ready[best]]
+        if not jobs:
+            del self.queues[best]
+            del self.current[best]
+        supersedes = getattr(job, "supersedes", None)
+        if supersedes is not None:
+            if self.latest.get(supersedes) is job:
+                del self.latest[supersedes]
+            else:
+                # A newer job rebuilds the same animations after us
+                job.supersede()
+                self.holding[supersedes] = job
+        self.cond.notify_all()
+        return job
+
+    def get(self, timeout=None):
+        with self.cond:
+            if not self.cond.wait_for(self._ready, timeout):
+                raise queue.Empty
+            return self._pop(self._ready())
+
+    def get_nowait(self):
+        return self.get(timeout=0)
+
+    def done(self, job):
+        """A job from get() is done, let the jobs it held back go."""
+        supersedes = getattr(job, "supersedes", None)
+        with self.cond:
+            if supersedes is not None and self.holding.get(supersedes) is job:
+                del self.holding[supersedes]
+                self.cond.notify_all()
+
+    def clear(self):
+        """Take all the jobs out of the queue, held back or not."""
+        with self.cond:
+            jobs = [job for jobs in self.queues.values() for job in jobs]
+            self.queues.clear()
+            self.current.clear()
+            self.latest.clear()
+            self.cond.notify_all()
+            return jobs
+
+
+class WorkerPool(threads.WaltThread):
+    """Runs submitted jobs on a bounded thread or process pool.
+
+    A job is any object with a run() method, and optionally a stop()
+    method, a key, a weight and a deadline.  If it has a finished()
+    method, that's called with what run() returned, in this process even
+    when the job ran in a worker process.  Jobs with different keys
+    take turns in the FairQueue.  submit() blocks once max_queue jobs with
+    the same key are waiting, which pushes back on whoever is producing
+    the work instead of piling up threads.  Jobs still waiting after
+    their deadline (a time.time()) are dropped.
+
+    When the pool is stopped (WaltThreadList.stop_all) the jobs still in
+    the queue are either run to completion (drain=True) or thrown away,
+    in which case running jobs are asked to stop as well.  Jobs running
+    in worker processes can't be reached, so those run to the end, but
+    the ones that haven't started yet are cancelled.
+    """
+
+    def __init__(self, max_workers=4, max_queue=100, kind='thread',
+                 drain=False):
+        super().__init__("WorkerPool")
+        self.max_workers = max_workers
+        self.kind = kind
+        self.drain = drain
+        self.queue = FairQueue(maxsize=max_queue)
+        self.executor = self._executor()
+        self._slots = threading.BoundedSemaphore(max_workers)
+        self._running = {}
+        # Jobs from submit() until they're done or dropped, which also
+        # covers the ones between the queue and _running.
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        metrics.QUEUE_DEPTH.set_function(self.queue.qsize)
+        metrics.JOBS_RUNNING.set_function(lambda: len(self._running))
+
+    def _executor(self):
+        if self.kind == 'process':
+            return process_executor(self.max_workers)
+        return concurrent.futures.ThreadPoolExecutor(
+            max_workers=self.max_workers, thread_name_prefix="Worker")
+
+    def submit(self, job):
+        """Queue a job, waiting for room in the queue if it's full.
+
+        :returns: False if the pool was stopped before the job was queued.
+        """
+        with self._lock:
+            self._in_flight += 1
+        while not self.thread_stop:
+            try:
+                self.queue.put(job, timeout=1)
+                return True
+            except queue.Full:
+                LOG.debug("Worker queue is full, waiting")
+        self._forget()
+        return False
+
+    def _forget(self, count=1):
+        with self._lock:
+            self._in_flight -= count
+
+    def __len__(self):
+        """How many jobs are queued, running or finishing."""
+        with self._lock:
+            return self._in_flight
+
+    def stop(self):
+        """Stop starting jobs, and unless drain, stop the running ones.
+
+        stop() on a job that was sent to a worker process would only
+        stop our copy of it.  With processes, the futures that haven't
+        started are cancelled instead and the executor is shut down
+        without waiting, so no more jobs start in the workers.
+        """
+        super().stop()
+        if self.drain:
+            return
+        if self.kind == 'process':
+            with self._lock:
+                futures = list(self._running)
+            for future in futures:
+                future.cancel()
+            self.executor.shutdown(wait=False)
+            return
+        with self._lock:
+            for job in self._running.values():
+                if hasattr(job, "stop"):
+                    job.stop()
+
+    def loop(self):
+        if not self._slots.acquire(timeout=1):
+            return True
+
+        try:
+            job = self.queue.get(timeout=1)
+        except queue.Empty:
+            self._slots.release()
+            return True
+
+        if self._expired(job):
+            self.queue.done(job)
+            self._forget()
+            self._slots.release()
+            return True
+
+        self._start(job)
+        return True
+
+    def _expired(self, job):
+        deadline = getattr(job, "deadline", None)
+        if deadline and time.time() > deadline:
+            LOG.warning(f"Dropping {job}, it's past its deadline")
+            metrics.JOBS_DROPPED.inc(reason="deadline")
+            return True
+        return False
+
+    def _submit(self, job):
+        if self.kind == 'process':
+            return self.executor.submit(_run_in_process, job)
+        return self.executor.submit(job.run)
+
+    def _start(self, job):
+        with self._lock:
+            try:
+                future = self._submit(job)
+            except BrokenExecutor:
+                LOG.error("Worker pool is broken, restarting it")
+                self.executor = self._executor()
+                future = self._submit(job)
+            except RuntimeError:
+                # stop() shut the executor down on the job's way in
+                if not self.thread_stop:
+                    raise
+                future = None
+            else:
+                self._running[future] = job
+        if future is None:
+            self._forget()
+            self.queue.done(job)
+            self._slots.release()
+            return
+        future.add_done_callback(self._done)
+
+    def _done(self, future):
+        with self._lock:
+            job = self._running.get(future)
+        try:
+            self._finished(job, future)
+        finally:
+            # Only count the job as done once finished() is, so anyone
+            # waiting for the pool to be idle sees what it queued up.
+            with self._lock:
+                self._running.pop(future, None)
+                self._in_flight -= 1
+            self.queue.done(job)
+            self._slots.release()
+
+    def _finished(self, job, future):
+        if future.cancelled():
+            return
+        if future.exception():
+            LOG.error(f"Job {job} failed: {future.exception()}")
+            return
+
+        result = future.result()
+        if self.kind == 'process':
+            result, snapshot = result
+            metrics.REGISTRY.merge(snapshot)
+        if hasattr(job, "finished"):
+            try:
+                job.finished(result)
+            except Exception as ex:
+                LOG.exception(f"Job {job} failed to finish: {ex}")
+
+    def _pending(self):
+        # The jobs held back for a running one come out once it's done
+        while self.queue.qsize():
+            try:
+                yield self.queue.get(timeout=1)
+            except queue.Empty:
+                continue
+
+    def run(self):
+        super().run()
+        if self.drain:
+            LOG.info(f"Draining {self.queue.qsize()} queued jobs")
+            for job in self._pending():
+                self._slots.acquire()
+                self._start(job)
+        else:
+            dropped = len(self.queue.clear())
+            self._forget(dropped)
+            if dropped:
+                LOG.warning(f"Dropped {dropped} queued jobs")
+        self.executor.shutdown(wait=True)
+        LOG.info("WorkerPool: BYE")
@@ -0,0 +1,130 @@
+import collections
+import logging
+import os
+import threading
+import time
+
+from goesconvert import metrics, threads, utils
+
+
+LOG = logging.getLogger("goesconvert")
+
+
+class _Pending(object):
+    __slots__ = ("first_seen", "first_event_ns", "stat", "stable_since")
+
+    def __init__(self, now):
+        self.first_seen = now
+        self.first_event_ns = utils.time_ns()
+        self.stat = None
+        self.stable_since = now
+
+
+class WriteSettler(threads.WaltThread):
+    """Holds on to new files until they are completely written.
+
+    A file is done when it's closed after being written or moved into
+    place, which the inotify observer tells us about, or when its size and
+    mtime haven't changed for settle_time seconds, which is all we get
+    from the polling observer.  Then callback(path) is called with it.
+
+    Files that aren't done after timeout seconds are dropped and counted
+    in unfinished.
+    """
+
+    def __init__(self, callback, settle_time=2.0, timeout=300,
+                 interval=0.5):
+        super().__init__("WriteSettler")
+        self.callback = callback
+        self.settle_time = settle_time
+        self.timeout = timeout
+        self.interval = interval
+        self.unfinished = 0
+        self.pending = {}
+        # Files we already handed off, so late events don't repeat them.
+        self.finished = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        with self.lock:
+            return len(self.pending)
+
+    def _done(self, path, pending=None):
+        self.finished[path] = (pending.first_event_ns if pending
+                               else utils.time_ns())
+        if len(self.finished) > 10000:
+            self.finished.popitem(last=False)
+
+    def first_event(self, path):
+        """When the first event for a finished file came in, a time_ns()."""
+        with self.lock:
+            return self.finished.get(path)
+
+    def touch(self, path):
+        """The file was created or written to."""
+        with self.lock:
+            if path not in self.pending and path not in self.finished:
+                self.pending[path] = _Pending(time.monotonic())
+
+    def forget(self, path):
+        """The file went away, or was renamed."""
+        with self.lock:
+            self.pending.pop(path, None)
+
+    def closed(self, path):
+        """The file was closed after writing or moved into place."""
+        with self.lock:
+            pending = self.pending.pop(path, None)
+            if path in self.finished:
+                return
+            self._done(path, pending)
+        self._ready(path)
+
+    def _ready(self, path):
+        try:
+            self.callback(path)
+        except Exception as ex:
+            LOG.exception(f"Failed to hand off '{path}': {ex}")
+
+    def _check(self):
+        now = time.monotonic()
+        ready = []
+        with self.lock:
+            for path, pending in list(self.pending.items()):
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    del self.pending[path]
+                    continue
+
+                stat = (st.st_size, st.st_mtime_ns)
+                if stat != pending.stat:
+                    pending.stat = stat
+                    pending.stable_since = now
+                elif st.st_size and now - pending.stable_since >= self.settle_time:
+                    del self.pending[path]
+                    self._done(path, pending)
+                    ready.append(path)
+                    continue
+
+                if now - pending.first_seen > self.timeout:
+                    del self.pending[path]
+                    self.unfinished += 1
+                    metrics.UNFINISHED_FILES.inc()
+                    LOG.warning(f"'{path}' wasn't finished after "
+                                f"{self.timeout} seconds, skipping it. "
+                                f"({self.unfinished} unfinished so far)")
+
+        for path in ready:
+            self._ready(path)
+
+    def loop(self):
+        time.sleep(self.interval)
+        self._check()
+        return True
+
+    def run(self):
+        super().run()
+        if self.pending:
+            LOG.warning(f"Dropped {len(self.pending)} files still being written")
+        LOG.info("WriteSettler: BYE")
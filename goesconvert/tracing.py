@@ -0,0 +1,340 @@
+"""Per file traces of where the time between a new file and its outputs goes.
+
+Every new file gets a Trace, identified by the request id of its
+FileHandler.  Its spans make a tree:
+
+    file                  the source's mtime until the job is done
+      detect              mtime until the first watchdog event
+      settle              first event until the file was completely written
+      queue               waiting for a free worker
+      process             running the pipeline stages
+        <stage>           one per stage, ie. 'crop:ca,usa,va'
+          decode, overlay, encode, convert:<name>, ...
+
+Finished traces go to the exporters set up with configure(), a JSON
+lines file with one span per line and/or an OpenTelemetry collector
+(OTLP/HTTP with JSON).  Without any exporter, nothing is recorded.
+The exporters run in a thread of their own, so a slow or missing
+collector doesn't hold up the worker that finished the trace.
+"""
+
+import contextlib
+import functools
+import json
+import logging
+from multiprocessing import util as mp_util
+import os
+import queue
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+
+from goesconvert import utils
+
+
+LOG = logging.getLogger("goesconvert")
+
+SERVICE_NAME = "goesconvert"
+
+_local = threading.local()
+EXPORTERS = []
+
+# The finished traces on their way to the exporter thread.  Both are
+# made again after a fork, the thread doesn't make it across.
+_queue = None
+_thread = None
+_pid = None
+_thread_lock = threading.Lock()
+
+
+class Span(object):
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "start_ns",
+                 "end_ns", "attributes", "error")
+
+    def __init__(self, name, trace_id, parent_id=None, start_ns=None,
+                 end_ns=None, attributes=None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = "%016x" % random.getrandbits(64)
+        self.parent_id = parent_id
+        self.start_ns = utils.time_ns() if start_ns is None else start_ns
+        self.end_ns = end_ns
+        self.attributes = attributes or {}
+        self.error = None
+
+    @property
+    def seconds(self):
+        return ((self.end_ns or utils.time_ns()) - self.start_ns) / 1e9
+
+    def end(self, end_ns=None):
+        if self.end_ns is None:
+            self.end_ns = utils.time_ns() if end_ns is None else end_ns
+
+    def to_dict(self):
+        span = {
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'name': self.name,
+            'start_ns': self.start_ns,
+            'end_ns': self.end_ns,
+            'seconds': self.seconds,
+            'attributes': self.attributes,
+        }
+        if self.error:
+            span['error'] = self.error
+        return span
+
+
+class Trace(object):
+    """The spans of one new file."""
+
+    def __init__(self, request_id, source, start_ns=None, **attributes):
+        self.request_id = request_id
+        # A request id is a uuid, its hex is a valid W3C/OTLP trace id.
+        self.trace_id = request_id.replace("req-", "").replace("-", "")
+        self.source = source
+        self.spans = []
+        self._stack = []
+        attributes.update(request_id=request_id, source=source)
+        self.root = self.add_span("file", start_ns=start_ns, **attributes)
+
+    def __len__(self):
+        return len(self.spans)
+
+    def _parent(self):
+        return self._stack[-1] if self._stack else self.root
+
+    def add_span(self, name, start_ns=None, end_ns=None, **attributes):
+        """Record a span, a finished one when end_ns is given."""
+        parent = self._parent() if self.spans else None
+        span = Span(name, self.trace_id,
+                    parent_id=parent.span_id if parent else None,
+                    start_ns=start_ns, end_ns=end_ns, attributes=attributes)
+        if parent and span.start_ns < self.root.start_ns:
+            # ie. the detect span, which starts at the file's mtime
+            self.root.start_ns = span.start_ns
+        self.spans.append(span)
+        return span
+
+    @contextlib.contextmanager
+    def span(self, name, **attributes):
+        """A span for the block, with the spans started in it under it."""
+        span = self.add_span(name, **attributes)
+        self._stack.append(span)
+        try:
+            yield span
+        except Exception as ex:
+            span.error = str(ex) or type(ex).__name__
+            raise
+        finally:
+            self._stack.pop()
+            span.end()
+
+    def end(self):
+        self.root.end()
+
+
+def current():
+    """The trace of the file being worked on in this thread, if any."""
+    return getattr(_local, "trace", None)
+
+
+@contextlib.contextmanager
+def activate(trace):
+    """Make trace the current one in this thread for the block."""
+    previous = current()
+    _local.trace = trace
+    try:
+        yield trace
+    finally:
+        _local.trace = previous
+
+
+@contextlib.contextmanager
+def span(name, **attributes):
+    """A span in the current trace, nothing when there is none."""
+    trace = current()
+    if trace is None:
+        yield None
+        return
+    with trace.span(name, **attributes) as s:
+        yield s
+
+
+def traced(name):
+    """Decorator that runs the function in a span of the current trace."""
+    def decorator(f):
+        @functools.wraps(f)
+        def wrapper(*args, **kwargs):
+            if current() is None:
+                return f(*args, **kwargs)
+            with span(name):
+                return f(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class JsonLinesExporter(object):
+    """Appends the spans to a file, one JSON object per line.
+
+    Each trace goes out in a single O_APPEND write, so worker processes
+    can share the file without their lines getting mixed up.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def export(self, trace):
+        data = "".join(json.dumps(span.to_dict()) + "\n"
+                       for span in trace.spans).encode("utf-8")
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, data)
+        finally:
+            os.close(fd)
+
+
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+
+def _otlp_attributes(attributes):
+    return [{'key': key, 'value': _otlp_value(value)}
+            for key, value in attributes.items()]
+
+
+def otlp_payload(trace):
+    """The trace as an OTLP ExportTraceServiceRequest, in JSON."""
+    spans = []
+    for span in trace.spans:
+        otlp_span = {
+            'traceId': span.trace_id,
+            'spanId': span.span_id,
+            'name': span.name,
+            # SPAN_KIND_INTERNAL
+            'kind': 1,
+            'startTimeUnixNano': str(span.start_ns),
+            'endTimeUnixNano': str(span.end_ns or span.start_ns),
+            'attributes': _otlp_attributes(span.attributes),
+        }
+        if span.parent_id:
+            otlp_span['parentSpanId'] = span.parent_id
+        if span.error:
+            # STATUS_CODE_ERROR
+            otlp_span['status'] = {'code': 2, 'message': span.error}
+        spans.append(otlp_span)
+    return {
+        'resourceSpans': [{
+            'resource': {'attributes': _otlp_attributes(
+                {'service.name': SERVICE_NAME})},
+            'scopeSpans': [{
+                'scope': {'name': "goesconvert.tracing"},
+                'spans': spans,
+            }],
+        }],
+    }
+
+
+class OtlpExporter(object):
+    """POSTs the traces to an OpenTelemetry collector, ie.
+    http://127.0.0.1:4318/v1/traces
+
+    A collector that's down only costs the timeout, the trace is dropped.
+    """
+
+    def __init__(self, url, timeout=2.0):
+        self.url = url
+        self.timeout = timeout
+
+    def export(self, trace):
+        request = urllib.request.Request(
+            self.url, data=json.dumps(otlp_payload(trace)).encode("utf-8"),
+            headers={'Content-Type': "application/json"}, method="POST")
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout):
+                pass
+        except (OSError, urllib.error.URLError) as ex:
+            LOG.debug(f"Can't send the trace of '{trace.source}' to "
+                      f"'{self.url}': {ex}")
+
+
+def configure(spans_file=None, otlp_url=None):
+    """Set up where the finished traces go."""
+    del EXPORTERS[:]
+    if spans_file:
+        EXPORTERS.append(JsonLinesExporter(spans_file))
+    if otlp_url:
+        EXPORTERS.append(OtlpExporter(otlp_url))
+
+
+def enabled():
+    return bool(EXPORTERS)
+
+
+def start(request_id, source, start_ns=None, **attributes):
+    """A new Trace, or None when there is nowhere to export it."""
+    if not EXPORTERS:
+        return None
+    return Trace(request_id, source, start_ns=start_ns, **attributes)
+
+
+def _export(trace):
+    for exporter in list(EXPORTERS):
+        try:
+            exporter.export(trace)
+        except Exception as ex:
+            LOG.warning(f"Exporting the trace of '{trace.source}' "
+                        f"failed: {ex}")
+
+
+def _run(traces):
+    while True:
+        trace = traces.get()
+        try:
+            _export(trace)
+        finally:
+            traces.task_done()
+
+
+def _exporter_queue():
+    global _queue, _thread, _pid
+    with _thread_lock:
+        if _pid != os.getpid():
+            _queue = queue.Queue(maxsize=10000)
+            _thread = threading.Thread(target=_run, args=(_queue,),
+                                       name="TraceExporter", daemon=True)
+            _thread.start()
+            _pid = os.getpid()
+            # Also runs when a worker process exits, unlike atexit.
+            mp_util.Finalize(None, flush, exitpriority=10)
+        return _queue
+
+
+def export(trace):
+    """End the trace and queue it up for the exporters."""
+    if trace is None or not EXPORTERS:
+        return
+    trace.end()
+    try:
+        _exporter_queue().put_nowait(trace)
+    except queue.Full:
+        LOG.warning(f"Too many traces waiting to be exported, dropping "
+                    f"the one of '{trace.source}'")
+
+
+def flush(timeout=5):
+    """Wait up to timeout seconds for the queued traces to go out."""
+    if _queue is None or _pid != os.getpid():
+        return
+    deadline = time.monotonic() + timeout
+    while _queue.unfinished_tasks and time.monotonic() < deadline:
+        time.sleep(0.01)
@@ -23,12 +23,22 @@ def timeit(func):
         result = func(*args, **kwargs)
         end_time = time.perf_counter()
         total_time = end_time - start_time
-        # first item in the args, ie `args[0]` is `self`
-        LOG.debug(f'Function {func.__name__}{args} Took {total_time:.4f} seconds')
+        # Only repr the args when it's going to be logged
+        if LOG.isEnabledFor(logging.DEBUG):
+            # first item in the args, ie `args[0]` is `self`
+            LOG.debug("Function %s%s Took %.4f seconds", func.__name__,
+                      args, total_time)
         return result
     return timeit_wrapper
 
 
+def time_ns():
+    """time.time_ns(), Python 3.6 doesn't have it."""
+    if hasattr(time, "time_ns"):
+        return time.time_ns()
+    return int(time.time() * 1e9)
+
+
 def env(*vars, **kwargs):
     """This returns the first environment variable set.
     if none are non-empty, defaults to '' or keyword arg default
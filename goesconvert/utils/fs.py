@@ -0,0 +1,69 @@
+"""Putting copies of files in place as cheaply as the filesystem allows."""
+
+import fcntl
+import logging
+import os
+import shutil
+import threading
+
+
+LOG = logging.getLogger("goesconvert")
+
+# From linux/fs.h, _IOW(0x94, 9, int)
+FICLONE = 0x40049409
+
+COPY_MODES = ("auto", "reflink", "hardlink", "copy")
+
+
+def reflink(src, dst):
+    """Make dst a copy on write clone of src (btrfs, XFS, ...)."""
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+
+
+def _copy(src, dst, mode):
+    if mode == "reflink":
+        reflink(src, dst)
+    elif mode == "hardlink":
+        os.link(src, dst)
+    else:
+        shutil.copyfile(src, dst)
+
+
+def copy_file(src, dst, mode="auto"):
+    """Put a copy of src at dst.
+
+    :param mode: 'reflink' and 'hardlink' share the data of src instead
+                 of copying it, and fall back to a plain copy when the
+                 filesystem can't do that, ie. src and dst aren't on the
+                 same filesystem.  'auto' tries a reflink, then a hard
+                 link.  Nothing may change the file at dst in place
+                 after a hard link, it would change src too.
+    :returns: the mode that was used.
+    """
+    if mode not in COPY_MODES:
+        raise ValueError(f"Unknown copy mode '{mode}'")
+    modes = {
+        "auto": ("reflink", "hardlink", "copy"),
+        "reflink": ("reflink", "copy"),
+        "hardlink": ("hardlink", "copy"),
+        "copy": ("copy",),
+    }[mode]
+
+    # Put it in place under a temporary name, so nobody globbing the
+    # directory sees a half written file.
+    dirname, basename = os.path.split(dst)
+    tmp_file = os.path.join(
+        dirname, f".{basename}.{os.getpid()}.{threading.get_ident()}")
+    for used in modes:
+        try:
+            _copy(src, tmp_file, used)
+            break
+        except OSError as ex:
+            if os.path.exists(tmp_file):
+                os.unlink(tmp_file)
+            if used == "copy":
+                raise
+            LOG.debug(f"Can't {used} '{src}' to '{dst}': {ex}")
+    os.replace(tmp_file, dst)
+    return used
@@ -0,0 +1,146 @@
+"""Run external commands and keep track of what they cost."""
+
+import collections
+import functools
+import logging
+import os
+import resource
+import subprocess
+import tempfile
+import threading
+import time
+
+from goesconvert import metrics
+
+LOG = logging.getLogger("goesconvert")
+
+CommandResult = collections.namedtuple(
+    "CommandResult",
+    ["argv", "returncode", "stdout", "stderr", "wall", "cpu", "timed_out"])
+
+
+def _exitcode(status):
+    if os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status)
+    return os.WEXITSTATUS(status)
+
+
+class CommandError(Exception):
+    """A command failed or timed out."""
+
+    def __init__(self, result):
+        self.result = result
+        if result.timed_out:
+            msg = f"'{result.argv[0]}' timed out after {result.wall:.1f}s"
+        else:
+            msg = (f"'{result.argv[0]}' failed ({result.returncode}): "
+                   f"{result.stderr.strip()}")
+        super().__init__(msg)
+
+
+class CommandStats(object):
+    """Totals for every command that ran under the same name."""
+
+    __slots__ = ("count", "failures", "wall", "cpu")
+
+    def __init__(self):
+        self.count = 0
+        self.failures = 0
+        self.wall = 0.0
+        self.cpu = 0.0
+
+
+class CommandRunner(object):
+    """Runs an argv directly, without a shell in between.
+
+    Every command gets a timeout after which it's killed, and optionally
+    an address space limit.  The wall and CPU time of each command is
+    recorded in the stats shared by all runners, by command name.
+    """
+
+    stats = collections.defaultdict(CommandStats)
+    lock = threading.Lock()
+
+    def __init__(self, timeout=None, memory_limit=None):
+        self.timeout = timeout
+        self.memory_limit = memory_limit
+
+    def _preexec(self):
+        """Sets the limits in the child, before it runs the command.
+
+        preexec_fn isn't safe with threads around, when it runs Python
+        code in the child.  This is only setrlimit itself, which doesn't
+        need any locks.
+        """
+        if not self.memory_limit:
+            return None
+        limit = self.memory_limit
+        _, hard = resource.getrlimit(resource.RLIMIT_AS)
+        if hard != resource.RLIM_INFINITY:
+            # Can't go over it, setrlimit would fail in the child
+            limit = min(limit, hard)
+        return functools.partial(resource.setrlimit, resource.RLIMIT_AS,
+                                 (limit, limit))
+
+    def run(self, argv, name=None, check=True):
+        """Run argv and wait for it to finish.
+
+        :param name: what to record the stats under, defaults to argv[0].
+        :param check: raise CommandError if the command fails.
+        :returns: a CommandResult
+        """
+        name = name or os.path.basename(argv[0])
+        timed_out = threading.Event()
+        with tempfile.TemporaryFile() as out, tempfile.TemporaryFile() as err:
+            start = time.perf_counter()
+            proc = subprocess.Popen(argv, stdin=subprocess.DEVNULL,
+                                    stdout=out, stderr=err,
+                                    preexec_fn=self._preexec())
+
+            def _kill():
+                timed_out.set()
+                proc.kill()
+
+            timer = None
+            if self.timeout:
+                timer = threading.Timer(self.timeout, _kill)
+                timer.start()
+            try:
+                # wait4 instead of wait, for the rusage of just this child
+                _, status, rusage = os.wait4(proc.pid, 0)
+            finally:
+                if timer:
+                    timer.cancel()
+            proc.returncode = _exitcode(status)
+            wall = time.perf_counter() - start
+
+            out.seek(0)
+            err.seek(0)
+            result = CommandResult(
+                argv, proc.returncode,
+                out.read().decode("utf-8", errors="replace"),
+                err.read().decode("utf-8", errors="replace"),
+                wall, rusage.ru_utime + rusage.ru_stime, timed_out.is_set())
+
+        failed = result.returncode != 0 or result.timed_out
+        with self.lock:
+            stats = self.stats[name]
+            stats.count += 1
+            stats.wall += result.wall
+            stats.cpu += result.cpu
+            if failed:
+                stats.failures += 1
+        metrics.COMMAND_SECONDS.observe(result.wall, command=name)
+        if failed:
+            metrics.COMMAND_FAILURES.inc(command=name)
+
+        if LOG.isEnabledFor(logging.DEBUG):
+            LOG.debug("%s took %.4fs wall %.4fs cpu", name, result.wall,
+                      result.cpu)
+        if result.stdout:
+            LOG.debug("OUT = '%s'", result.stdout)
+        if result.stderr:
+            LOG.warning(f"ERR = '{result.stderr}'")
+        if failed and check:
+            raise CommandError(result)
+        return result
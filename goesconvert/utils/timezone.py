@@ -8,6 +8,10 @@ class Zone(tzinfo):
         self.isdst = isdst
         self.name = name
 
+    def __getinitargs__(self):
+        # so datetimes using this zone can be pickled
+        return (self.offset, self.isdst, self.name)
+
     def utcoffset(self, dt):
         return timedelta(hours=self.offset) + self.dst(dt)
 
@@ -0,0 +1,118 @@
+"""Tests for the incremental animated gif builder."""
+
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from PIL import Image
+
+from goesconvert.image import animation
+
+
+class TestGifAnimator(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.frames_dir = self.tmpdir.name
+        self.dest = os.path.join(self.frames_dir, "animate.gif")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _frame(self, minute, mode="RGB"):
+        color = (minute * 10, 100, 50) if mode == "RGB" else minute * 10
+        Image.new(mode, (64, 48), color).save(
+            os.path.join(self.frames_dir, f"12-{minute:02d}-00.png"))
+
+    def _frames(self):
+        with Image.open(self.dest) as im:
+            im.seek(im.n_frames - 1)
+            im.load()
+            return im.n_frames, im.info["duration"], im.convert("RGB").getpixel((0, 0))
+
+    def _manifest(self):
+        with open(os.path.join(self.frames_dir, animation.CACHE_DIR,
+                               "animate.gif.json")) as f:
+            return json.load(f)
+
+    def test_append(self):
+        for minute in range(3):
+            self._frame(minute)
+        animator = animation.GifAnimator(self.frames_dir, self.dest)
+        animator.update()
+        first = self._manifest()["frames"]
+        self.assertEqual((3, 150, (20, 100, 50)), self._frames())
+
+        self._frame(3, mode="L")
+        animator.update()
+        frames = self._manifest()["frames"]
+        # the existing frames stayed where they were
+        self.assertEqual(first, frames[:3])
+        self.assertEqual((4, 150, (30, 30, 30)), self._frames())
+
+    def test_torn_append(self):
+        for minute in range(3):
+            self._frame(minute)
+        animator = animation.GifAnimator(self.frames_dir, self.dest)
+        animator.update()
+        # an append that died after the first bytes of a frame
+        with open(self.dest, "r+b") as f:
+            f.seek(-1, os.SEEK_END)
+            f.write(b"\x21\xf9\x04")
+
+        self._frame(3)
+        animator.update()
+        self.assertEqual((4, 150, (30, 100, 50)), self._frames())
+        self.assertEqual(os.path.getsize(self.dest), self._manifest()["size"])
+
+    def test_window(self):
+        for minute in range(5):
+            self._frame(minute)
+        animator = animation.GifAnimator(self.frames_dir, self.dest,
+                                         max_frames=3)
+        animator.update()
+        self.assertEqual((3, 150, (40, 100, 50)), self._frames())
+
+        self._frame(5)
+        animator.update()
+        names = [frame[0] for frame in self._manifest()["frames"]]
+        self.assertEqual(["12-03-00.png", "12-04-00.png", "12-05-00.png"],
+                         names)
+        self.assertEqual((3, 150, (50, 100, 50)), self._frames())
+        cached = os.listdir(os.path.join(self.frames_dir, animation.CACHE_DIR))
+        self.assertNotIn("12-02-00.png.frame", cached)
+
+    def test_shared_blocks(self):
+        for minute in range(3):
+            self._frame(minute)
+        animator = animation.GifAnimator(self.frames_dir, self.dest)
+        animator.update()
+        latest = animation.GifAnimator(
+            self.frames_dir, os.path.join(self.frames_dir, "latest.gif"),
+            max_frames=1)
+        latest.update()
+        # still there for animate.gif
+        cached = os.listdir(os.path.join(self.frames_dir, animation.CACHE_DIR))
+        self.assertIn("12-00-00.png.frame", cached)
+
+        self._frame(3)
+        latest.update()
+        first = self._manifest()["frames"]
+        with mock.patch.object(animator, "_encode",
+                               wraps=animator._encode) as encode:
+            animator.update()
+        # latest.gif already encoded the new frame
+        encode.assert_not_called()
+        self.assertEqual(first, self._manifest()["frames"][:3])
+        self.assertEqual((4, 150, (30, 100, 50)), self._frames())
+
+    def test_span(self):
+        for minute in (0, 20, 40, 45):
+            self._frame(minute)
+        animation.GifAnimator(self.frames_dir, self.dest,
+                              max_span=30).update()
+        names = [frame[0] for frame in self._manifest()["frames"]]
+        self.assertEqual(["12-20-00.png", "12-40-00.png", "12-45-00.png"],
+                         names)
@@ -0,0 +1,80 @@
+"""Tests for the benchmark command."""
+
+import json
+import os
+import tempfile
+import unittest
+
+from click.testing import CliRunner
+from PIL import Image
+
+from goesconvert.cli import cli
+from goesconvert.cmds import benchmark
+from goesconvert.logging import log
+
+
+class TestBenchmark(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.watch_dir = os.path.join(self.tmpdir.name, "watch")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_synthetic_tree(self):
+        files = benchmark.synthetic_tree(self.watch_dir, ["fd", "m1"],
+                                         ["ch02", "ch13"], 2,
+                                         sizes={"fd": 64, "m1": 32})
+        self.assertEqual(8, len(files))
+        # in the order they come in, fd every 10 minutes, m1 every minute
+        self.assertEqual(os.path.join(self.watch_dir, "m1", "2022-08-01",
+                                      "ch02", "2022-08-01T-12-01-00Z.png"),
+                         files[4])
+        self.assertIn("T-12-10-00Z", files[-1])
+        with Image.open(files[0]) as im:
+            self.assertEqual((64, 64), im.size)
+            self.assertEqual("L", im.mode)
+            # black space in the corner
+            self.assertEqual(0, im.getpixel((0, 0)))
+
+        # the same images every time
+        again = benchmark.synthetic_image(32, "m1/ch02/0")
+        with Image.open(files[2]) as im:
+            self.assertEqual(again.tobytes(), im.tobytes())
+
+    def test_run(self):
+        files = benchmark.synthetic_tree(self.watch_dir, ["m1"], ["ch13"], 1,
+                                         sizes={"m1": 32})
+        satellite = {'satellite': 'goeseast', 'watch_dir': self.watch_dir,
+                     'process_dir': os.path.join(self.tmpdir.name, "out")}
+        results = []
+        job = benchmark.BenchmarkFile(files[0], satellite, results)
+        job.finished(job.run())
+        self.assertFalse(results[0]['failed'])
+        self.assertEqual(["copy:full", "animate:full"],
+                         [name for name, _ in results[0]['stages']])
+
+        stats = benchmark.report(results, 2.0, 1000, 500)
+        self.assertEqual(0.5, stats['files_per_second'])
+        self.assertEqual(1, stats['stage_seconds']['m1/copy:full']['count'])
+
+    def test_workdir(self):
+        notes = os.path.join(self.tmpdir.name, "notes.txt")
+        with open(notes, "w") as fp:
+            fp.write("mine")
+        self.addCleanup(log.stop_logging)
+        result = CliRunner(mix_stderr=False).invoke(cli, [
+            "benchmark", "--models", "m1", "--frames", "1",
+            "--workdir", self.tmpdir.name])
+        self.assertEqual(0, result.exit_code, result.stderr)
+        # Only the results on stdout
+        self.assertEqual(1, json.loads(result.stdout)['files'])
+        # and only what it made is gone
+        self.assertEqual(["notes.txt"], os.listdir(self.tmpdir.name))
+
+    def test_percentiles(self):
+        stats = benchmark.percentiles(range(1, 101))
+        self.assertEqual((51, 91, 100), (stats['p50'], stats['p90'],
+                                         stats['max']))
+        self.assertEqual({}, benchmark.percentiles([]))
@@ -0,0 +1,41 @@
+"""Tests for coalescing animation rebuilds."""
+
+import time
+import unittest
+
+from goesconvert.threads import debounce
+
+
+class TestDebouncer(unittest.TestCase):
+
+    def setUp(self):
+        self.calls = []
+        self.debouncer = debounce.Debouncer(
+            lambda key, values: self.calls.append((key, values)), 0.1)
+
+    def tearDown(self):
+        self.debouncer.stop()
+        if self.debouncer.is_alive():
+            self.debouncer.join()
+
+    def test_coalesce(self):
+        self.debouncer.start()
+        for n in range(5):
+            self.debouncer.request("va/animate.gif", n)
+        self.debouncer.request("ca/animate.gif", 0)
+        time.sleep(0.3)
+        self.assertEqual([("va/animate.gif", [0, 1, 2, 3, 4]),
+                          ("ca/animate.gif", [0])], self.calls)
+
+        # a new interval starts after the rebuild
+        self.debouncer.request("va/animate.gif", 5)
+        self.assertEqual(2, len(self.calls))
+        time.sleep(0.3)
+        self.assertEqual(("va/animate.gif", [5]), self.calls[-1])
+
+    def test_flush(self):
+        self.debouncer.request("va/animate.gif", 0)
+        self.debouncer.request("va/animate.gif", 1)
+        self.debouncer.flush()
+        self.assertEqual([("va/animate.gif", [0, 1])], self.calls)
+        self.assertEqual(0, len(self.debouncer))
@@ -0,0 +1,54 @@
+"""Tests for the file copy modes."""
+
+import errno
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from goesconvert.utils import fs
+
+
+class TestCopyFile(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.src = os.path.join(self.tmpdir.name, "src.png")
+        with open(self.src, "wb") as fp:
+            fp.write(b"not really a png")
+        self.dst = os.path.join(self.tmpdir.name, "dst.png")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _content(self):
+        with open(self.dst, "rb") as fp:
+            return fp.read()
+
+    def test_copy(self):
+        self.assertEqual("copy", fs.copy_file(self.src, self.dst, "copy"))
+        self.assertFalse(os.path.samefile(self.src, self.dst))
+        self.assertEqual(b"not really a png", self._content())
+
+    def test_hardlink(self):
+        self.assertEqual("hardlink",
+                         fs.copy_file(self.src, self.dst, "hardlink"))
+        self.assertTrue(os.path.samefile(self.src, self.dst))
+
+    def test_fallbacks(self):
+        unsupported = OSError(errno.EOPNOTSUPP, "not supported")
+        with mock.patch.object(fs, "reflink", side_effect=unsupported):
+            self.assertEqual("hardlink", fs.copy_file(self.src, self.dst))
+        os.unlink(self.dst)
+        cross_device = OSError(errno.EXDEV, "cross-device link")
+        with mock.patch.object(fs.os, "link", side_effect=cross_device):
+            self.assertEqual("copy",
+                             fs.copy_file(self.src, self.dst, "hardlink"))
+        self.assertEqual(b"not really a png", self._content())
+        # nothing left behind by the attempts
+        self.assertEqual(["dst.png", "src.png"],
+                         sorted(os.listdir(self.tmpdir.name)))
+
+    def test_unknown_mode(self):
+        self.assertRaises(ValueError, fs.copy_file, self.src, self.dst,
+                          "symlink")
@@ -0,0 +1,67 @@
+"""Tests for the image backends."""
+
+import os
+import tempfile
+import unittest
+
+from PIL import Image
+
+from goesconvert import image
+from goesconvert.image import base
+
+
+class TestPillowBackend(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.source = os.path.join(self.tmpdir.name, "source.png")
+        Image.new("L", (400, 300), 128).save(self.source)
+        self.backend = image.get_backend("pillow", self.source,
+                                         font_path="/nonexistent.ttf")
+
+    def tearDown(self):
+        self.backend.close()
+        self.tmpdir.cleanup()
+
+    def test_parse_geometry(self):
+        self.assertEqual((600, 600, 1624, 1368),
+                         base.parse_geometry("1024x768+600+600"))
+        self.assertRaises(ValueError, base.parse_geometry, "1024x768")
+
+    def test_unknown_backend(self):
+        self.assertRaises(ValueError, image.get_backend, "gimp",
+                          self.source, font_path=None)
+
+    def test_crop_decodes_once(self):
+        dest = os.path.join(self.tmpdir.name, "crop.png")
+        self.backend.crop("100x50+10+20", dest,
+                          label=image.Label("now", 12))
+        raster = self.backend.raster
+        self.backend.crop("100x50+350+280", dest)
+        self.assertIs(raster, self.backend.raster)
+        with Image.open(dest) as im:
+            # clipped to the source just like ImageMagick does
+            self.assertEqual((50, 20), im.size)
+
+    def test_copy_scaled(self):
+        dest = os.path.join(self.tmpdir.name, "small.png")
+        self.backend.copy(dest, scale=25)
+        with Image.open(dest) as im:
+            self.assertEqual((100, 75), im.size)
+
+    def test_copy_plain(self):
+        dest = os.path.join(self.tmpdir.name, "copy.png")
+        self.backend.copy(dest)
+        self.assertIsNone(self.backend._raster)
+        with open(self.source, "rb") as src, open(dest, "rb") as dst:
+            self.assertEqual(src.read(), dst.read())
+
+    def test_resize_filter(self):
+        self.assertRaises(ValueError, image.get_backend, "pillow",
+                          self.source, font_path=None, resize_filter="sinc")
+        backend = image.get_backend("pillow", self.source, font_path=None,
+                                    resize_filter="box")
+        dest = os.path.join(self.tmpdir.name, "small.png")
+        backend.copy(dest, scale=10)
+        with Image.open(dest) as im:
+            self.assertEqual((40, 30), im.size)
@@ -0,0 +1,56 @@
+"""Tests for the processing ledger."""
+
+import os
+import pickle
+import tempfile
+import unittest
+
+from goesconvert import ledger
+
+
+class TestLedger(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.source = os.path.join(self.tmpdir.name, "source.png")
+        with open(self.source, "wb") as f:
+            f.write(b"1234")
+        self.ledger = ledger.Ledger(os.path.join(self.tmpdir.name,
+                                                 "db", "ledger.sqlite"))
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_record(self):
+        stat = os.stat(self.source)
+        self.assertEqual(set(), self.ledger.done(self.source, stat))
+        self.ledger.record(self.source, stat, "copy")
+        self.ledger.record(self.source, stat, "copy")
+        self.assertEqual({"copy"}, self.ledger.done(self.source, stat))
+
+        # a rewritten source starts over
+        with open(self.source, "ab") as f:
+            f.write(b"5678")
+        self.assertEqual(set(), self.ledger.done(self.source,
+                                                 os.stat(self.source)))
+
+    def test_finished(self):
+        stat = os.stat(self.source)
+        self.ledger.record(self.source, stat, "copy")
+        self.assertEqual({}, self.ledger.finished(["copy", "animate"]))
+        self.ledger.record(self.source, stat, "animate")
+        self.assertEqual(
+            {self.source: (stat.st_mtime_ns, stat.st_size)},
+            self.ledger.finished(["copy", "animate"]))
+        self.assertEqual(
+            [self.source],
+            list(self.ledger.finished(["copy"], directory=self.tmpdir.name)))
+        self.assertEqual(
+            {}, self.ledger.finished(["copy"],
+                                     directory=self.tmpdir.name + "/db"))
+
+    def test_pickle(self):
+        stat = os.stat(self.source)
+        self.ledger.record(self.source, stat, "copy")
+        copy = pickle.loads(pickle.dumps(self.ledger))
+        self.assertEqual({"copy"}, copy.done(self.source, stat))
@@ -0,0 +1,89 @@
+"""Tests for the queued logging."""
+
+import logging
+import os
+import tempfile
+import threading
+import unittest
+
+from oslo_config import cfg
+
+from goesconvert import utils
+from goesconvert.logging import log
+
+
+CONF = cfg.CONF
+LOG = logging.getLogger("goesconvert")
+
+
+class TestQueuedLogging(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.log_file = os.path.join(self.tmpdir.name, "goesconvert.log")
+        self.handlers = list(LOG.handlers)
+        self.level = LOG.level
+        CONF.set_override("logfile", self.log_file, group="logging")
+        CONF.set_override("logformat", "%(threadName)s %(message)s",
+                          group="logging")
+
+    def tearDown(self):
+        log.stop_logging()
+        for handler in list(LOG.handlers):
+            if handler not in self.handlers:
+                LOG.removeHandler(handler)
+                handler.close()
+        LOG.setLevel(self.level)
+        CONF.clear_override("logfile", group="logging")
+        CONF.clear_override("logformat", group="logging")
+        self.tmpdir.cleanup()
+
+    def _read(self):
+        with open(self.log_file) as fp:
+            return fp.read()
+
+    def test_handlers_run_in_the_listener(self):
+        log.setup_logging("INFO", quiet=True)
+        self.assertIsNotNone(log.listener)
+        # Only the queue is on the logger, the file is the listener's
+        new = [h for h in LOG.handlers if h not in self.handlers]
+        self.assertEqual([log.LazyQueueHandler], [type(h) for h in new])
+        self.assertEqual(self.log_file,
+                         log.listener.handlers[0].baseFilename)
+        args = ["first"]
+        LOG.info("Processed %s", args)
+        # The message is put together before it's queued
+        args.append("second")
+        log.stop_logging()
+
+        # The thread that logged it, not the listener's
+        self.assertEqual(
+            f"{threading.current_thread().name} Processed ['first']\n",
+            self._read())
+
+    def test_worker_logging(self):
+        log.setup_logging("INFO", quiet=True)
+        log.setup_worker_logging()
+        self.assertIsNone(log.listener)
+        LOG.info("from a worker")
+        self.assertIn(f"{threading.current_thread().name} from a worker",
+                      self._read())
+
+    def test_timeit_is_lazy(self):
+        reprs = []
+
+        class Arg(object):
+            def __repr__(self):
+                reprs.append(1)
+                return "Arg"
+
+        @utils.timeit
+        def work(arg):
+            return arg
+
+        log.setup_logging("INFO", quiet=True)
+        work(Arg())
+        self.assertEqual([], reprs)
+        LOG.setLevel(logging.DEBUG)
+        work(Arg())
+        self.assertEqual([1], reprs)
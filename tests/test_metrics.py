@@ -0,0 +1,59 @@
+"""Tests for the metrics registry and endpoint."""
+
+import unittest
+import urllib.request
+
+from goesconvert import metrics
+
+
+class TestMetrics(unittest.TestCase):
+
+    def setUp(self):
+        self.registry = metrics.Registry()
+        self.hist = metrics.Histogram("test_seconds", "Test histogram.",
+                                      labels=("stage",), buckets=(1, 5))
+        self.counter = metrics.Counter("test_total", "Test counter.")
+
+    def test_render(self):
+        self.hist.observe(0.5, stage="crop")
+        self.hist.observe(3, stage="crop")
+        self.hist.observe(10, stage="crop")
+        self.counter.inc(2)
+        self.assertEqual([
+            'test_seconds_bucket{stage="crop",le="1"} 1',
+            'test_seconds_bucket{stage="crop",le="5"} 2',
+            'test_seconds_bucket{stage="crop",le="+Inf"} 3',
+            'test_seconds_sum{stage="crop"} 13.5',
+            'test_seconds_count{stage="crop"} 3',
+        ], self.hist.render())
+        self.assertEqual(["test_total 2"], self.counter.render())
+        with self.assertRaises(ValueError):
+            self.hist.observe(1, region="va")
+
+    def test_merge(self):
+        self.hist.observe(0.5, stage="crop")
+        snapshot = self.hist.snapshot()
+        self.hist.merge(snapshot)
+        self.assertEqual(2, self.hist.count(stage="crop"))
+
+        self.counter.inc()
+        self.counter.merge(self.counter.snapshot())
+        self.assertEqual(2, self.counter.get())
+
+    def test_server(self):
+        metrics.STAGE_FAILURES.inc(model="fd", stage="crop")
+        server = metrics.MetricsServer(port=0)
+        server.start()
+        try:
+            url = f"http://127.0.0.1:{server.server.server_port}"
+            with urllib.request.urlopen(f"{url}/metrics") as resp:
+                body = resp.read().decode("utf-8")
+            self.assertIn("# TYPE goesconvert_stage_failures_total counter",
+                          body)
+            self.assertIn('goesconvert_stage_failures_total{model="fd",'
+                          'stage="crop"}', body)
+            with urllib.request.urlopen(f"{url}/health") as resp:
+                self.assertEqual(200, resp.status)
+        finally:
+            server.stop()
+            server.join()
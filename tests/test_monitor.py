@@ -0,0 +1,376 @@
+"""Tests for the file handling of the monitor."""
+
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from oslo_config import cfg
+from PIL import Image
+from watchdog import events
+
+from goesconvert import ledger, threads
+from goesconvert.cmds import benchmark, monitor
+from goesconvert.threads import pool
+
+
+CONF = cfg.CONF
+
+
+class RecordingImage(object):
+    """An image backend that only records what it was asked to do."""
+
+    def __init__(self):
+        self.calls = []
+
+    def crop_regions(self, crops):
+        self.calls.append(("crop_regions", crops))
+
+    def copy(self, dest_file, scale=None, label=None):
+        self.calls.append(("copy", dest_file))
+
+    def close(self):
+        pass
+
+
+class FakeWorkers(object):
+    """Takes the jobs a WorkerPool would get."""
+
+    def __init__(self):
+        self.jobs = []
+
+    def submit(self, job):
+        self.jobs.append(job)
+        return True
+
+
+class MonitorTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.watch_dir = os.path.join(self.tmpdir.name, "watch")
+        self.satellite = dict(CONF['monitor'].items())
+        self.satellite.update(
+            satellite='goeseast', watch_dir=self.watch_dir,
+            process_dir=os.path.join(self.tmpdir.name, "process"))
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def tree(self, models=("m1",), frames=1):
+        return benchmark.synthetic_tree(self.watch_dir, models, ["ch13"],
+                                        frames, sizes={"fd": 64, "m1": 32})
+
+    def source(self, model, when):
+        """A goestools file of model at when, ie. '2022-08-01T-23-59-00Z'."""
+        dirname = os.path.join(self.watch_dir, model, when[:10], "ch13")
+        os.makedirs(dirname, exist_ok=True)
+        path = os.path.join(dirname, f"{when}.png")
+        Image.new("L", (32, 32), 128).save(path)
+        return path
+
+
+class TestFileHandler(MonitorTestCase):
+
+    def test_crop_regions_unlabeled(self):
+        fh = monitor.FileHandler(self.tree(["fd"])[0], self.satellite)
+        fh.image = RecordingImage()
+        fh.crop_regions(("va", "ca"), unlabeled=("va",))
+        (_, crops), = fh.image.calls
+        labels = [label for _, _, label, _ in crops]
+        self.assertIsNone(labels[0])
+        self.assertIn("2022", labels[1].text)
+
+    def test_process_skips_after_a_failure(self):
+        fh = monitor.FileHandler(self.tree(["fd"])[0], self.satellite)
+        recorded = []
+        with mock.patch.object(monitor.FileHandler, "crop_regions",
+                               side_effect=OSError("disk full")), \
+                mock.patch.object(monitor.FileHandler, "copy"), \
+                mock.patch.object(monitor.FileHandler, "animate") as animate:
+            skipped, failed = fh.process(record=recorded.append)
+        self.assertTrue(failed)
+        self.assertEqual([], skipped)
+        # Only the full disk animation doesn't need the crops
+        self.assertEqual(["copy:fd", "animate:fd"],
+                         [stage.name for stage in recorded])
+        animate.assert_called_once_with(subdest="animate", name="earth.gif")
+
+
+class TestSupersede(MonitorTestCase):
+
+    def tearDown(self):
+        CONF.clear_override('model_deadlines', group='monitor')
+        super().tearDown()
+
+    def job(self, when):
+        return monitor.ProcessSatelliteFile(self.source("m1", when),
+                                            self.satellite)
+
+    def test_same_animations(self):
+        older = self.job("2022-08-01T-12-00-00Z")
+        newer = self.job("2022-08-01T-12-01-00Z")
+        self.assertIsNotNone(older.supersedes)
+        self.assertEqual(older.supersedes, newer.supersedes)
+
+    def test_next_day(self):
+        older = self.job("2022-08-01T-23-59-00Z")
+        newer = self.job("2022-08-02T-00-01-00Z")
+        self.assertNotEqual(older.supersedes, newer.supersedes)
+
+    def test_not_with_a_deadline(self):
+        CONF.set_override('model_deadlines', {'m1': '60'}, group='monitor')
+        self.assertIsNone(self.job("2022-08-01T-12-00-00Z").supersedes)
+
+    def test_slow_older_frame(self):
+        older = self.job("2022-08-01T-12-00-00Z")
+        newer = self.job("2022-08-01T-12-01-00Z")
+        frames_dir = os.path.dirname(newer.fh.animation_file())
+        animated = []
+        copy = monitor.FileHandler.copy
+
+        def slow_copy(fh, **kwargs):
+            if fh.source == older.new_file:
+                time.sleep(0.2)
+            copy(fh, **kwargs)
+
+        def animate(fh, **kwargs):
+            animated.append((fh.source, sorted(
+                name for name in os.listdir(frames_dir)
+                if name.endswith(".png"))))
+
+        workers = pool.WorkerPool(max_workers=2, max_queue=0)
+        with mock.patch.object(monitor.FileHandler, "copy", slow_copy), \
+                mock.patch.object(monitor.FileHandler, "animate", animate):
+            workers.submit(older)
+            workers.submit(newer)
+            workers.start()
+            while len(workers):
+                time.sleep(0.01)
+        workers.stop()
+        workers.join(5)
+
+        self.assertTrue(older.superseded)
+        # The newer file waited for the frame of the older one
+        self.assertEqual([(newer.new_file, ["12-00-00.png", "12-01-00.png"])],
+                         animated)
+
+
+class TestDeferredAnimations(MonitorTestCase):
+
+    def test_finished(self):
+        workers = FakeWorkers()
+        animator = monitor.animation_debouncer(self.satellite, workers)
+        self.addCleanup(threads.WaltThreadList().remove, animator)
+        new_files = self.tree(["fd"], frames=2)
+        for new_file in reversed(new_files):
+            job = monitor.ProcessSatelliteFile(new_file, self.satellite,
+                                               animator=animator)
+            animations = [stage for stage in job.fh.stages
+                          if stage.method == "animate"]
+            job.finished(animations)
+        # One rebuild of every animation, for both files
+        self.assertEqual(len(animations), len(animator))
+        self.assertEqual([], workers.jobs)
+        animator.flush()
+        self.assertEqual(sorted(stage.name for stage in animations),
+                         sorted(job.stage.name for job in workers.jobs))
+        for job in workers.jobs:
+            self.assertIsInstance(job, monitor.AnimateFiles)
+            self.assertEqual(new_files, job.new_files)
+            # The newest file names the frames directory
+            self.assertEqual(new_files[-1], job.fh.source)
+
+    def test_rebuild_records_every_file(self):
+        new_files = self.tree(["fd"], frames=2)
+        stages = ledger.Ledger(os.path.join(self.tmpdir.name, "ledger.db"))
+        stage = monitor.FileHandler(new_files[0], self.satellite).stages[-1]
+        job = monitor.AnimateFiles(new_files, self.satellite, stage,
+                                   ledger=stages)
+        with mock.patch.object(monitor.FileHandler, "animate") as animate:
+            job.run()
+        animate.assert_called_once_with(**stage.kwargs)
+        for new_file in new_files:
+            self.assertEqual({stage.name},
+                             stages.done(new_file, os.stat(new_file)))
+
+
+class TestBackfill(MonitorTestCase):
+
+    def backfill(self, **kwargs):
+        workers = FakeWorkers()
+        backfill = monitor.Backfill(self.satellite, workers, **kwargs)
+        self.addCleanup(threads.WaltThreadList().remove, backfill)
+        self.assertFalse(backfill.loop())
+        return backfill, [job.new_file for job in workers.jobs]
+
+    def test_outputs(self):
+        done, todo = self.tree(frames=2)
+        # Without a ledger, a file is done when all its outputs are there
+        for output in monitor.FileHandler(done, self.satellite).outputs():
+            os.makedirs(os.path.dirname(output), exist_ok=True)
+            open(output, "w").close()
+        backfill, queued = self.backfill()
+        self.assertEqual([todo], queued)
+        self.assertEqual((1, 1), (backfill.queued, backfill.skipped))
+
+    def test_ledger(self):
+        done, todo = self.tree(frames=2)
+        stages = ledger.Ledger(os.path.join(self.tmpdir.name, "ledger.db"))
+        stat = os.stat(done)
+        for stage in monitor.FileHandler(done, self.satellite).stages:
+            stages.record(done, stat, stage.name)
+        backfill, queued = self.backfill(ledger=stages)
+        self.assertEqual([todo], queued)
+        self.assertEqual((1, 1), (backfill.queued, backfill.skipped))
+
+        # A new version of the file isn't done
+        os.utime(done, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+        _, queued = self.backfill(ledger=stages)
+        self.assertEqual([done, todo], queued)
+
+
+class TestSatelliteHandler(MonitorTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.handler = monitor.SatelliteHandler(self.satellite, FakeWorkers(),
+                                                latency=mock.Mock())
+        threads.WaltThreadList().remove(self.handler.settler)
+        self.handler.settler = mock.Mock()
+        self.png = os.path.join(self.watch_dir, "a.png")
+
+    def test_create_and_close(self):
+        self.handler.handle_event(events.FileCreatedEvent(self.png))
+        self.handler.handle_event(events.FileModifiedEvent(self.png))
+        self.handler.handle_event(events.FileClosedEvent(self.png))
+        self.handler.latency.record.assert_called_once_with(self.png)
+        self.assertEqual([mock.call.touch(self.png),
+                          mock.call.touch(self.png),
+                          mock.call.closed(self.png)],
+                         self.handler.settler.mock_calls)
+
+    def test_moved_into_place(self):
+        tmp = os.path.join(self.watch_dir, ".a.png.part")
+        self.handler.handle_event(events.FileMovedEvent(tmp, self.png))
+        self.handler.latency.record.assert_called_once_with(self.png)
+        self.assertEqual([mock.call.forget(tmp), mock.call.closed(self.png)],
+                         self.handler.settler.mock_calls)
+
+    def test_deleted(self):
+        self.handler.handle_event(events.FileDeletedEvent(self.png))
+        self.assertEqual([mock.call.forget(self.png)],
+                         self.handler.settler.mock_calls)
+
+    def test_ignored(self):
+        for event in (events.DirCreatedEvent(self.watch_dir),
+                      events.FileCreatedEvent(self.png + ".txt"),
+                      events.FileClosedEvent(self.png[:-4])):
+            self.handler.handle_event(event)
+        self.assertEqual([], self.handler.settler.mock_calls)
+        self.assertEqual([], self.handler.latency.mock_calls)
+
+
+class FakeObserver(object):
+    """A watchdog observer that remembers what it was asked to do."""
+
+    error = None
+
+    def __init__(self, timeout=None):
+        self.handlers = []
+        self.started = False
+        self.stopped = False
+
+    def schedule(self, handler, path, recursive=False):
+        self.handlers.append(handler)
+
+    def unschedule_all(self):
+        self.handlers = []
+
+    def start(self):
+        if self.error:
+            raise self.error
+        self.started = True
+
+    def stop(self):
+        self.stopped = True
+
+    def join(self):
+        pass
+
+
+class FakeNative(FakeObserver):
+    pass
+
+
+class FakePolling(FakeObserver):
+    pass
+
+
+class TestWatcher(MonitorTestCase):
+
+    def setUp(self):
+        super().setUp()
+        os.makedirs(self.watch_dir)
+        for name, fake in (("Observer", FakeNative),
+                           ("PollingObserver", FakePolling)):
+            patcher = mock.patch.object(monitor, name, fake)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        CONF.clear_override('observer', group='monitor')
+        FakeNative.error = None
+        super().tearDown()
+
+    def watch(self):
+        watcher = monitor.Watcher(self.satellite, workers=None)
+        self.addCleanup(threads.WaltThreadList().remove, watcher)
+        # Only start and stop the observer, don't wait for events
+        watcher.stop()
+        self.assertFalse(watcher.loop())
+        observer = watcher.observer
+        self.assertTrue(observer.started)
+        self.assertTrue(observer.stopped)
+        handler, = observer.handlers
+        return observer, handler.handler.latency
+
+    def test_native(self):
+        CONF.set_override('observer', 'native', group='monitor')
+        observer, latency = self.watch()
+        self.assertIsInstance(observer, FakeNative)
+        self.assertEqual("FakeNative", latency.observer_name)
+
+    def test_polling(self):
+        CONF.set_override('observer', 'polling', group='monitor')
+        observer, latency = self.watch()
+        self.assertIsInstance(observer, FakePolling)
+        self.assertEqual("FakePolling", latency.observer_name)
+
+    def test_fall_back_to_polling(self):
+        CONF.set_override('observer', 'native', group='monitor')
+        FakeNative.error = OSError(28, "inotify watch limit reached")
+        with self.assertLogs("goesconvert", "WARNING") as logs:
+            observer, latency = self.watch()
+        self.assertIsInstance(observer, FakePolling)
+        self.assertEqual("FakePolling", latency.observer_name)
+        self.assertIn("falling back to polling", logs.output[0])
+
+
+class TestEventLatency(MonitorTestCase):
+
+    def test_report(self):
+        path = self.source("m1", "2022-08-01T-12-00-00Z")
+        mtime = time.time() - 5
+        os.utime(path, (mtime, mtime))
+        latency = monitor.EventLatency("FakeNative")
+        latency.record(path)
+        latency.record(path + ".gone")
+        self.assertEqual(1, len(latency.samples))
+        self.assertGreaterEqual(latency.samples[0], 5)
+
+        with self.assertLogs("goesconvert", "INFO") as logs:
+            latency.report()
+        self.assertIn("FakeNative event latency over 1 events", logs.output[0])
+        self.assertEqual(0, len(latency.samples))
@@ -0,0 +1,39 @@
+"""Tests for the cached overlay layers."""
+
+import unittest
+
+from PIL import Image
+
+from goesconvert.image import base, overlay
+
+
+class TestOverlay(unittest.TestCase):
+
+    def setUp(self):
+        overlay.static_layer.cache_clear()
+        overlay.glyph_run.cache_clear()
+
+    def test_layers_are_cached(self):
+        label = base.Label("Monday Aug  1, 2022  07:00:00  EST", 12)
+        for _ in range(3):
+            im = Image.new("RGB", (400, 300), (0, 0, 255))
+            overlay.annotate(im, label, "/nonexistent.ttf")
+        self.assertEqual(1, overlay.static_layer.cache_info().misses)
+        self.assertEqual(2, overlay.static_layer.cache_info().hits)
+        # Monday, Aug, 1, 2022, 07:00:00, EST
+        self.assertEqual(6, overlay.glyph_run.cache_info().currsize)
+
+    def test_annotate_draws_in_place(self):
+        im = Image.new("L", (400, 1900), 128)
+        overlay.annotate(im, base.Label("now", 12), "/nonexistent.ttf")
+        self.assertEqual((400, 1900), im.size)
+        self.assertEqual("L", im.mode)
+        # the shaded box, and white text in it
+        self.assertLess(im.getpixel((1, 1830)), 128)
+        self.assertEqual(128, im.getpixel((1, 1810)))
+        self.assertEqual(255, im.getextrema()[1])
+
+    def test_tiny_image(self):
+        im = Image.new("RGBA", (1, 1), (0, 0, 0, 255))
+        overlay.annotate(im, base.Label("now", 12), "/nonexistent.ttf")
+        self.assertEqual((1, 1), im.size)
@@ -0,0 +1,106 @@
+"""Tests for the product pipeline."""
+
+import os
+import unittest
+
+from goesconvert import pipeline
+
+
+EXAMPLE = os.path.join(os.path.dirname(__file__), "..", "etc",
+                       "goesconvert", "pipeline.yaml")
+
+
+class TestPipeline(unittest.TestCase):
+
+    def test_example_is_default(self):
+        self.assertEqual(pipeline.DEFAULT_PIPELINE,
+                         pipeline.Pipeline.load(EXAMPLE).config)
+
+    def test_default_stages(self):
+        stages = pipeline.Pipeline.load().stages("fd", "ch13")
+        self.assertEqual(["crop:ca,usa,va", "copy:fd", "animate:va",
+                          "animate:ca", "animate:usa", "animate:fd"],
+                         [stage.name for stage in stages])
+        self.assertEqual({'regions': ('va', 'ca', 'usa'), 'unlabeled': ()},
+                         stages[0].kwargs)
+        self.assertEqual(("crop:ca,usa,va",), stages[2].after)
+        self.assertEqual({'subdest': 'animate', 'overlay': False,
+                          'scale': 25}, stages[1].kwargs)
+        self.assertEqual(("copy:fd",), stages[-1].after)
+        self.assertEqual({'subdest': 'animate', 'name': 'earth.gif'},
+                         stages[-1].kwargs)
+
+    def test_channels(self):
+        pipe = pipeline.Pipeline({
+            'fd': {
+                'va': {'crop': 'va', 'channels': ['ch13']},
+                'thumb': {'copy': 'thumb', 'scale': 10},
+            },
+        })
+        self.assertEqual(["crop:va", "copy:thumb"],
+                         [s.name for s in pipe.stages("fd", "ch13")])
+        self.assertEqual(["copy:thumb"],
+                         [s.name for s in pipe.stages("fd", "ch02")])
+        self.assertEqual([], pipe.stages("m1", "ch13"))
+
+    def test_crop_label(self):
+        pipe = pipeline.Pipeline({
+            'fd': {
+                'va': {'crop': 'va', 'label': False, 'animate': 'a.gif'},
+                'ca': {'crop': 'ca'},
+            },
+        })
+        crop, animate = pipe.stages("fd", "ch13")
+        self.assertEqual({'regions': ('va', 'ca'), 'unlabeled': ('va',)},
+                         crop.kwargs)
+        self.assertEqual((crop.name,), animate.after)
+
+    def test_new_region_is_a_new_stage(self):
+        before = pipeline.Pipeline({'fd': {'va': {'crop': 'va'}}})
+        after = pipeline.Pipeline({'fd': {'va': {'crop': 'va'},
+                                          'ca': {'crop': 'ca'}}})
+        self.assertNotEqual(before.stages("fd", "ch13")[0].name,
+                            after.stages("fd", "ch13")[0].name)
+
+    def test_tiles(self):
+        pipe = pipeline.Pipeline({
+            'fd': {'map': {'tiles': 'tiles', 'tile_size': 512}},
+        })
+        stages = pipe.stages("fd", "ch13")
+        self.assertEqual(["tiles:map"], [s.name for s in stages])
+        self.assertEqual({'subdest': 'tiles', 'tile_size': 512},
+                         stages[0].kwargs)
+
+    def test_video(self):
+        pipe = pipeline.Pipeline({
+            'fd': {'fd': {'copy': 'animate', 'scale': 25,
+                          'video': 'earth.m3u8'}},
+        })
+        stages = pipe.stages("fd", "ch13")
+        self.assertEqual(["copy:fd", "video:fd"], [s.name for s in stages])
+        self.assertEqual({'subdest': 'animate', 'name': 'earth.m3u8'},
+                         stages[1].kwargs)
+        self.assertEqual(("copy:fd",), stages[1].after)
+
+    def test_keep_days(self):
+        pipe = pipeline.Pipeline({
+            'fd': {
+                'va': {'crop': 'va', 'keep_days': 7},
+                'fd': {'copy': 'animate', 'scale': 25, 'keep_days': 2},
+                'full': {'copy': ''},
+            },
+        })
+        self.assertEqual({'va': 7, 'animate': 2}, pipe.keep_days('fd'))
+        self.assertEqual({}, pipe.keep_days('m1'))
+
+    def test_invalid(self):
+        for config in ([], {'fd': {'va': {'crop': 'va', 'copy': ''}}},
+                       {'fd': {'va': {'crop': 'va', 'size': 2}}},
+                       {'fd': {'va': {'crop': 'va', 'scale': 25}}},
+                       {'fd': {'map': {'tiles': 'x', 'animate': 'a.gif'}}},
+                       {'fd': {'map': {'tiles': 'x', 'tile_size': 'big'}}},
+                       {'fd': {'va': {'crop': 'va', 'tile_size': 256}}},
+                       {'fd': {'va': {'crop': 'va', 'video': 'va.mp4'}}},
+                       {'m1': {'full': {'copy': '', 'keep_days': 2}}}):
+            with self.assertRaises(pipeline.PipelineError):
+                pipeline.Pipeline(config)
@@ -0,0 +1,220 @@
+"""Tests for the bounded worker pool."""
+
+import queue
+import threading
+import time
+import unittest
+from unittest import mock
+
+from goesconvert import threads
+from goesconvert.threads import pool
+
+
+class SleepJob(object):
+    lock = threading.Lock()
+    running = 0
+    peak = 0
+
+    def __init__(self, done):
+        self.done = done
+        self.stopped = False
+
+    def stop(self):
+        self.stopped = True
+
+    def run(self):
+        with self.lock:
+            SleepJob.running += 1
+            SleepJob.peak = max(SleepJob.peak, SleepJob.running)
+        time.sleep(0.05)
+        with self.lock:
+            SleepJob.running -= 1
+        self.done.append(self)
+
+
+class TestWorkerPool(unittest.TestCase):
+
+    def setUp(self):
+        SleepJob.running = 0
+        SleepJob.peak = 0
+
+    def _stop(self, workers):
+        workers.stop()
+        workers.join(5)
+        self.assertFalse(workers.is_alive())
+        self.assertNotIn(workers, threads.WaltThreadList().threads_list)
+
+    def test_bounded(self):
+        done = []
+        workers = pool.WorkerPool(max_workers=2, max_queue=2)
+        workers.start()
+        for _ in range(8):
+            self.assertTrue(workers.submit(SleepJob(done)))
+        while len(done) < 8:
+            time.sleep(0.01)
+        self.assertLessEqual(SleepJob.peak, 2)
+        self._stop(workers)
+
+    def test_stop_drops_queue(self):
+        done = []
+        workers = pool.WorkerPool(max_workers=1, max_queue=0)
+        jobs = [SleepJob(done) for _ in range(5)]
+        for job in jobs:
+            workers.submit(job)
+        workers.start()
+        time.sleep(0.02)
+        self._stop(workers)
+        self.assertLess(len(done), 5)
+        self.assertFalse(workers.submit(SleepJob(done)))
+        self.assertEqual(0, len(workers))
+
+    def test_stop_drains_queue(self):
+        done = []
+        workers = pool.WorkerPool(max_workers=1, max_queue=0, drain=True)
+        for _ in range(5):
+            workers.submit(SleepJob(done))
+        workers.start()
+        time.sleep(0.02)
+        self._stop(workers)
+        self.assertEqual(5, len(done))
+
+    def test_deadline(self):
+        done = []
+        workers = pool.WorkerPool(max_workers=1, max_queue=0, drain=True)
+        late = SleepJob(done)
+        late.deadline = time.time() - 1
+        workers.submit(late)
+        workers.submit(SleepJob(done))
+        workers.start()
+        while not done:
+            time.sleep(0.01)
+        self._stop(workers)
+        self.assertNotIn(late, done)
+        self.assertEqual(0, len(workers))
+
+    def test_busy_until_finished(self):
+        done = []
+        seen = []
+        workers = pool.WorkerPool(max_workers=1, max_queue=0)
+        start = workers._start
+
+        def slow_start(job):
+            # Taken off the queue, but not running yet
+            time.sleep(0.05)
+            seen.append(len(workers))
+            start(job)
+
+        workers._start = slow_start
+        job = SleepJob(done)
+        job.finished = lambda result: seen.append(len(workers))
+        workers.submit(job)
+        workers.start()
+        while len(workers):
+            time.sleep(0.001)
+        # Idle only once finished() is done
+        self.assertEqual([1, 1], seen)
+        self._stop(workers)
+
+    def test_stop_processes(self):
+        workers = pool.WorkerPool(max_workers=2, kind='process')
+        self.addCleanup(threads.WaltThreadList().remove, workers)
+        executor, workers.executor = workers.executor, mock.Mock()
+        self.addCleanup(executor.shutdown)
+        job = SleepJob([])
+        future = mock.Mock()
+        workers._running[future] = job
+        workers.stop()
+        # Our copy of the job isn't the one running
+        self.assertFalse(job.stopped)
+        future.cancel.assert_called_once_with()
+        workers.executor.shutdown.assert_called_once_with(wait=False)
+
+    def test_stopped_on_the_way_in(self):
+        done = []
+        workers = pool.WorkerPool(max_workers=1, max_queue=0)
+        self.addCleanup(threads.WaltThreadList().remove, workers)
+        workers.submit(SleepJob(done))
+        job = workers.queue.get_nowait()
+        self.assertTrue(workers._slots.acquire(blocking=False))
+        workers.stop()
+        workers.executor.shutdown()
+        workers._start(job)
+        self.assertEqual(0, len(workers))
+        self.assertEqual([], done)
+
+
+class KeyJob(object):
+
+    def __init__(self, key, n):
+        self.key = key
+        self.n = n
+
+
+class TestFairQueue(unittest.TestCase):
+
+    def test_round_robin(self):
+        fair = pool.FairQueue()
+        for n in range(3):
+            fair.put(KeyJob("goeseast", n))
+        fair.put(KeyJob("goeswest", 0))
+        order = [(job.key, job.n) for job in
+                 (fair.get_nowait() for _ in range(4))]
+        self.assertEqual([("goeseast", 0), ("goeswest", 0),
+                          ("goeseast", 1), ("goeseast", 2)], order)
+        with self.assertRaises(queue.Empty):
+            fair.get_nowait()
+
+    def test_bounded_per_key(self):
+        fair = pool.FairQueue(maxsize=1)
+        fair.put(KeyJob("goeseast", 0))
+        with self.assertRaises(queue.Full):
+            fair.put(KeyJob("goeseast", 1), timeout=0.01)
+        # a full queue for one satellite doesn't block another
+        fair.put(KeyJob("goeswest", 0), timeout=0.01)
+        self.assertEqual(2, fair.qsize())
+
+    def test_weighted(self):
+        fair = pool.FairQueue()
+        for n in range(4):
+            job = KeyJob("m1", n)
+            job.weight = 3
+            fair.put(job)
+            fair.put(KeyJob("fd", n))
+        order = [fair.get_nowait().key for _ in range(8)]
+        self.assertEqual(["m1", "m1", "fd", "m1", "m1", "fd", "fd", "fd"],
+                         order)
+
+    def test_supersede(self):
+        fair = pool.FairQueue()
+        jobs = [KeyJob("m1", n) for n in range(3)]
+        for job in jobs:
+            job.supersedes = "m1/ch13"
+            job.superseded = False
+            job.supersede = lambda job=job: setattr(job, "superseded", True)
+        fair.put(jobs[0])
+        self.assertIs(jobs[0], fair.get_nowait())
+        # already running, so nothing to supersede
+        fair.put(jobs[1])
+        fair.put(jobs[2])
+        other = KeyJob("m1", 3)
+        fair.put(other)
+        self.assertIs(jobs[1], fair.get_nowait())
+        # jobs[2] waits for jobs[1], the others don't
+        self.assertIs(other, fair.get_nowait())
+        with self.assertRaises(queue.Empty):
+            fair.get_nowait()
+        fair.done(jobs[1])
+        self.assertIs(jobs[2], fair.get_nowait())
+        self.assertEqual([False, True, False],
+                         [job.superseded for job in jobs])
+
+    def test_clear(self):
+        fair = pool.FairQueue()
+        jobs = [KeyJob("m1", n) for n in range(2)]
+        for job in jobs:
+            job.supersedes = "m1/ch13"
+            job.supersede = lambda: None
+            fair.put(job)
+        fair.get_nowait()
+        self.assertEqual([jobs[1]], fair.clear())
+        self.assertEqual(0, fair.qsize())
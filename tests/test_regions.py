@@ -0,0 +1,59 @@
+"""Tests for the region registry."""
+
+import os
+import unittest
+
+from goesconvert import regions
+from goesconvert.utils.timezone import EST
+
+
+EXAMPLE = os.path.join(os.path.dirname(__file__), "..", "etc",
+                       "goesconvert", "regions.yaml")
+
+
+class TestRegions(unittest.TestCase):
+
+    def test_default(self):
+        registry = regions.RegionRegistry.load()
+        region = registry.get("va", {'crop_va': "10x10+1+1"})
+        self.assertEqual("10x10+1+1", region.geometry)
+        self.assertIs(EST, region.timezone)
+        self.assertIsNone(region.size)
+        with self.assertRaises(regions.RegionError):
+            registry.get("va", {})
+        with self.assertRaises(regions.RegionError):
+            registry.get("florida", {})
+
+    def test_example(self):
+        registry = regions.RegionRegistry.load(EXAMPLE)
+        self.assertEqual({"va", "ca", "usa"}, set(registry.regions))
+        # Each satellite has its own crop_<name> for these
+        self.assertEqual("10x10+1+1",
+                         registry.get("ca", {'crop_ca': "10x10+1+1"})
+                         .geometry)
+        self.assertEqual(EST, registry.get("usa", {'crop_usa': "1x1+0+0"})
+                         .timezone)
+
+    def test_settings(self):
+        registry = regions.RegionRegistry({
+            'florida': {
+                'geometry': {'goeseast': "800x800+2300+1100"},
+                'timezone': "US/Eastern",
+                'label': "Florida",
+                'size': "400x400",
+            },
+        })
+        region = registry.get("florida", {'satellite': "goeseast"})
+        self.assertEqual("800x800+2300+1100", region.geometry)
+        self.assertEqual((400, 400), region.size)
+        self.assertEqual("US/Eastern", region.timezone.zone)
+        with self.assertRaises(regions.RegionError):
+            registry.get("florida", {'satellite': "goeswest"})
+
+    def test_invalid(self):
+        for config in ({'va': {'geometry': "big"}},
+                       {'va': {'timezone': "Mars/Olympus"}},
+                       {'va': {'size': "400"}},
+                       {'va': {'zoom': 2}}):
+            with self.assertRaises(regions.RegionError):
+                regions.RegionRegistry(config)
@@ -0,0 +1,74 @@
+"""Tests for removing old processed images."""
+
+from datetime import datetime
+import os
+import tempfile
+import time
+import unittest
+
+from goesconvert import retention
+from goesconvert.utils.timezone import GMT
+
+
+NOW = datetime(2022, 8, 10, 12, 0, tzinfo=GMT)
+
+
+class TestSweeper(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.process_dir = self.tmpdir.name
+        for day in range(1, 11):
+            for product in ("va", "animate"):
+                path = os.path.join(self.process_dir, "fd",
+                                    f"2022-08-{day:02d}", "ch13", product)
+                os.makedirs(path)
+                with open(os.path.join(path, "12-00-00.png"), "wb") as fp:
+                    fp.write(b"x" * 100)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _days(self):
+        return [path[-10:] for _, path in retention.day_dirs(
+            os.path.join(self.process_dir, "fd"))]
+
+    def _sweeper(self, days=0, max_bytes=0, products=None):
+        policy = retention.Policy(days, max_bytes, products or {})
+        return retention.Sweeper(self.process_dir, {"fd": policy})
+
+    def test_days(self):
+        sweeper = self._sweeper(days=3)
+        self.assertEqual(6, sweeper.sweep(now=NOW))
+        self.assertEqual(["2022-08-07", "2022-08-08", "2022-08-09",
+                          "2022-08-10"], self._days())
+        self.assertEqual(0, sweeper.sweep(now=NOW))
+        self.assertEqual(12, sweeper.purge())
+        self.assertFalse(os.path.exists(sweeper.trash))
+
+    def test_max_bytes(self):
+        self._sweeper(max_bytes=500).sweep(now=NOW)
+        # 200 bytes a day
+        self.assertEqual(["2022-08-09", "2022-08-10"], self._days())
+
+    def test_never_today(self):
+        self._sweeper(max_bytes=1).sweep(now=NOW)
+        self.assertEqual(["2022-08-10"], self._days())
+
+    def test_products(self):
+        self._sweeper(days=5, products={"va": 2}).sweep(now=NOW)
+        self.assertEqual(6, len(self._days()))
+        for day in self._days():
+            va = os.path.join(self.process_dir, "fd", day, "ch13", "va")
+            self.assertEqual(day >= "2022-08-08", os.path.isdir(va))
+
+    def test_purge_rate(self):
+        sweeper = self._sweeper(days=5)
+        sweeper.sweep(now=NOW)
+        start = time.monotonic()
+        self.assertEqual(8, sweeper.purge(rate=100))
+        self.assertGreaterEqual(time.monotonic() - start, 0.07)
+        self.assertEqual([], os.listdir(sweeper.trash))
+
+        sweeper.sweep(now=datetime(2022, 8, 13, tzinfo=GMT))
+        self.assertEqual(0, sweeper.purge(rate=100, stop=lambda: True))
@@ -0,0 +1,96 @@
+"""Tests for the external command runner."""
+
+import resource
+import sys
+import unittest
+
+from goesconvert.image import base, imagemagick
+from goesconvert.utils import runner
+
+
+class TestCommandRunner(unittest.TestCase):
+
+    def test_run(self):
+        result = runner.CommandRunner().run(
+            [sys.executable, "-c", "print('hello world')"], name="test:ok")
+        self.assertEqual(0, result.returncode)
+        self.assertEqual("hello world\n", result.stdout)
+        self.assertGreater(result.cpu, 0)
+        stats = runner.CommandRunner.stats["test:ok"]
+        self.assertGreaterEqual(stats.count, 1)
+        self.assertEqual(0, stats.failures)
+
+    def test_no_shell(self):
+        result = runner.CommandRunner().run(
+            [sys.executable, "-c", "import sys; print(sys.argv[1])",
+             "'quoted' $HOME *"])
+        self.assertEqual("'quoted' $HOME *\n", result.stdout)
+
+    def test_failure(self):
+        cmd = [sys.executable, "-c", "import sys; sys.exit(3)"]
+        self.assertRaises(runner.CommandError, runner.CommandRunner().run,
+                          cmd, name="test:fail")
+        result = runner.CommandRunner().run(cmd, name="test:fail",
+                                            check=False)
+        self.assertEqual(3, result.returncode)
+        self.assertEqual(2, runner.CommandRunner.stats["test:fail"].failures)
+
+    def test_timeout(self):
+        cmd = [sys.executable, "-c", "import time; time.sleep(10)"]
+        with self.assertRaises(runner.CommandError) as ctx:
+            runner.CommandRunner(timeout=0.2).run(cmd)
+        self.assertTrue(ctx.exception.result.timed_out)
+        self.assertLess(ctx.exception.result.wall, 5)
+
+    def test_memory_limit(self):
+        limit = 512 * 1024 * 1024
+        _, hard = resource.getrlimit(resource.RLIMIT_AS)
+        if hard != resource.RLIM_INFINITY:
+            limit = min(limit, hard)
+        # In place before the command runs, however short lived it is
+        result = runner.CommandRunner(memory_limit=limit).run(
+            [sys.executable, "-c", "import resource; print(resource."
+             "getrlimit(resource.RLIMIT_AS)[0])"])
+        self.assertEqual(limit, int(result.stdout))
+        result = runner.CommandRunner(memory_limit=limit).run(
+            [sys.executable, "-c", "bytearray(1024 ** 3)"], check=False)
+        self.assertNotEqual(0, result.returncode)
+
+
+class TestConvert(unittest.TestCase):
+
+    def test_batched(self):
+        cmd = imagemagick.Convert("convert", limits={"memory": "1GiB"})
+        cmd.read("in.png").crop("10x10+1+1").resize(25)
+        cmd.overlay(base.Label("Monday  12:00:00  GMT", 12), "font.ttf")
+        argv = cmd.write("out.png").argv
+        self.assertEqual(["convert", "-limit", "memory", "1GiB", "in.png",
+                          "-crop", "10x10+1+1", "+repage",
+                          "-resize", "25%"], argv[:10])
+        self.assertIn("Monday  12:00:00  GMT", argv)
+        self.assertEqual("out.png", argv[-1])
+
+    def test_regions(self):
+        backend = imagemagick.ImageMagickBackend("in.png", "font.ttf")
+        backend._commands["convert"] = "convert"
+        calls = []
+        backend._execute = lambda cmd, name: calls.append(cmd.argv)
+        backend.crop_regions([("10x10+1+1", "a.png", None, None),
+                              ("20x20+2+2", "b.png", None, (10, 10))])
+        self.assertEqual([["convert", "-respect-parentheses", "in.png",
+                           "(", "+clone", "-crop", "10x10+1+1", "+repage",
+                           "-write", "a.png", "+delete", ")",
+                           "(", "+clone", "-crop", "20x20+2+2", "+repage",
+                           "-resize", "10x10", "-write", "b.png", "+delete", ")",
+                           "null:"]], calls)
+
+    def test_copy_scaled(self):
+        backend = imagemagick.ImageMagickBackend("in.png", "font.ttf",
+                                                 resize_filter="box")
+        backend._commands["convert"] = "convert"
+        calls = []
+        backend._execute = lambda cmd, name: calls.append(cmd.argv)
+        backend.copy("out.png", scale=25)
+        # straight from the source, no full size copy to resize
+        self.assertEqual([["convert", "in.png", "-filter", "Box",
+                           "-resize", "25%", "out.png"]], calls)
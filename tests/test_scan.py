@@ -0,0 +1,44 @@
+"""Tests for the goestools tree scanner."""
+
+from datetime import datetime
+import os
+import tempfile
+import unittest
+
+from goesconvert import scan
+from goesconvert.utils.timezone import GMT
+
+
+class TestScan(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.top = self.tmpdir.name
+        for path in ("fd/x/ch13/2022-08-01T-12-10-00Z.png",
+                     "fd/x/ch13/2022-08-01T-12-00-00Z.png",
+                     "fd/x/ch13/2022-07-31T-23-50-00Z.png",
+                     "fd/x/ch13/notes.txt",
+                     "m1/x/ch02/2022-08-01T-12-01-00Z.png",
+                     "m1/x/ch02/.2022-08-01T-12-02-00Z.png"):
+            path = os.path.join(self.top, path)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            open(path, "w").close()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_iter_sources(self):
+        names = [entry.name for entry in scan.iter_sources(self.top)]
+        self.assertEqual(["2022-07-31T-23-50-00Z.png",
+                          "2022-08-01T-12-00-00Z.png",
+                          "2022-08-01T-12-10-00Z.png",
+                          "2022-08-01T-12-01-00Z.png"], names)
+
+    def test_since(self):
+        since = datetime(2022, 8, 1, 12, 1, tzinfo=GMT)
+        found = [(os.path.relpath(dirpath, self.top),
+                  [entry.name for entry in entries])
+                 for dirpath, entries in scan.iter_dirs(self.top, since)]
+        self.assertEqual([("fd/x/ch13", ["2022-08-01T-12-10-00Z.png"]),
+                          ("m1/x/ch02", ["2022-08-01T-12-01-00Z.png"])],
+                         found)
@@ -0,0 +1,65 @@
+"""Tests for the write completion detection."""
+
+import os
+import tempfile
+import unittest
+
+from goesconvert import utils
+from goesconvert.threads import settle
+
+
+class TestWriteSettler(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "new.png")
+        self.ready = []
+        self.settler = settle.WriteSettler(self.ready.append,
+                                           settle_time=0, timeout=60)
+
+    def tearDown(self):
+        self.settler.stop()
+        self.tmpdir.cleanup()
+
+    def _write(self, data):
+        with open(self.path, "ab") as f:
+            f.write(data)
+
+    def test_closed(self):
+        self.settler.touch(self.path)
+        self.settler.closed(self.path)
+        self.assertEqual([self.path], self.ready)
+        self.assertEqual(0, len(self.settler))
+        # late events for the same file are ignored
+        self.settler.touch(self.path)
+        self.settler.closed(self.path)
+        self.assertEqual([self.path], self.ready)
+
+    def test_first_event(self):
+        self.assertIsNone(self.settler.first_event(self.path))
+        before = utils.time_ns()
+        self.settler.touch(self.path)
+        self.settler.touch(self.path)
+        self.settler.closed(self.path)
+        first = self.settler.first_event(self.path)
+        self.assertTrue(before <= first <= utils.time_ns())
+
+    def test_size_settles(self):
+        self._write(b"1234")
+        self.settler.touch(self.path)
+        self.settler._check()
+        self.assertEqual([], self.ready)
+        self._write(b"5678")
+        self.settler._check()
+        self.assertEqual([], self.ready)
+        self.settler._check()
+        self.assertEqual([self.path], self.ready)
+
+    def test_empty_file_times_out(self):
+        self._write(b"")
+        self.settler.timeout = 0
+        self.settler.touch(self.path)
+        self.settler._check()
+        self.settler._check()
+        self.assertEqual([], self.ready)
+        self.assertEqual(1, self.settler.unfinished)
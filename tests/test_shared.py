@@ -0,0 +1,119 @@
+"""Tests for the rasters in shared memory and the region workers."""
+
+import os
+import random
+import tempfile
+import unittest
+from unittest import mock
+
+from PIL import Image
+
+from goesconvert import image
+from goesconvert.image import shared
+
+
+def _noise(mode, size, seed):
+    rand = random.Random(seed)
+    length = size[0] * size[1] * len(mode)
+    return Image.frombytes(mode, size, rand.getrandbits(
+        length * 8).to_bytes(length, "little"))
+
+
+def _die_once(spec, marker):
+    # Like the OOM killer taking out the worker
+    if not os.path.exists(marker):
+        open(marker, "w").close()
+        os._exit(1)
+
+
+def _pixel(spec, xy):
+    with shared.AttachedRaster(spec) as attached:
+        return attached.image.getpixel(xy)
+
+
+@unittest.skipUnless(shared.AVAILABLE, "needs multiprocessing.shared_memory")
+class TestSharedRaster(unittest.TestCase):
+
+    def test_attach(self):
+        for mode in ("L", "RGB", "RGBA"):
+            im = _noise(mode, (31, 17), mode)
+            with shared.SharedRaster(im) as raster:
+                with shared.AttachedRaster(raster.spec) as attached:
+                    self.assertEqual(im.size, attached.image.size)
+                    # RGB is mapped as RGBX
+                    copy = attached.image.convert(mode)
+                self.assertEqual(im.tobytes(), copy.tobytes())
+            name = raster.spec.name
+            self.assertRaises(FileNotFoundError, shared._open, name)
+
+    def test_map_raster(self):
+        im = _noise("L", (64, 64), "map")
+        self.assertIsNone(shared.map_raster(im, _pixel, [(1, 2), (3, 4)], 2))
+        self.assertRaises(IndexError, shared.map_raster, im, _pixel,
+                          [(1, 2), (99, 99)], 2)
+
+    def test_broken_pool(self):
+        im = _noise("L", (16, 16), "broken")
+        with tempfile.TemporaryDirectory() as tmpdir:
+            marker = os.path.join(tmpdir, "died")
+            with self.assertLogs("goesconvert", "ERROR"):
+                shared.map_raster(im, _die_once, [marker], 1)
+        # and it keeps working after that
+        self.assertIsNone(shared.map_raster(im, _pixel, [(1, 2)], 1))
+
+
+@unittest.skipUnless(shared.AVAILABLE, "needs multiprocessing.shared_memory")
+class TestRegionWorkers(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _crops(self, name):
+        dest_dir = os.path.join(self.tmpdir.name, name)
+        os.makedirs(dest_dir)
+        return [
+            ("100x50+10+20", os.path.join(dest_dir, "a.png"),
+             image.Label("now", 12), None),
+            ("200x200+150+90", os.path.join(dest_dir, "b.png"), None,
+             (50, 50)),
+            ("100x50+350+280", os.path.join(dest_dir, "c.png"), None, None),
+        ]
+
+    def test_same_as_serial(self):
+        for mode in ("L", "RGB"):
+            source = os.path.join(self.tmpdir.name, f"{mode}.png")
+            _noise(mode, (400, 300), mode).save(source)
+            serial = image.get_backend("pillow", source,
+                                       font_path="/nonexistent.ttf")
+            parallel = image.get_backend("pillow", source,
+                                         font_path="/nonexistent.ttf",
+                                         region_workers=2)
+            serial.crop_regions(self._crops(f"serial-{mode}"))
+            parallel.crop_regions(self._crops(f"parallel-{mode}"))
+            for name in ("a.png", "b.png", "c.png"):
+                with Image.open(os.path.join(self.tmpdir.name,
+                                             f"serial-{mode}", name)) as a, \
+                        Image.open(os.path.join(self.tmpdir.name,
+                                                f"parallel-{mode}",
+                                                name)) as b:
+                    self.assertEqual(a.mode, b.mode)
+                    self.assertEqual(a.size, b.size)
+                    self.assertEqual(a.tobytes(), b.tobytes())
+
+
+class TestWithoutSharedMemory(unittest.TestCase):
+
+    def test_daemonic(self):
+        with mock.patch.object(shared.multiprocessing, "current_process",
+                               return_value=mock.Mock(daemon=True)):
+            self.assertFalse(shared.available())
+
+    def test_serial(self):
+        with mock.patch.object(shared, "AVAILABLE", False):
+            backend = image.get_backend("pillow", "/nonexistent.png",
+                                        font_path="/nonexistent.ttf",
+                                        region_workers=2)
+        self.assertEqual(0, backend.region_workers)
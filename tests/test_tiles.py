@@ -0,0 +1,66 @@
+"""Tests for the tile pyramids."""
+
+import json
+import os
+import tempfile
+import unittest
+
+from PIL import Image
+
+from goesconvert.image import tiles
+
+
+class TestTiles(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _frame(self, name, im):
+        frame_dir = os.path.join(self.tmpdir.name, name)
+        previous = sorted(os.listdir(self.tmpdir.name))
+        previous = (os.path.join(self.tmpdir.name, previous[-1])
+                    if previous else None)
+        os.makedirs(frame_dir)
+        return frame_dir, tiles.write_pyramid(im, frame_dir, tile_size=64,
+                                              previous=previous)
+
+    def test_max_zoom(self):
+        self.assertEqual(0, tiles.max_zoom((200, 100), 256))
+        self.assertEqual(5, tiles.max_zoom((5424, 5424), 256))
+
+    def test_pyramid(self):
+        # black space with a grey disk in the middle
+        im = Image.new("L", (200, 200), 0)
+        im.paste(128, (60, 60, 140, 140))
+        frame_dir, (written, linked, _) = self._frame("00-00-00", im)
+
+        with open(os.path.join(frame_dir, tiles.MANIFEST)) as fp:
+            manifest = json.load(fp)
+        self.assertEqual(2, manifest['max_zoom'])
+        # 4x4 + 2x2 + 1 tiles, the edge tiles padded
+        self.assertEqual(21, len(manifest['tiles']))
+        self.assertEqual(21, written + linked)
+        with Image.open(os.path.join(frame_dir, "2", "3", "3.png")) as tile:
+            self.assertEqual((64, 64), tile.size)
+        # the all black tiles are written once
+        self.assertGreater(linked, 0)
+
+    def test_unchanged_tiles_are_linked(self):
+        im = Image.new("L", (256, 256), 0)
+        im.paste(255, (0, 0, 64, 64))
+        first, _ = self._frame("00-00-00", im)
+        im.paste(128, (0, 0, 64, 64))
+        second, (written, linked, _) = self._frame("00-10-00", im)
+
+        # only the changed tile at every zoom level is new
+        self.assertEqual(3, written)
+        self.assertEqual(21 - 3, linked)
+        self.assertTrue(os.path.samefile(
+            os.path.join(first, "2", "3", "3.png"),
+            os.path.join(second, "2", "3", "3.png")))
+        self.assertFalse(os.path.samefile(
+            os.path.join(first, "2", "0", "0.png"),
+            os.path.join(second, "2", "0", "0.png")))
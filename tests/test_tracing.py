@@ -0,0 +1,147 @@
+"""Tests for the per file traces."""
+
+import http.server
+import json
+import os
+import tempfile
+import threading
+import unittest
+
+from goesconvert import tracing
+from goesconvert.cmds import benchmark, monitor
+
+
+class TestTrace(unittest.TestCase):
+
+    def tearDown(self):
+        tracing.configure()
+
+    def test_span_tree(self):
+        trace = tracing.Trace("req-6f3e1a52-8a43-4d1f-9a37-1b0ad9b4c001",
+                              "/watch/fd/x.png", model="fd")
+        self.assertEqual("6f3e1a528a434d1f9a371b0ad9b4c001", trace.trace_id)
+        trace.add_span("detect", start_ns=trace.root.start_ns - 10**9,
+                       end_ns=trace.root.start_ns)
+        with tracing.activate(trace):
+            with tracing.span("process"):
+                with tracing.span("crop:regions"):
+                    pass
+                with self.assertRaises(ValueError):
+                    with tracing.span("copy:full"):
+                        raise ValueError("no space")
+        self.assertIsNone(tracing.current())
+        trace.end()
+
+        spans = {span.name: span for span in trace.spans}
+        root = spans['file']
+        self.assertIsNone(root.parent_id)
+        self.assertEqual("fd", root.attributes['model'])
+        # the root starts with the earliest span
+        self.assertEqual(spans['detect'].start_ns, root.start_ns)
+        self.assertEqual(root.span_id, spans['detect'].parent_id)
+        self.assertEqual(root.span_id, spans['process'].parent_id)
+        self.assertEqual(spans['process'].span_id,
+                         spans['crop:regions'].parent_id)
+        self.assertEqual("no space", spans['copy:full'].error)
+        self.assertTrue(all(span.end_ns for span in trace.spans))
+
+    def test_no_trace(self):
+        self.assertIsNone(tracing.start("req-1", "x.png"))
+        with tracing.span("decode") as span:
+            self.assertIsNone(span)
+
+    def test_otlp(self):
+        received = []
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers['Content-Length'])
+                received.append((self.path, json.loads(self.rfile.read(length))))
+                self.send_response(200)
+                self.end_headers()
+
+            def log_message(self, format, *args):
+                pass
+
+        server = http.server.HTTPServer(("127.0.0.1", 0), Handler)
+        thread = threading.Thread(target=server.handle_request)
+        thread.start()
+        url = f"http://127.0.0.1:{server.server_port}/v1/traces"
+        tracing.configure(otlp_url=url)
+        trace = tracing.start("req-6f3e1a52-8a43-4d1f-9a37-1b0ad9b4c001",
+                              "x.png")
+        with tracing.activate(trace), tracing.span("encode"):
+            pass
+        tracing.export(trace)
+        tracing.flush()
+        thread.join(10)
+        server.server_close()
+
+        path, payload = received[0]
+        self.assertEqual("/v1/traces", path)
+        spans = payload['resourceSpans'][0]['scopeSpans'][0]['spans']
+        self.assertEqual(["file", "encode"], [s['name'] for s in spans])
+        self.assertEqual(spans[0]['spanId'], spans[1]['parentSpanId'])
+        self.assertNotIn('parentSpanId', spans[0])
+
+        # a collector that isn't there doesn't get in the way
+        tracing.configure(otlp_url=url)
+        tracing.export(tracing.start("req-1", "x.png"))
+        tracing.flush()
+
+    def test_export_doesnt_wait(self):
+        release = threading.Event()
+        exported = []
+
+        class SlowExporter(object):
+            def export(self, trace):
+                release.wait(10)
+                exported.append(trace)
+
+        tracing.EXPORTERS.append(SlowExporter())
+        trace = tracing.start("req-1", "x.png")
+        tracing.export(trace)
+        self.assertEqual([], exported)
+        release.set()
+        tracing.flush()
+        self.assertEqual([trace], exported)
+
+
+class TestFileTraces(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.watch_dir = os.path.join(self.tmpdir.name, "watch")
+        self.spans_file = os.path.join(self.tmpdir.name, "spans.jsonl")
+        tracing.configure(spans_file=self.spans_file)
+
+    def tearDown(self):
+        tracing.configure()
+        self.tmpdir.cleanup()
+
+    def test_job(self):
+        files = benchmark.synthetic_tree(self.watch_dir, ["m1"], ["ch13"], 1,
+                                         sizes={"m1": 32})
+        satellite = {'satellite': 'goeseast', 'watch_dir': self.watch_dir,
+                     'process_dir': os.path.join(self.tmpdir.name, "out")}
+        job = monitor.ProcessSatelliteFile(files[0], satellite)
+        monitor.trace_settled(job)
+        job.run()
+        tracing.flush()
+
+        with open(self.spans_file) as fp:
+            spans = [json.loads(line) for line in fp]
+        by_name = {span['name']: span for span in spans}
+        self.assertEqual({job.fh.trace.trace_id},
+                         {span['trace_id'] for span in spans})
+        self.assertEqual(job.fh.context.request_id,
+                         by_name['file']['attributes']['request_id'])
+        root = by_name['file']['span_id']
+        for name in ("detect", "settle", "queue", "process"):
+            self.assertEqual(root, by_name[name]['parent_id'])
+        process = by_name['process']['span_id']
+        self.assertEqual(process, by_name['copy:full']['parent_id'])
+        self.assertEqual(process, by_name['animate:full']['parent_id'])
+        self.assertEqual(by_name['copy:full']['span_id'],
+                         by_name['decode']['parent_id'])
+        self.assertFalse(by_name['file']['attributes']['failed'])
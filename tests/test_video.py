@@ -0,0 +1,92 @@
+"""Tests for the HLS videos."""
+
+import os
+import stat
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+from PIL import Image
+
+from goesconvert.image import video
+
+
+# Stands in for ffmpeg: writes the number of bytes it got on stdin and
+# its pid to the playlist.
+FAKE_FFMPEG = f"""#!{sys.executable}
+import os, sys
+size = len(sys.stdin.buffer.read())
+with open(sys.argv[-1], "a") as fp:
+    fp.write(f"{{os.getpid()}} {{size}}\\n")
+"""
+
+
+class TestVideo(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        bindir = os.path.join(self.tmpdir.name, "bin")
+        os.makedirs(bindir)
+        ffmpeg = os.path.join(bindir, "ffmpeg")
+        with open(ffmpeg, "w") as fp:
+            fp.write(FAKE_FFMPEG)
+        os.chmod(ffmpeg, os.stat(ffmpeg).st_mode | stat.S_IEXEC)
+        patcher = mock.patch.dict(os.environ, {"PATH": bindir})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.playlist = os.path.join(self.tmpdir.name, "earth.m3u8")
+        self.frames = []
+        for name in ("12-00-00", "12-10-00", "12-20-00"):
+            frame = os.path.join(self.tmpdir.name, f"{name}.png")
+            Image.new("L", (4, 4), 0).save(frame)
+            self.frames.append(frame)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _playlist(self):
+        with open(self.playlist) as fp:
+            return [line.split() for line in fp]
+
+    def test_argv(self):
+        stream = video.HlsStream(self.playlist, framerate=10,
+                                 segment_frames=2)
+        argv = stream._argv("ffmpeg", (5, 4))
+        self.assertEqual("5x4", argv[argv.index("-s") + 1])
+        self.assertEqual("0.2", argv[argv.index("-hls_time") + 1])
+        self.assertEqual("0", argv[argv.index("-start_number") + 1])
+        self.assertNotIn("append_list", argv[argv.index("-hls_flags") + 1])
+
+        # after a restart, carry on after the existing segments
+        open(self.playlist, "w").close()
+        open(os.path.join(self.tmpdir.name, "earth_00000.m4s"), "w").close()
+        argv = stream._argv("ffmpeg", (5, 4))
+        self.assertEqual("1", argv[argv.index("-start_number") + 1])
+        self.assertIn("append_list", argv[argv.index("-hls_flags") + 1])
+
+    def test_one_ffmpeg_per_stream(self):
+        stream = video.HlsStream(self.playlist)
+        for frame in self.frames:
+            stream.append(frame)
+        stream.close()
+        # every frame went to the same ffmpeg, as 4x4 RGB
+        self.assertEqual(1, len(self._playlist()))
+        self.assertEqual("144", self._playlist()[0][1])
+
+    def test_streams_in_order(self):
+        done = []
+        streams = video.VideoStreams(interval=60)
+        for frame in (self.frames[1], self.frames[0]):
+            streams.request(self.playlist,
+                            (frame, lambda f=frame: done.append(f)))
+        streams.close()
+        self.assertEqual(self.frames[:2], done)
+
+        # frames older than the ones in the video are left out
+        streams.request(self.playlist, (self.frames[0], None))
+        streams.request(self.playlist, (self.frames[2], None))
+        streams.close()
+        self.assertEqual([["96"], ["48"]],
+                         [line[1:] for line in self._playlist()])